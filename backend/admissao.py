@@ -0,0 +1,105 @@
+import os
+import math
+import heapq
+import asyncio
+import itertools
+import time
+from fastapi.responses import JSONResponse
+import metricas
+
+# ==========================================
+# CONTROLE DE ADMISSÃO (ORÇAMENTO POR CLASSE DE ROTA + FILA COM PRIORIDADE)
+# ==========================================
+# As rotas que varrem o armazém/Magazord ("pesadas") têm um orçamento pequeno de execuções simultâneas;
+# as demais ("leves": login, progresso, status dos jobs...) têm o seu, separado, e nunca esperam atrás delas.
+# Passado o orçamento, o pedido espera numa fila curta (interativos antes de lote); fila cheia ou espera longa
+# demais -> 503 na hora, com Retry-After. A soma dos orçamentos cabe no threadpool do uvicorn (40 threads).
+ORCAMENTO_LEVES = int(os.getenv("ADMISSAO_LEVES", 24))
+ORCAMENTO_PESADAS = int(os.getenv("ADMISSAO_PESADAS", 4))
+FILA_MAXIMA = int(os.getenv("ADMISSAO_FILA", 16))                 # pedidos esperando, por classe
+ESPERA_MAXIMA = float(os.getenv("ADMISSAO_ESPERA_SEGUNDOS", 15))  # quanto um pedido aguarda na fila
+
+ROTAS_PESADAS = (
+    "/api/dashboard/resumo", "/api/dashboard/mes-atual", "/api/dashboard/carrinhos-abandonados",
+    "/api/dashboard/clientes-inativos", "/api/dashboard/clientes-demografia", "/api/dashboard/bundle", "/api/admin/perfil",
+)
+# Conexões longas e baratas (SSE) e o /metrics ficam de fora: não seguram thread nem podem ser barrados
+ISENTAS = ("/metrics",)
+
+PRIORIDADES = {"interativa": 0, "lote": 1}
+
+class Fila:
+    def __init__(self, nome, limite):
+        self.nome = nome
+        self.limite = limite
+        self.ativos = 0
+        self.espera = []                 # heap (prioridade, ordem de chegada, future)
+        self.ordem = itertools.count()
+        self.duracao_media = 1.0         # segundos por execução (média móvel), para o Retry-After
+
+    def _liberar_proximo(self):
+        while self.espera and self.ativos < self.limite:
+            _, _, vez = heapq.heappop(self.espera)
+            if vez.done(): continue      # desistiu (timeout ou cliente caiu)
+            self.ativos += 1
+            vez.set_result(True)
+
+    async def entrar(self, prioridade):
+        # True = pode executar; False = recusado (fila cheia ou esperou demais)
+        if self.ativos < self.limite and not self.espera:
+            self.ativos += 1
+            return True
+        if len(self.espera) >= FILA_MAXIMA: return False
+        vez = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.espera, (prioridade, next(self.ordem), vez))
+        try:
+            await asyncio.wait_for(asyncio.shield(vez), ESPERA_MAXIMA)
+            return True
+        except asyncio.TimeoutError:
+            return self._desistir(vez)
+        except asyncio.CancelledError:
+            self._desistir(vez)
+            raise
+
+    def _desistir(self, vez):
+        # Saiu da fila sem usar a vaga: se ela chegou bem nesse instante, passa para o próximo
+        if vez.done() and not vez.cancelled(): self.sair(0)
+        else: vez.cancel()
+        return False
+
+    def sair(self, duracao):
+        self.ativos -= 1
+        if duracao: self.duracao_media = 0.8 * self.duracao_media + 0.2 * duracao
+        self._liberar_proximo()
+
+    def retry_after(self):
+        # Tempo estimado para a fila andar: quem está na frente, dividido entre as vagas
+        return max(1, math.ceil(self.duracao_media * (len(self.espera) + 1) / max(1, self.limite)))
+
+_filas = {"leve": Fila("leve", ORCAMENTO_LEVES), "pesada": Fila("pesada", ORCAMENTO_PESADAS)}
+
+def classe_da_rota(metodo, caminho):
+    if metodo == "OPTIONS" or caminho in ISENTAS or caminho.endswith("/eventos"): return None
+    # Os jobs de demografia rodam no executor próprio: criar e consultar um job é leve
+    return "pesada" if caminho.startswith(ROTAS_PESADAS) else "leve"
+
+def _prioridade(request):
+    # Front (padrão) é interativo; scripts, pré-aquecimento e relatórios mandam X-Prioridade: lote
+    return PRIORIDADES.get(request.headers.get("x-prioridade", "").strip().lower(), 0)
+
+# --- MIDDLEWARE ---
+async def middleware_admissao(request, call_next):
+    classe = classe_da_rota(request.method, request.url.path)
+    if classe is None: return await call_next(request)
+    fila = _filas[classe]
+    chegada = time.perf_counter()
+    if not await fila.entrar(_prioridade(request)):
+        metricas.contar("admissao_recusadas_total", classe=classe)
+        return JSONResponse(status_code=503, content={"detail": "Servidor ocupado, tente de novo em instantes"},
+                            headers={"Retry-After": str(fila.retry_after())})
+    inicio = time.perf_counter()
+    metricas.observar("admissao_espera_segundos", inicio - chegada, classe=classe)
+    try:
+        return await call_next(request)
+    finally:
+        fila.sair(time.perf_counter() - inicio)
@@ -0,0 +1,305 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import metricas
+
+BANCO_FILE = os.getenv("BANCO_PEDIDOS", "pedidos.db")
+CACHE_FILE = "cache_pedidos.json"              # Formato antigo (fichas detalhadas)
+LISTA_FILE = "cache_lista_pedidos.json"        # Formato antigo (resumos de listagem)
+ESTADO_FILE = "estado_sincronizacao.json"      # Formato antigo (marca d'água)
+# Pedidos dos últimos dias ficam decodificados na memória do processo (0 desliga)
+MEMORIA_DIAS = int(os.getenv("BANCO_MEMORIA_DIAS", 70))
+
+# Uma conexão por thread (o sqlite3 não deixa compartilhar entre threads)
+_local = threading.local()
+_init_lock = threading.Lock()
+_inicializado = False
+# Módulos que mantêm tabelas derivadas (rollups, índices) se registram aqui
+_extensoes = []
+# Pedidos recentes já decodificados: codigo -> (data_hora, resumo, detalhe). None = ainda não carregados
+_memoria = None
+_memoria_desde = None   # dia (YYYY-MM-DD) a partir do qual a memória tem todos os pedidos
+_memoria_lock = threading.Lock()
+
+def conexao():
+    con = getattr(_local, "con", None)
+    if con is None:
+        con = sqlite3.connect(BANCO_FILE, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        _local.con = con
+    return con
+
+def inicializar():
+    global _inicializado
+    if _inicializado: return
+    with _init_lock:
+        if _inicializado: return
+        con = conexao()
+        with con:
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS pedidos (
+                    codigo TEXT PRIMARY KEY,
+                    data TEXT,
+                    data_hora TEXT,
+                    situacao TEXT,
+                    email TEXT,
+                    resumo TEXT,
+                    detalhe TEXT,
+                    atualizado_em TEXT,
+                    detalhe_em TEXT,
+                    detalhe_situacao TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_pedidos_data ON pedidos (data);
+                CREATE INDEX IF NOT EXISTS idx_pedidos_situacao ON pedidos (situacao);
+                CREATE INDEX IF NOT EXISTS idx_pedidos_email ON pedidos (email);
+
+                CREATE TABLE IF NOT EXISTS estado (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT
+                );
+            """)
+            # Armazém de antes da revalidação: ganha a hora e a situação em que cada ficha foi baixada
+            colunas = {linha[1] for linha in con.execute("PRAGMA table_info(pedidos)")}
+            if "detalhe_em" not in colunas:
+                con.execute("ALTER TABLE pedidos ADD COLUMN detalhe_em TEXT")
+                con.execute("ALTER TABLE pedidos ADD COLUMN detalhe_situacao TEXT")
+                con.execute("UPDATE pedidos SET detalhe_em = atualizado_em, detalhe_situacao = situacao WHERE detalhe IS NOT NULL")
+        _migrar_json(con)
+        for criar_tabelas, _ in _extensoes:
+            if criar_tabelas: criar_tabelas(con)
+        _inicializado = True
+
+def registrar_extensao(criar_tabelas=None, ao_gravar=None):
+    # criar_tabelas(con): cria/reconstrói as tabelas derivadas
+    # ao_gravar(con, codigo, antigo, novo): chamado na mesma transação de cada upsert;
+    # antigo/novo são (resumo, detalhe) do pedido antes e depois da gravação
+    _extensoes.append((criar_tabelas, ao_gravar))
+    if _inicializado and criar_tabelas:
+        with _init_lock: criar_tabelas(conexao())
+
+# --- MIGRAÇÃO ÚNICA DO cache_pedidos.json ---
+def _ler_json(arquivo):
+    try:
+        with open(arquivo, 'r', encoding='utf-8') as f: return json.load(f)
+    except: return {}
+
+def _migrar_json(con):
+    if con.execute("SELECT 1 FROM pedidos LIMIT 1").fetchone(): return
+    if not any(os.path.exists(a) for a in (CACHE_FILE, LISTA_FILE, ESTADO_FILE)): return
+
+    with metricas.cronometro("armazem_operacao_segundos", operacao="ler_json_antigo"):
+        detalhes = _ler_json(CACHE_FILE) if os.path.exists(CACHE_FILE) else {}
+        resumos = _ler_json(LISTA_FILE) if os.path.exists(LISTA_FILE) else {}
+        estado = _ler_json(ESTADO_FILE) if os.path.exists(ESTADO_FILE) else {}
+    print(f"📦 Migrando {len(detalhes)} fichas e {len(resumos)} resumos para {BANCO_FILE}...")
+
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with con:
+        for codigo in set(detalhes) | set(resumos):
+            resumo = resumos.get(codigo)
+            detalhe = detalhes.get(codigo) or None
+            origem = resumo or detalhe or {}
+            data_hora = str(origem.get('dataHora') or '')
+            situacao = (resumo or {}).get('pedidoSituacaoDescricao')
+            con.execute(
+                "INSERT OR REPLACE INTO pedidos (codigo, data, data_hora, situacao, email, resumo, detalhe, atualizado_em, detalhe_em, detalhe_situacao) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (str(codigo), data_hora[:10] or None, data_hora or None, situacao,
+                 (detalhe or {}).get('pessoaEmail'),
+                 json.dumps(resumo, ensure_ascii=False) if resumo else None,
+                 json.dumps(detalhe, ensure_ascii=False) if detalhe else None,
+                 agora, agora if detalhe else None, situacao if detalhe else None))
+        for chave, valor in estado.items():
+            con.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES (?, ?)", (chave, valor))
+
+    # Mantém os arquivos antigos como backup, fora do caminho de leitura
+    for arquivo in (CACHE_FILE, LISTA_FILE, ESTADO_FILE):
+        if os.path.exists(arquivo):
+            os.replace(arquivo, arquivo + ".migrado")
+
+# ==========================================
+# ESCRITA (UPSERT POR PEDIDO)
+# ==========================================
+def _json_ou_none(texto):
+    return json.loads(texto) if texto else None
+
+def _gravar(con, codigo, resumo_json=None, detalhe_json=None, email=None, agora=None):
+    # Retorna (resumo, detalhe) novos já decodificados, ou None se nada mudou
+    antigo = con.execute("SELECT resumo, detalhe FROM pedidos WHERE codigo = ?", (codigo,)).fetchone()
+    resumo_antigo, detalhe_antigo = antigo if antigo else (None, None)
+    novo_resumo = resumo_json if resumo_json is not None else resumo_antigo
+    novo_detalhe = detalhe_json if detalhe_json is not None else detalhe_antigo
+    if antigo and (novo_resumo, novo_detalhe) == (resumo_antigo, detalhe_antigo): return None
+
+    if resumo_json is not None:
+        resumo = json.loads(resumo_json)
+        data_hora = str(resumo.get('dataHora') or '')
+        con.execute("""
+            INSERT INTO pedidos (codigo, data, data_hora, situacao, resumo, atualizado_em) VALUES (?,?,?,?,?,?)
+            ON CONFLICT(codigo) DO UPDATE SET
+                data = excluded.data, data_hora = excluded.data_hora, situacao = excluded.situacao,
+                resumo = excluded.resumo, atualizado_em = excluded.atualizado_em
+        """, (codigo, data_hora[:10] or None, data_hora or None, resumo.get('pedidoSituacaoDescricao'), resumo_json, agora))
+    if detalhe_json is not None:
+        con.execute("""
+            INSERT INTO pedidos (codigo, email, detalhe, atualizado_em) VALUES (?,?,?,?)
+            ON CONFLICT(codigo) DO UPDATE SET
+                email = excluded.email, detalhe = excluded.detalhe, atualizado_em = excluded.atualizado_em
+        """, (codigo, email, detalhe_json, agora))
+
+    par_novo = (_json_ou_none(novo_resumo), _json_ou_none(novo_detalhe))
+    if any(ao_gravar for _, ao_gravar in _extensoes):
+        par_antigo = (_json_ou_none(resumo_antigo), _json_ou_none(detalhe_antigo))
+        for _, ao_gravar in _extensoes:
+            if ao_gravar: ao_gravar(con, codigo, par_antigo, par_novo)
+    return par_novo
+
+def salvar_resumos(items):
+    inicializar()
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    con = conexao()
+    mudaram = {}
+    with metricas.cronometro("armazem_operacao_segundos", operacao="salvar_resumos"), con:
+        for p_resumo in items:
+            codigo = str(p_resumo.get('codigo'))
+            novo = _gravar(con, codigo, resumo_json=json.dumps(p_resumo, ensure_ascii=False), agora=agora)
+            if novo: mudaram[codigo] = novo
+    _atualizar_memoria(mudaram)
+
+def salvar_detalhes(detalhes):
+    # detalhes: [(codigo, ficha)] gravados numa única transação
+    inicializar()
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    con = conexao()
+    mudaram = {}
+    with metricas.cronometro("armazem_operacao_segundos", operacao="salvar_detalhes"), con:
+        for codigo, detalhe in detalhes:
+            novo = _gravar(con, str(codigo), detalhe_json=json.dumps(detalhe, ensure_ascii=False),
+                           email=detalhe.get('pessoaEmail'), agora=agora)
+            if novo: mudaram[str(codigo)] = novo
+            # Mesmo igual à anterior, a ficha foi conferida agora e nesta situação
+            con.execute("UPDATE pedidos SET detalhe_em = ?, detalhe_situacao = situacao WHERE codigo = ?", (agora, str(codigo)))
+    _atualizar_memoria(mudaram)
+
+# ==========================================
+# PEDIDOS RECENTES EM MEMÓRIA
+# ==========================================
+# As rotas leem quase sempre o mês atual e o anterior. Esses pedidos são decodificados uma vez
+# (no início do processo) e depois só mudam quando uma gravação muda algo de fato: a leitura
+# não relê nem decodifica o JSON do banco, e não depende do tamanho do armazém.
+def _corte_memoria():
+    return (datetime.now() - timedelta(days=MEMORIA_DIAS)).strftime("%Y-%m-%d")
+
+def carregar_memoria():
+    # Chamado no início do app (lifespan); sem ele, a primeira leitura carrega
+    global _memoria, _memoria_desde
+    if MEMORIA_DIAS <= 0: return
+    inicializar()
+    # Segura o lock durante a leitura: gravações que terminarem no meio esperam e se aplicam por cima
+    with _memoria_lock:
+        if _memoria is not None: return
+        desde = _corte_memoria()
+        with metricas.cronometro("armazem_operacao_segundos", operacao="carregar_memoria"):
+            _memoria = {codigo: (data_hora or '', json.loads(resumo), _json_ou_none(detalhe))
+                        for codigo, data_hora, resumo, detalhe in conexao().execute(
+                            "SELECT codigo, data_hora, resumo, detalhe FROM pedidos WHERE resumo IS NOT NULL AND data >= ?", (desde,))}
+        _memoria_desde = desde
+
+def _atualizar_memoria(mudaram):
+    # mudaram: {codigo: (resumo, detalhe)} já gravados no banco
+    if not mudaram: return
+    with _memoria_lock:
+        if _memoria is None: return
+        for codigo, (resumo, detalhe) in mudaram.items():
+            data_hora = str((resumo or {}).get('dataHora') or '')
+            if resumo and data_hora[:10] >= _memoria_desde: _memoria[codigo] = (data_hora, resumo, detalhe)
+            else: _memoria.pop(codigo, None)
+
+def _da_memoria(inicio, fim):
+    # [(resumo, detalhe)] do período se ele cabe na janela em memória; None se precisa ir ao banco
+    global _memoria, _memoria_desde
+    if MEMORIA_DIAS <= 0: return None
+    if _memoria is None: carregar_memoria()
+    with _memoria_lock:
+        # Uma vez por semana a janela anda: quem ficou velho sai da memória
+        corte = _corte_memoria()
+        if _memoria_desde < (datetime.now() - timedelta(days=MEMORIA_DIAS + 7)).strftime("%Y-%m-%d"):
+            _memoria = {c: v for c, v in _memoria.items() if v[0][:10] >= corte}
+            _memoria_desde = corte
+        if inicio < _memoria_desde: return None
+        pares = [v for v in _memoria.values() if inicio <= v[0][:10] and (not fim or v[0][:10] <= fim)]
+    pares.sort(key=lambda v: v[0], reverse=True)
+    return [(resumo, detalhe) for _, resumo, detalhe in pares]
+
+# ==========================================
+# LEITURA
+# ==========================================
+def codigos_para_detalhar(codigos):
+    # Sem ficha, ou com a ficha baixada quando o pedido estava em outra situação (ex.: virou estorno)
+    inicializar()
+    codigos = [str(c) for c in codigos]
+    if not codigos: return []
+    marcas = ",".join("?" * len(codigos))
+    em_dia = {linha[0] for linha in conexao().execute(
+        f"SELECT codigo FROM pedidos WHERE codigo IN ({marcas}) AND detalhe IS NOT NULL AND detalhe_situacao IS situacao", codigos)}
+    faltando = [c for c in codigos if c not in em_dia]
+    metricas.contar_cache("fichas_pedidos", len(codigos) - len(faltando), len(faltando))
+    return faltando
+
+def listar_pedidos(data_inicio, data_fim=None):
+    # Retorna [(resumo, detalhe)] do período, do mais recente para o mais antigo.
+    # Os dicts podem vir da memória compartilhada: quem chama só lê, não altera.
+    inicializar()
+    with metricas.fase("fichas"):
+        pares = _da_memoria(data_inicio.strftime("%Y-%m-%d"), data_fim.strftime("%Y-%m-%d") if data_fim else None)
+    if pares is not None:
+        metricas.contar_cache("pedidos_memoria", 1, 0)
+        return pares
+    metricas.contar_cache("pedidos_memoria", 0, 1)
+    sql = "SELECT resumo, detalhe FROM pedidos WHERE resumo IS NOT NULL AND data >= ?"
+    params = [data_inicio.strftime("%Y-%m-%d")]
+    if data_fim:
+        sql += " AND data <= ?"
+        params.append(data_fim.strftime("%Y-%m-%d"))
+    sql += " ORDER BY data_hora DESC"
+    with metricas.cronometro("armazem_operacao_segundos", operacao="listar_pedidos"), metricas.fase("fichas"):
+        return [(json.loads(resumo), _json_ou_none(detalhe)) for resumo, detalhe in conexao().execute(sql, params)]
+
+def fichas_desde(data_inicio):
+    # [(codigo, data_hora, situacao, conferido_em)] dos pedidos a partir de data_inicio (para a revalidação).
+    # Sem ficha, vale a última gravação do resumo
+    inicializar()
+    return conexao().execute("SELECT codigo, data_hora, situacao, COALESCE(detalhe_em, atualizado_em) FROM pedidos WHERE resumo IS NOT NULL AND data >= ?",
+                             (data_inicio.strftime("%Y-%m-%d"),)).fetchall()
+
+def buscar_resumos(codigos):
+    inicializar()
+    codigos = [str(c) for c in codigos]
+    if not codigos: return {}
+    marcas = ",".join("?" * len(codigos))
+    return {codigo: json.loads(resumo) for codigo, resumo in conexao().execute(
+        f"SELECT codigo, resumo FROM pedidos WHERE codigo IN ({marcas}) AND resumo IS NOT NULL", codigos)}
+
+def todos_os_detalhes():
+    # Usado pelos relatórios: percorre o banco sem carregar tudo de uma vez
+    inicializar()
+    for codigo, detalhe in conexao().execute("SELECT codigo, detalhe FROM pedidos WHERE detalhe IS NOT NULL"):
+        yield codigo, json.loads(detalhe)
+
+def contar_detalhes():
+    inicializar()
+    return conexao().execute("SELECT COUNT(*) FROM pedidos WHERE detalhe IS NOT NULL").fetchone()[0]
+
+# --- ESTADO DA SINCRONIZAÇÃO ---
+def ler_estado(chave, padrao=None):
+    inicializar()
+    linha = conexao().execute("SELECT valor FROM estado WHERE chave = ?", (chave,)).fetchone()
+    return linha[0] if linha else padrao
+
+def gravar_estado(chave, valor):
+    inicializar()
+    con = conexao()
+    with con:
+        con.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES (?, ?)", (chave, valor))
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+# ==========================================
+# BENCHMARK DAS ROTAS CONTRA O MAGAZORD FALSO
+# ==========================================
+# Para cada escala sobe um Magazord falso e um processo novo do backend (banco vazio), cada um no seu processo.
+# Os robôs ficam desligados: a carga inicial (pedidos, carrinhos, catálogo, pessoas) é uma etapa própria, medida
+# e contada à parte, e nada roda em segundo plano durante as medições. Depois mede cada rota fria (primeira
+# chamada, armazém carregado e cache de respostas vazio) e quente (repetições), o pico de memória (RSS)
+# e quantas chamadas cada etapa fez à API. O resultado vai para um JSON comparável.
+#
+#   python bench/benchmark.py --pedidos 1000 10000 --latencia-ms 20 --saida bench/resultados.json
+#   python bench/benchmark.py --comparar bench/antes.json bench/depois.json
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(PASTA)
+
+FRIO = ("primeira chamada da rota depois da carga inicial: armazém local carregado, robôs parados, cache de respostas "
+        "esvaziado antes de cada rota (jobs de demografia prontos são reaproveitados)")
+
+ROTAS = [
+    ("resumo", "GET", "/api/dashboard/resumo"),
+    ("resumo_90d", "GET", "/api/dashboard/resumo?dias_kpi=90&dias_graficos=90"),
+    ("mes_atual", "GET", "/api/dashboard/mes-atual"),
+    ("carrinhos", "GET", "/api/dashboard/carrinhos-abandonados?dias=7"),
+    ("carrinhos_30d", "GET", "/api/dashboard/carrinhos-abandonados?dias=30"),
+    ("bundle", "GET", "/api/dashboard/bundle"),
+    ("demografia", "GET", "/api/dashboard/clientes-demografia?percentual=25"),
+    ("demografia_agregado", "GET", "/api/dashboard/clientes-demografia?percentual=25&modo=agregado"),
+]
+
+def _pico_rss_mb():
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _chamadas(url_fake, zerar=True):
+    import requests
+    return requests.get(f"{url_fake}/__stats", params={"zerar": 1} if zerar else None, timeout=10).json()
+
+# --- PROCESSO FILHO: UM BACKEND NOVO POR CENÁRIO ---
+def _medir(url_fake, repeticoes):
+    from fastapi.testclient import TestClient
+    import main
+    import sincronizacao
+    import carrinhos
+    import catalogo
+    import pessoas
+    import cache_respostas
+
+    resultado = {"carga_inicial": {}, "rotas": {}}
+    _chamadas(url_fake)
+    inicio = time.perf_counter()
+    with TestClient(main.app) as cliente:
+        # Carga inicial, etapa por etapa (o que os robôs fariam ao subir)
+        for nome, funcao in (("pedidos", sincronizacao.sincronizar_pedidos), ("carrinhos", carrinhos.atualizar_carrinhos),
+                             ("catalogo", catalogo.atualizar_catalogo), ("pessoas", pessoas.sincronizar_pessoas)):
+            t = time.perf_counter()
+            funcao()
+            duracao = time.perf_counter() - t
+            chamadas = _chamadas(url_fake)
+            resultado["carga_inicial"][nome] = {"s": round(duracao, 4), "chamadas_magazord": chamadas}
+            print(f"  carga {nome:<14} {duracao:7.3f}s  chamadas {sum(chamadas.values()):>6}", file=sys.stderr)
+
+        for nome, metodo, caminho in ROTAS:
+            cache_respostas.limpar()
+            t = time.perf_counter()
+            res = cliente.request(metodo, caminho)
+            frio = time.perf_counter() - t
+            chamadas_frio = _chamadas(url_fake)
+
+            quentes = []
+            for _ in range(repeticoes):
+                t = time.perf_counter()
+                cliente.request(metodo, caminho)
+                quentes.append(time.perf_counter() - t)
+            chamadas_quente = _chamadas(url_fake)
+
+            resultado["rotas"][nome] = {
+                "caminho": caminho,
+                "status": res.status_code,
+                "bytes": len(res.content),
+                "frio_s": round(frio, 4),
+                "quente_mediana_s": round(statistics.median(quentes), 4) if quentes else None,
+                "quente_max_s": round(max(quentes), 4) if quentes else None,
+                "chamadas_magazord_frio": chamadas_frio,
+                "chamadas_magazord_quente": chamadas_quente,
+                "pico_rss_mb": _pico_rss_mb(),
+            }
+            print(f"  {nome:<20} frio {frio:7.3f}s  quente {resultado['rotas'][nome]['quente_mediana_s'] or 0:7.4f}s  "
+                  f"chamadas {sum(chamadas_frio.values()):>6}", file=sys.stderr)
+    resultado["total_s"] = round(time.perf_counter() - inicio, 3)
+    resultado["pico_rss_mb"] = _pico_rss_mb()
+    return resultado
+
+def _filho(args):
+    # Roda dentro de uma pasta temporária: banco e arquivos JSON novos a cada cenário
+    sys.path.insert(0, BACKEND)
+    os.environ.update({"MAGAZORD_URL": args.url_fake, "MAGAZORD_USER": "bench", "MAGAZORD_PASS": "bench",
+                       "BANCO_PEDIDOS": os.path.join(os.getcwd(), "pedidos.db"), "ROBOS_DESLIGADOS": "1"})
+    print(json.dumps(_medir(args.url_fake, args.repeticoes)))
+
+# --- PROCESSO PRINCIPAL ---
+def _versao():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True, text=True).stdout.strip() or None
+    except: return None
+
+def rodar(args):
+    relatorio = {
+        "versao": _versao(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "latencia_ms": args.latencia_ms,
+        "repeticoes": args.repeticoes,
+        "frio": FRIO,
+        "cenarios": [],
+    }
+    for pedidos in args.pedidos:
+        print(f"== {pedidos} pedidos ==", file=sys.stderr)
+        # O Magazord falso roda em outro processo: no mesmo processo ele disputaria o GIL com o backend medido
+        fake = subprocess.Popen([sys.executable, os.path.join(PASTA, "fake_magazord.py"), "--pedidos", str(pedidos), "--porta", "0",
+                                 "--latencia-ms", str(args.latencia_ms), "--jitter-ms", str(args.jitter_ms),
+                                 "--taxa-erro", str(args.taxa_erro)], stdout=subprocess.PIPE, text=True)
+        url_fake = fake.stdout.readline().strip()
+        try:
+            with tempfile.TemporaryDirectory(prefix="bench-magazord-") as pasta:
+                cmd = [sys.executable, os.path.abspath(__file__), "--filho", "--url-fake", url_fake, "--repeticoes", str(args.repeticoes)]
+                proc = subprocess.run(cmd, cwd=pasta, stdout=subprocess.PIPE, text=True)
+        finally:
+            fake.terminate()
+            fake.wait()
+        if proc.returncode != 0:
+            print(f"  falhou (código {proc.returncode})", file=sys.stderr)
+            relatorio["cenarios"].append({"pedidos": pedidos, "erro": proc.returncode})
+            continue
+        cenario = json.loads(proc.stdout.strip().splitlines()[-1])
+        relatorio["cenarios"].append({"pedidos": pedidos, **cenario})
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"Resultado salvo em {args.saida}", file=sys.stderr)
+
+def comparar(antes_arq, depois_arq):
+    with open(antes_arq, encoding="utf-8") as f: antes = json.load(f)
+    with open(depois_arq, encoding="utf-8") as f: depois = json.load(f)
+    print(f"{antes.get('versao')} -> {depois.get('versao')}")
+    por_escala = {c["pedidos"]: c for c in antes["cenarios"] if "rotas" in c}
+    for cenario in depois["cenarios"]:
+        base = por_escala.get(cenario["pedidos"])
+        if not base or "rotas" not in cenario: continue
+        print(f"\n== {cenario['pedidos']} pedidos (RSS {base['pico_rss_mb']} -> {cenario['pico_rss_mb']} MB) ==")
+        for nome, etapa in cenario.get("carga_inicial", {}).items():
+            b = base.get("carga_inicial", {}).get(nome)
+            if not b or not b["s"]: continue
+            print(f"  carga {nome:<14} {'s':<17} {b['s']:8.4f} -> {etapa['s']:8.4f}  ({(etapa['s'] - b['s']) / b['s'] * 100:+.0f}%)")
+        for nome, r in cenario["rotas"].items():
+            b = base["rotas"].get(nome)
+            if not b: continue
+            for campo in ("frio_s", "quente_mediana_s"):
+                va, vd = b.get(campo), r.get(campo)
+                if not va or vd is None: continue
+                print(f"  {nome:<20} {campo:<17} {va:8.4f} -> {vd:8.4f}  ({(vd - va) / va * 100:+.0f}%)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das rotas do dashboard contra o Magazord falso")
+    parser.add_argument("--pedidos", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--latencia-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", default=os.path.join(PASTA, "resultados.json"))
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DEPOIS"))
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--url-fake", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar: comparar(*args.comparar)
+    elif args.filho: _filho(args)
+    else: rodar(args)
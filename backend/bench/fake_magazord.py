@@ -0,0 +1,274 @@
+import re
+import sys
+import json
+import time
+import random
+import bisect
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# ==========================================
+# MAGAZORD DE MENTIRA (PARA BENCHMARK OFFLINE)
+# ==========================================
+# Gera pedidos, pessoas, carrinhos e estoque sintéticos, sempre iguais para a mesma semente,
+# e responde os mesmos caminhos que o dashboard usa. As fichas detalhadas são montadas
+# na hora a partir do código (não ocupam memória mesmo com 100 mil pedidos).
+#
+#   python bench/fake_magazord.py --pedidos 10000 --porta 8999 --latencia-ms 30
+#
+# GET /__stats devolve as chamadas recebidas por caminho (?zerar=1 zera a contagem).
+
+SITUACOES = [
+    (4, "Entregue", 40), (3, "Aprovado", 15), (5, "Em Transporte", 12), (1, "Aguardando Pagamento", 10),
+    (6, "Cancelado", 8), (2, "Pendente Envio", 8), (17, "Devolvido Financeiro", 4), (18, "Estorno Cancelado", 3),
+]
+PRODUTOS = [
+    ("Terno Slim", "Ternos", 899.0), ("Terno Tradicional", "Ternos", 799.0), ("Blazer Linho", "Blazers", 499.0),
+    ("Camisa Social", "Camisas", 159.0), ("Camisa Slim", "Camisas", 179.0), ("Gravata Seda", "Acessórios", 89.0),
+    ("Cinto Couro", "Acessórios", 119.0), ("Calça Social", "Calças", 229.0), ("Colete", "Ternos", 259.0),
+    ("Sapato Oxford", "Calçados", 349.0), ("Abotoadura", "Acessórios", 69.0), ("Smoking", "Ternos", 1299.0),
+]
+CORES = ["Preto", "Azul Marinho", "Cinza", "Grafite", "Branco"]
+TAMANHOS = ["46", "48", "50", "52", "54", "56", "P", "M", "G", "GG"]
+PAGAMENTOS = ["Pix", "Cartão de Crédito", "Boleto", "Cartão de Débito"]
+LOCAIS = [("SP", "São Paulo"), ("SP", "Campinas"), ("RJ", "Rio de Janeiro"), ("MG", "Belo Horizonte"),
+          ("PR", "Curitiba"), ("RS", "Porto Alegre"), ("SC", "Florianópolis"), ("BA", "Salvador"),
+          ("GO", "Goiânia"), ("PE", "Recife"), ("DF", "Brasília"), ("CE", "Fortaleza")]
+
+class Base:
+    def __init__(self, pedidos, semente=42, dias=600, agora=None):
+        self.semente = semente
+        # Mesmo relógio do dashboard (horário de Brasília, sem fuso)
+        self.agora = agora or (datetime.now(timezone.utc) - timedelta(hours=3)).replace(microsecond=0, tzinfo=None)
+        rnd = random.Random(semente)
+        n_pessoas = max(200, pedidos // 4)
+        n_carrinhos = max(100, pedidos // 5)
+
+        pesos = [p for _, _, p in SITUACOES]
+        self.pedidos = []
+        for i in range(pedidos):
+            dt = self.agora - timedelta(minutes=rnd.randint(0, 60 * 24 * dias))
+            sid, desc, _ = rnd.choices(SITUACOES, weights=pesos)[0]
+            codigo = str(1000000 + i)
+            self.pedidos.append({
+                "id": 1000000 + i, "codigo": codigo, "dataHora": dt.strftime("%Y-%m-%d %H:%M:%S"),
+                "pedidoSituacao": sid, "pedidoSituacaoDescricao": desc,
+                "valorTotal": "0.00", "valorFrete": "%.2f" % rnd.choice([0, 0, 19.9, 29.9, 39.9]),
+                "pessoaId": rnd.randint(1, n_pessoas),
+            })
+        self.pedidos.sort(key=lambda p: p["dataHora"])
+        for p in self.pedidos:
+            itens = self._itens(p["codigo"])
+            p["valorTotal"] = "%.2f" % (sum(float(i["valorItem"]) for i in itens) + float(p["valorFrete"]))
+        self.por_codigo = {p["codigo"]: p for p in self.pedidos}
+        self.datas_pedidos = [p["dataHora"][:10] for p in self.pedidos]
+
+        self.pessoas = []
+        for pid in range(1, n_pessoas + 1):
+            atualizacao = self.agora - timedelta(minutes=rnd.randint(0, 60 * 24 * 900))
+            nascimento = datetime(rnd.randint(1950, 2006), rnd.randint(1, 12), rnd.randint(1, 28))
+            self.pessoas.append({"id": pid, "nome": f"Cliente {pid}", "email": f"cliente{pid}@exemplo.com",
+                                 "dataNascimento": nascimento.strftime("%Y-%m-%d") if rnd.random() > 0.15 else None,
+                                 "dataAtualizacao": atualizacao.strftime("%Y-%m-%d %H:%M:%S")})
+        self.pessoas.sort(key=lambda p: p["dataAtualizacao"])
+        self.pessoas_por_id = {p["id"]: p for p in self.pessoas}
+        self.datas_pessoas = [p["dataAtualizacao"][:10] for p in self.pessoas]
+
+        self.carrinhos = []
+        for cid in range(1, n_carrinhos + 1):
+            inicio = self.agora - timedelta(minutes=rnd.randint(0, 60 * 24 * 60))
+            atualizacao = min(self.agora, inicio + timedelta(minutes=rnd.randint(0, 60 * 12)))
+            self.carrinhos.append({"id": 50000 + cid, "dataInicio": inicio.strftime("%Y-%m-%dT%H:%M:%S-03:00"),
+                                   "dataAtualizacao": atualizacao.strftime("%Y-%m-%d %H:%M:%S"),
+                                   "pedido": {"id": rnd.randint(1, 10 ** 6)} if rnd.random() < 0.3 else None,
+                                   "pessoaId": rnd.randint(1, n_pessoas) if rnd.random() < 0.6 else None})
+        self.carrinhos.sort(key=lambda c: c["dataAtualizacao"])
+        self.datas_carrinhos = [c["dataAtualizacao"][:10] for c in self.carrinhos]
+        self.carrinho_por_id = {str(c["id"]): c for c in self.carrinhos}
+
+        # Projeção de estoque: um SKU por produto/cor/tamanho, no mesmo formato de produtoDerivacaoCodigo dos itens
+        self.estoque = []
+        for k, (nome, _, _) in enumerate(PRODUTOS):
+            for ci, cor in enumerate(CORES):
+                for ti, tamanho in enumerate(TAMANHOS):
+                    self.estoque.append({"sku": f"{k + 1:03d}-{ci}{ti:02d}", "nome": f"{nome} {cor} / {tamanho}",
+                                         "midia": f"produto/{nome.lower().replace(' ', '-')}-{ci}.jpg",
+                                         "quantidadeDisponivel": rnd.randint(0, 40)})
+
+    # --- FICHAS MONTADAS SOB DEMANDA ---
+    def _rnd(self, chave):
+        return random.Random(f"{self.semente}:{chave}")
+
+    def _itens(self, codigo):
+        rnd = self._rnd(f"pedido:{codigo}")
+        itens = []
+        for _ in range(rnd.choices([1, 2, 3, 4, 5], weights=[45, 30, 15, 7, 3])[0]):
+            k = rnd.randrange(len(PRODUTOS))
+            nome, categoria, preco = PRODUTOS[k]
+            cor, tamanho = rnd.choice(CORES), rnd.choice(TAMANHOS)
+            itens.append({"produtoNome": nome, "categoria": categoria,
+                          "produtoDerivacaoCodigo": f"{k + 1:03d}-{CORES.index(cor)}{TAMANHOS.index(tamanho):02d}",
+                          "produtoDerivacaoNome": f"{cor} / {tamanho}",
+                          "quantidade": str(rnd.choices([1, 2], weights=[90, 10])[0]),
+                          "valorItem": "%.2f" % (preco * rnd.choice([1, 1, 1, 0.9, 0.85]))})
+        return itens
+
+    def detalhe_pedido(self, codigo):
+        p = self.por_codigo.get(codigo)
+        if not p: return None
+        rnd = self._rnd(f"detalhe:{codigo}")
+        pessoa = self.pessoas_por_id.get(p["pessoaId"], {})
+        estado, cidade = rnd.choice(LOCAIS)
+        itens = self._itens(codigo)
+        rastreios = [{"codigoRastreio": f"BR{codigo}{n}", "pedidoItem": itens[n::2]} for n in range(2 if len(itens) > 2 else 1)]
+        return {"id": p["id"], "codigo": codigo, "dataHora": p["dataHora"],
+                "pedidoSituacao": p["pedidoSituacao"], "pedidoSituacaoDescricao": p["pedidoSituacaoDescricao"],
+                "pedidoFormaPagamentoDescricao": rnd.choice(PAGAMENTOS),
+                "pessoaNome": pessoa.get("nome"), "clienteNome": pessoa.get("nome"), "pessoaEmail": pessoa.get("email"),
+                "estadoSigla": estado, "cidadeNome": cidade,
+                "valorTotalFinal": p["valorTotal"], "valorFrete": p["valorFrete"],
+                "arrayPedidoRastreio": rastreios}
+
+    def detalhe_pessoa(self, pid):
+        p = self.pessoas_por_id.get(int(pid)) if str(pid).isdigit() else None
+        if not p: return None
+        rnd = self._rnd(f"pessoa:{pid}")
+        estado, cidade = rnd.choice(LOCAIS)
+        return {"id": p["id"], "nome": p["nome"], "email": p["email"], "dataNascimento": p["dataNascimento"],
+                "pessoaEndereco": [{"estadoSigla": estado, "cidadeNome": cidade, "cep": "01000-000"}],
+                "pessoaContato": [{"tipo": "celular", "contato": f"(11) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}"}]}
+
+    def itens_carrinho(self, cid):
+        c = self.carrinho_por_id.get(str(cid))
+        if not c: return None
+        rnd = self._rnd(f"carrinho:{cid}")
+        pessoa = self.pessoas_por_id.get(c["pessoaId"]) if c["pessoaId"] else None
+        itens = []
+        for _ in range(rnd.randint(1, 4)):
+            nome, _, preco = rnd.choice(PRODUTOS)
+            itens.append({"produto_nome": nome, "valor": preco,
+                          "midia_url": f"https://cdn.exemplo.com/img/{nome.lower().replace(' ', '-')}.jpg"})
+        return {"carrinho": {"id": c["id"], "url_checkout": f"https://loja.exemplo.com/checkout/{cid}",
+                             "pessoa": {"nome": pessoa["nome"], "email": pessoa["email"], "contato_principal": "(11) 99999-0000"} if pessoa else {},
+                             "itens": itens}}
+
+# --- LISTAGENS COM FILTRO POR DATA (BUSCA BINÁRIA, SEM VARRER TUDO) ---
+def _fatia(registros, datas, inicio, fim):
+    a = bisect.bisect_left(datas, inicio) if inicio else 0
+    b = bisect.bisect_right(datas, fim) if fim else len(datas)
+    return a, max(a, b)
+
+def _pagina(registros, a, b, pagina, limite, decrescente):
+    total = b - a
+    ini = (pagina - 1) * limite
+    if decrescente:
+        itens = [registros[i] for i in range(b - 1 - ini, max(a, b - ini - limite) - 1, -1)] if ini < total else []
+    else:
+        itens = registros[a + ini:min(b, a + ini + limite)] if ini < total else []
+    return {"data": {"items": itens, "total": total, "page": pagina, "limit": limite, "has_more": ini + limite < total}}
+
+def _publico(registro):
+    return {k: v for k, v in registro.items() if k != "pessoaId"}
+
+class Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, base, latencia_ms=0, jitter_ms=0, taxa_erro=0.0):
+        super().__init__(endereco, Manipulador)
+        self.base = base
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.taxa_erro = taxa_erro
+        self.chamadas = {}
+        self.lock = threading.Lock()
+
+    def contar(self, caminho):
+        chave = re.sub(r"/\d+(?=/|$)", "/{id}", caminho.replace("/v2/site", "", 1))
+        with self.lock: self.chamadas[chave] = self.chamadas.get(chave, 0) + 1
+
+class Manipulador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # cabeçalho e corpo saem em escritas separadas: sem isso o keep-alive trava ~40ms por chamada
+
+    def log_message(self, *args): pass
+
+    def _responder(self, status, corpo, cabecalhos=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        for k, v in (cabecalhos or {}).items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        srv, base = self.server, self.server.base
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        caminho = url.path
+
+        if caminho == "/__stats":
+            with srv.lock:
+                chamadas = dict(srv.chamadas)
+                if q.get("zerar"): srv.chamadas.clear()
+            return self._responder(200, chamadas)
+
+        srv.contar(caminho)
+        if srv.latencia_ms or srv.jitter_ms:
+            time.sleep(max(0, srv.latencia_ms + random.uniform(-srv.jitter_ms, srv.jitter_ms)) / 1000)
+        if srv.taxa_erro and random.random() < srv.taxa_erro:
+            if random.random() < 0.5: return self._responder(429, {"erro": "limite"}, {"Retry-After": "1"})
+            return self._responder(503, {"erro": "indisponível"})
+
+        pagina, limite = int(q.get("page", 1)), min(int(q.get("limit", 100)), 100)
+        decrescente = q.get("orderDirection", "desc") == "desc"
+        partes = caminho.rstrip("/").split("/")
+
+        if caminho == "/v2/site/pedido":
+            a, b = _fatia(base.pedidos, base.datas_pedidos, q.get("dataInicio"), q.get("dataFim"))
+            resp = _pagina(base.pedidos, a, b, pagina, limite, decrescente)
+            resp["data"]["items"] = [_publico(p) for p in resp["data"]["items"]]
+            return self._responder(200, resp)
+        if caminho.startswith("/v2/site/pedido/") and len(partes) == 5:
+            det = base.detalhe_pedido(partes[4])
+            return self._responder(200, {"status": "success", "data": det}) if det else self._responder(404, {"erro": "não encontrado"})
+        if caminho == "/v2/site/pessoa":
+            a, b = _fatia(base.pessoas, base.datas_pessoas, q.get("dataAtualizacaoInicio"), q.get("dataAtualizacaoFim"))
+            return self._responder(200, _pagina(base.pessoas, a, b, pagina, limite, decrescente))
+        if caminho.startswith("/v2/site/pessoa/") and len(partes) == 5:
+            det = base.detalhe_pessoa(partes[4])
+            return self._responder(200, {"status": "success", "data": det}) if det else self._responder(404, {"erro": "não encontrado"})
+        if caminho == "/v2/site/carrinho":
+            a, b = _fatia(base.carrinhos, base.datas_carrinhos, q.get("dataAtualizacaoInicio"), q.get("dataAtualizacaoFim"))
+            resp = _pagina(base.carrinhos, a, b, pagina, limite, decrescente)
+            resp["data"]["items"] = [_publico(c) for c in resp["data"]["items"]]
+            return self._responder(200, resp)
+        if caminho.startswith("/v2/site/carrinho/") and caminho.endswith("/itens"):
+            det = base.itens_carrinho(partes[4])
+            return self._responder(200, {"status": "success", "data": det}) if det else self._responder(404, {"erro": "não encontrado"})
+        if caminho == "/v2/site/estoque/projecaoEstoque/produtoDerivacao":
+            return self._responder(200, _pagina(base.estoque, 0, len(base.estoque), pagina, limite, False))
+        return self._responder(404, {"erro": f"caminho desconhecido: {caminho}"})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor falso da API Magazord")
+    parser.add_argument("--pedidos", type=int, default=1000)
+    parser.add_argument("--porta", type=int, default=8999)
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de respostas 429/503 (testa a resiliência)")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    base = Base(args.pedidos, args.semente)
+    srv = Servidor(("127.0.0.1", args.porta), base, args.latencia_ms, args.jitter_ms, args.taxa_erro)
+    url = f"http://127.0.0.1:{srv.server_address[1]}"
+    print(f"Magazord falso em {url} — {len(base.pedidos)} pedidos, {len(base.pessoas)} pessoas, "
+          f"{len(base.carrinhos)} carrinhos (gerados em {time.perf_counter() - t:.1f}s)", file=sys.stderr)
+    print(url, flush=True)  # --porta 0 escolhe uma porta livre: quem sobe o servidor lê a URL daqui
+    try: srv.serve_forever()
+    except KeyboardInterrupt: pass
@@ -0,0 +1,149 @@
+import os
+import json
+import inspect
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+import coalescencia
+import metricas
+
+MAX_ENTRADAS = int(os.getenv("CACHE_RESPOSTAS_MAX", 256))
+JANELA_STALE = int(os.getenv("CACHE_RESPOSTAS_STALE_SEGUNDOS", 600))  # quanto tempo uma resposta vencida ainda pode ser servida
+
+_entradas = OrderedDict()   # chave -> {"corpo", "etag", "expira", "revalidando"}
+_lock = threading.Lock()
+_revalidador = ThreadPoolExecutor(max_workers=2, thread_name_prefix="revalidacao")
+
+def _chave(rota, kwargs):
+    # Rota + parâmetros normalizados (ordem fixa, sem os que vieram vazios)
+    params = sorted((k, str(v)) for k, v in kwargs.items() if v is not None)
+    return f"{rota}?{urlencode(params)}"
+
+def _serializar(resultado):
+    return json.dumps(jsonable_encoder(resultado), ensure_ascii=False).encode("utf-8")
+
+def _guardar(chave, resultado, ttl):
+    with metricas.fase("gravacao_cache"):
+        corpo = _serializar(resultado)
+        entrada = {"corpo": corpo, "etag": f'"{hashlib.sha1(corpo).hexdigest()}"',
+                   "expira": time.monotonic() + ttl, "revalidando": False}
+        with _lock:
+            _entradas[chave] = entrada
+            _entradas.move_to_end(chave)
+            while len(_entradas) > MAX_ENTRADAS:
+                _entradas.popitem(last=False)
+    return entrada
+
+def _calcular(chave, funcao, kwargs, ttl):
+    with metricas.fase("agregacao"):
+        resultado = funcao(**kwargs)
+    return _guardar(chave, resultado, ttl)
+
+def _revalidar(chave, funcao, kwargs, ttl):
+    try:
+        coalescencia.executar(chave, _calcular, chave, funcao, kwargs, ttl)
+    except Exception as e:
+        print(f"Erro ao revalidar {chave}: {e}")
+        with _lock:
+            if chave in _entradas: _entradas[chave]["revalidando"] = False
+
+def _consultar(rota, funcao, kwargs, ttl):
+    # (entrada, "HIT" | "STALE" | "MISS")
+    chave = _chave(rota, kwargs)
+    agora = time.monotonic()
+    status_cache = None
+    with metricas.fase("cache"), _lock:
+        entrada = _entradas.get(chave)
+        if entrada:
+            _entradas.move_to_end(chave)
+            if agora < entrada["expira"]:
+                status_cache = "HIT"
+            elif agora < entrada["expira"] + JANELA_STALE:
+                if not entrada["revalidando"]:
+                    entrada["revalidando"] = True
+                    _revalidador.submit(_revalidar, chave, funcao, kwargs, ttl)
+                status_cache = "STALE"
+    if status_cache is None:
+        # Vários pedidos iguais ao mesmo tempo: só o primeiro calcula, os outros esperam por ele
+        entrada, status_cache = coalescencia.executar(chave, _calcular, chave, funcao, kwargs, ttl), "MISS"
+    metricas.contar("cache_consultas_total", cache="respostas", resultado=status_cache.lower())
+    return entrada, status_cache
+
+def resposta_json(corpo, status_cache):
+    return Response(content=corpo, media_type="application/json",
+                    headers={"ETag": f'"{hashlib.sha1(corpo).hexdigest()}"', "Cache-Control": "private, no-cache", "X-Cache": status_cache})
+
+def em_cache(rota, ttl):
+    # Decorador das rotas GET: guarda a resposta serializada por `ttl` segundos.
+    # Vencida (até JANELA_STALE), devolve a antiga na hora e recalcula em segundo plano.
+    # rota.corpo(**kwargs) devolve (bytes do JSON, status do cache), para compor respostas maiores;
+    # rota.corpo(sem_cache=True, ...) calcula sem ler nem gravar o cache (status "BYPASS", usado pelo perfilador)
+    def decorador(funcao):
+        assinatura = inspect.signature(funcao)
+
+        @wraps(funcao)
+        def wrapper(**kwargs):
+            entrada, status_cache = _consultar(rota, funcao, kwargs, ttl)
+            return Response(content=entrada["corpo"], media_type="application/json",
+                            headers={"ETag": entrada["etag"], "Cache-Control": "private, no-cache", "X-Cache": status_cache})
+
+        def corpo(sem_cache=False, **kwargs):
+            # Completa com os padrões da rota: a chave fica igual à de quem chama pela URL
+            argumentos = assinatura.bind(**kwargs)
+            argumentos.apply_defaults()
+            if sem_cache:
+                with metricas.fase("agregacao"):
+                    resultado = funcao(**argumentos.arguments)
+                return _serializar(resultado), "BYPASS"
+            entrada, status_cache = _consultar(rota, funcao, argumentos.arguments, ttl)
+            return entrada["corpo"], status_cache
+
+        wrapper.corpo = corpo
+        return wrapper
+    return decorador
+
+def marcar_desatualizado(rota=None):
+    # Chamado quando chegam dados novos: as respostas continuam servíveis, mas serão recalculadas.
+    # Com `rota`, só as respostas daquela rota.
+    agora = time.monotonic()
+    with _lock:
+        for chave, entrada in _entradas.items():
+            if rota is None or chave.startswith(f"{rota}?"):
+                entrada["expira"] = min(entrada["expira"], agora)
+
+def limpar():
+    # Esvazia o cache (benchmark: cada rota medida fria de verdade)
+    with _lock: _entradas.clear()
+
+# --- MIDDLEWARE: 304 NOT MODIFIED ---
+def _sem_fraco(etag):
+    return etag[2:] if etag.startswith("W/") else etag
+
+def _casa(if_none_match, etag):
+    # Comparação fraca (RFC 9110): cada tag da lista separada por vírgula, ignorando o prefixo W/
+    tags = [tag.strip() for tag in if_none_match.split(",") if tag.strip()]
+    return "*" in tags or any(_sem_fraco(tag) == _sem_fraco(etag) for tag in tags)
+
+def _com_vary(vary):
+    return vary if "accept-encoding" in vary.lower() else ", ".join(v for v in (vary, "Accept-Encoding") if v)
+
+async def middleware_etag(request, call_next):
+    response = await call_next(request)
+    etag = response.headers.get("etag")
+    if not etag: return response
+    # O GZip roda por dentro: corpo comprimido e corpo puro não podem dividir a mesma ETag forte
+    codificacao = response.headers.get("content-encoding")
+    if codificacao and codificacao != "identity" and etag.endswith('"'):
+        etag = f'{etag[:-1]}-{codificacao}"'
+        response.headers["etag"] = etag
+    vary = _com_vary(response.headers.get("vary", ""))
+    response.headers["vary"] = vary
+    if request.method == "GET" and _casa(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": vary, "Cache-Control": response.headers.get("cache-control", "no-cache")})
+    return response
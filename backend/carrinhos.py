@@ -0,0 +1,231 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import banco_pedidos
+import cliente_magazord
+import coalescencia
+import metricas
+import miniaturas
+from sincronizacao import get_now_br
+
+# De quanto em quanto tempo o robô relê os carrinhos alterados
+CARRINHOS_INTERVALO = int(os.getenv("CARRINHOS_INTERVALO_SEGUNDOS", 120))
+# Janela da primeira carga (pedidos com `dias` maior completam o índice sob demanda)
+CARRINHOS_JANELA_INICIAL = int(os.getenv("CARRINHOS_JANELA_INICIAL_DIAS", 7))
+CARRINHOS_WORKERS = int(os.getenv("CARRINHOS_WORKERS", 10))
+CARRINHOS_MAX_PAGINAS = 200
+MAX_LEADS = 30
+
+_parar = threading.Event()
+_thread = None
+_ao_atualizar = []    # Avisados quando o índice muda (ex.: cache de respostas)
+_falhou = False       # Última atualização não chegou ao fim (índice pode estar velho)
+
+def _criar_tabelas(con):
+    with con:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS carrinhos (
+                id INTEGER PRIMARY KEY,
+                data_inicio TEXT,
+                data_atualizacao TEXT,
+                virou_pedido INTEGER DEFAULT 0,
+                resumo TEXT,
+                detalhe TEXT,
+                detalhe_versao TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_carrinhos_inicio ON carrinhos (data_inicio);
+        """)
+
+banco_pedidos.registrar_extensao(_criar_tabelas)
+
+# ==========================================
+# ÍNDICE LOCAL (LISTAGEM + ITENS POR (id, dataAtualizacao))
+# ==========================================
+def _buscar_itens(cid):
+    try:
+        res_det = cliente_magazord.get(f"/v2/site/carrinho/{cid}/itens", timeout=10)
+        if res_det.status_code == 200:
+            return cid, res_det.json().get('data', {}).get('carrinho', {})
+    except: pass
+    return cid, None
+
+def _gravar_pagina(con, items):
+    # Só pede os itens de quem não virou pedido e mudou desde a última busca
+    ids = [item.get('id') for item in items]
+    marcas = ",".join("?" * len(ids))
+    versoes = dict(con.execute(f"SELECT id, detalhe_versao FROM carrinhos WHERE id IN ({marcas})", ids).fetchall())
+    with con:
+        con.executemany("""
+            INSERT INTO carrinhos (id, data_inicio, data_atualizacao, virou_pedido, resumo) VALUES (?,?,?,?,?)
+            ON CONFLICT(id) DO UPDATE SET data_inicio = excluded.data_inicio, data_atualizacao = excluded.data_atualizacao,
+                virou_pedido = excluded.virou_pedido, resumo = excluded.resumo
+        """, [(item.get('id'), str(item.get('dataInicio') or '')[:19], item.get('dataAtualizacao'),
+               1 if item.get('pedido') else 0, json.dumps(item, ensure_ascii=False)) for item in items])
+    abertos = [item for item in items if not item.get('pedido')]
+    mudaram = [item for item in abertos if versoes.get(item.get('id')) != item.get('dataAtualizacao')]
+    metricas.contar_cache("itens_carrinhos", len(abertos) - len(mudaram), len(mudaram))
+    return mudaram
+
+def _baixar_intervalo(data_inicio, data_fim=None):
+    # Lista os carrinhos alterados entre data_inicio e data_fim (padrão: até hoje) e atualiza as fichas que mudaram.
+    # Lista do mais antigo para o mais novo: parando no meio (erro, teto de páginas), tudo até maior_data já foi lido
+    # e a marca d'água pode avançar até lá. Carrinho sem itens segura maior_data na data dele (a listagem volta nele).
+    # completo = False se a listagem parou no meio ou algum carrinho ficou sem itens
+    con = banco_pedidos.conexao()
+    data_fim = (data_fim or (get_now_br() + timedelta(days=1)).date()).strftime("%Y-%m-%d")  # amanhã: garante os de hoje
+    mudaram = []
+    maior_data = None
+    completo = False
+    for pagina in range(1, CARRINHOS_MAX_PAGINAS + 1):
+        res = cliente_magazord.get("/v2/site/carrinho", params={
+            "limit": 100, "page": pagina, "orderDirection": "asc",
+            "dataAtualizacaoInicio": data_inicio.strftime("%Y-%m-%d"), "dataAtualizacaoFim": data_fim})
+        if res.status_code != 200: break
+        items = res.json().get('data', {}).get('items', [])
+        if not items:
+            completo = True
+            break
+        mudaram.extend(_gravar_pagina(con, items))
+        maior_data = max([maior_data or ''] + [str(item.get('dataAtualizacao') or '') for item in items])
+        if len(items) < 100:
+            completo = True
+            break
+    else:
+        print(f"⚠️ Carrinhos: teto de {CARRINHOS_MAX_PAGINAS} páginas atingido, continua de {maior_data} na próxima rodada")
+
+    if mudaram:
+        versoes = {item.get('id'): item.get('dataAtualizacao') for item in mudaram}
+        with ThreadPoolExecutor(max_workers=CARRINHOS_WORKERS) as executor:
+            fichas = [(cid, dados) for cid, dados in executor.map(metricas.no_contexto(_buscar_itens), versoes) if dados is not None]
+        with con:
+            con.executemany("UPDATE carrinhos SET detalhe = ?, detalhe_versao = ? WHERE id = ?",
+                            [(json.dumps(dados, ensure_ascii=False), versoes[cid], cid) for cid, dados in fichas])
+        # Quem falhou segue com a versão antiga: a próxima listagem (da mesma marca d'água) tenta de novo
+        if len(fichas) < len(versoes):
+            print(f"⚠️ {len(versoes) - len(fichas)} carrinhos sem itens nesta rodada")
+            completo = False
+            buscados = {cid for cid, _ in fichas}
+            maior_data = min([maior_data] + [str(versao) for cid, versao in versoes.items() if cid not in buscados and versao])
+    return maior_data, completo, len(mudaram)
+
+def _atualizar():
+    global _falhou
+    banco_pedidos.inicializar()
+    watermark = banco_pedidos.ler_estado('carrinhos_watermark')
+    if watermark:
+        # A API filtra por dia: relê o dia da marca d'água
+        data_inicio = datetime.strptime(watermark[:10], "%Y-%m-%d").date()
+    else:
+        data_inicio = (get_now_br() - timedelta(days=CARRINHOS_JANELA_INICIAL)).date()
+        # A primeira carga pode levar mais de uma rodada: a cobertura começa daqui quando ela terminar
+        banco_pedidos.gravar_estado('carrinhos_carga_inicio', data_inicio.strftime("%Y-%m-%d"))
+
+    try:
+        maior_data, completo, mudaram = _baixar_intervalo(data_inicio)
+    except Exception:
+        _falhou = True
+        raise
+    _falhou = not completo
+    # Mesmo sem chegar ao fim: o que foi lido fica salvo e a próxima rodada continua dali
+    if maior_data and maior_data > (watermark or ''): banco_pedidos.gravar_estado('carrinhos_watermark', maior_data)
+    if completo and not banco_pedidos.ler_estado('carrinhos_cobertura'):
+        banco_pedidos.gravar_estado('carrinhos_cobertura', banco_pedidos.ler_estado('carrinhos_carga_inicio') or data_inicio.strftime("%Y-%m-%d"))
+    if mudaram:
+        for funcao in _ao_atualizar:
+            try: funcao()
+            except Exception as e: print(f"Erro ao avisar atualização de carrinhos: {e}")
+
+def atualizar_carrinhos():
+    with metricas.cronometro("sincronizacao_segundos", tipo="carrinhos"):
+        coalescencia.executar("atualizar_carrinhos", _atualizar)
+
+def garantir_cobertura(data_inicio):
+    # `dias` maior que o índice: busca uma vez só o trecho mais antigo que falta.
+    # Retorna False quando o índice ficou sem parte do período (resposta parcial).
+    with metricas.fase("paginacao"):
+        try:
+            cobertura = banco_pedidos.ler_estado('carrinhos_cobertura')
+            if not cobertura:
+                atualizar_carrinhos()
+                cobertura = banco_pedidos.ler_estado('carrinhos_cobertura')
+                if not cobertura: return False
+            if data_inicio >= datetime.strptime(cobertura, "%Y-%m-%d").date(): return True
+            return coalescencia.executar(f"carrinhos_cobertura:{data_inicio}", _completar_cobertura, data_inicio)
+        except Exception as e:
+            print(f"Erro ao completar carrinhos desde {data_inicio}: {e}")
+            return False
+
+def _completar_cobertura(data_inicio):
+    cobertura = datetime.strptime(banco_pedidos.ler_estado('carrinhos_cobertura'), "%Y-%m-%d").date()
+    if data_inicio >= cobertura: return True
+    # Só o trecho que falta: o que já está no índice é mantido pelo robô
+    _, completo, _ = _baixar_intervalo(data_inicio, cobertura)
+    if completo: banco_pedidos.gravar_estado('carrinhos_cobertura', data_inicio.strftime("%Y-%m-%d"))
+    return completo
+
+def em_dia():
+    return not _falhou and cliente_magazord.api_disponivel()
+
+def registrar_ao_atualizar(funcao):
+    if funcao not in _ao_atualizar: _ao_atualizar.append(funcao)
+
+# ==========================================
+# LEITURA: LEADS DIRETO DO ÍNDICE
+# ==========================================
+def _lead(cid, data_inicio, dados):
+    pessoa = dados.get('pessoa', {})
+    if not (pessoa and (pessoa.get('email') or pessoa.get('contato_principal'))):
+        return None
+    try:
+        data_pt = datetime.strptime(data_inicio[:19], "%Y-%m-%dT%H:%M:%S").strftime("%d/%m/%Y %H:%M")
+    except:
+        data_pt = data_inicio
+    return {
+        "id": cid,
+        "data": data_pt,
+        "nome": pessoa.get('nome'),
+        "email": pessoa.get('email'),
+        "telefone": pessoa.get('contato_principal'),
+        "url_checkout": dados.get('url_checkout'),
+        "total_itens": len(dados.get('itens', [])),
+        "produtos": [
+            {"nome": i.get('produto_nome', 'Produto'), "img": i.get('midia_url'), "miniatura": miniaturas.url_miniatura(i.get('midia_url'))}
+            for i in dados.get('itens', [])
+        ]
+    }
+
+def listar_leads(data_corte, limite=MAX_LEADS):
+    # Carrinhos iniciados a partir de data_corte, sem pedido e com contato, do id mais novo para o mais antigo
+    banco_pedidos.inicializar()
+    leads = []
+    for cid, data_inicio, detalhe in banco_pedidos.conexao().execute("""
+        SELECT id, data_inicio, detalhe FROM carrinhos
+        WHERE virou_pedido = 0 AND detalhe IS NOT NULL AND data_inicio >= ?
+        ORDER BY id DESC
+    """, (data_corte.strftime("%Y-%m-%d"),)):
+        lead = _lead(cid, data_inicio, json.loads(detalhe))
+        if lead: leads.append(lead)
+        if len(leads) >= limite: break
+    return leads
+
+# --- ROBÔ EM SEGUNDO PLANO ---
+def _loop():
+    while not _parar.is_set():
+        try:
+            atualizar_carrinhos()
+        except Exception as e:
+            print(f"Erro na atualização de carrinhos: {e}")
+        _parar.wait(CARRINHOS_INTERVALO)
+
+def iniciar_poller():
+    global _thread
+    banco_pedidos.inicializar()
+    if _thread and _thread.is_alive(): return
+    _parar.clear()
+    _thread = threading.Thread(target=_loop, name="poller-carrinhos", daemon=True)
+    _thread.start()
+
+def parar_poller():
+    _parar.set()
@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import hashlib
+import itertools
+import secrets
+import threading
+from datetime import datetime, timezone
+import requests
+from dotenv import load_dotenv
+import metricas
+
+load_dotenv()
+
+# ==========================================
+# GRAVAÇÃO / REPRODUÇÃO DAS RESPOSTAS DA MAGAZORD (CASSETES)
+# ==========================================
+# MAGAZORD_CASSETES_MODO=gravar      -> cada resposta da API vira um arquivo em MAGAZORD_CASSETES_DIR (sem dados pessoais)
+# MAGAZORD_CASSETES_MODO=reproduzir  -> nenhuma chamada sai para a rede: tudo vem dos arquivos gravados
+# Na reprodução o relógio (get_now_br) fica parado no início da gravação, para os filtros de data
+# baterem com os gravados. Comece com um banco vazio (BANCO_PEDIDOS) para repetir a mesma carga.
+MODO = (os.getenv("MAGAZORD_CASSETES_MODO") or "").strip().lower()
+PASTA = os.getenv("MAGAZORD_CASSETES_DIR", "cassetes")
+# Fixe o sal para manter os mesmos pseudônimos entre gravações diferentes (nunca é salvo nos arquivos)
+SAL = os.getenv("MAGAZORD_CASSETES_SAL") or secrets.token_hex(16)
+SESSAO_FILE = "sessao.json"
+
+# Campos pessoais: trocados por pseudônimos estáveis (o mesmo e-mail vira sempre o mesmo pseudônimo)
+CAMPOS_PESSOAIS = {
+    "email", "pessoaemail", "clienteemail", "pessoanome", "clientenome", "razaosocial", "nomefantasia",
+    "cpf", "cnpj", "cpfcnpj", "documento", "rg", "inscricaoestadual",
+    "telefone", "celular", "contato", "contato_principal", "whatsapp",
+    "logradouro", "numero", "complemento", "bairro", "cep", "pontoreferencia",
+    "url_checkout", "ip",
+}
+# "nome" também é nome de produto/categoria: só é pessoal ao lado de outro campo pessoal
+CAMPOS_SO_COM_PESSOA = {"nome", "sobrenome", "apelido"}
+
+_relogio = None
+_lock = threading.Lock()
+
+def gravando():
+    return MODO == "gravar"
+
+def reproduzindo():
+    return MODO == "reproduzir"
+
+# --- CHAVE DA CHAMADA (SEM HOST E SEM CREDENCIAIS) ---
+def _chave(url, base_url, params):
+    caminho = url[len(base_url):] if base_url and url.startswith(base_url) else url
+    partes = sorted((str(k), str(v)) for k, v in (params or {}).items() if v is not None)
+    texto = caminho + "?" + "&".join(f"{k}={v}" for k, v in partes)
+    return texto, hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+def _arquivo(hash_chave):
+    return os.path.join(PASTA, hash_chave[:2], hash_chave + ".json")
+
+# --- ANONIMIZAÇÃO ---
+def _resumo(valor):
+    return hashlib.sha256(f"{SAL}:{valor}".encode("utf-8")).hexdigest()
+
+def _pseudonimo(campo, valor):
+    if valor in (None, "") or isinstance(valor, bool): return valor
+    texto = str(valor)
+    h = _resumo(texto.strip().lower())
+    if "@" in texto: return f"cliente-{h[:10]}@exemplo.com"
+    if campo == "url_checkout": return f"https://loja.exemplo.com/checkout/{h[:12]}"
+    if campo in CAMPOS_SO_COM_PESSOA or campo.endswith("nome") or campo in ("razaosocial", "nomefantasia"):
+        return f"Cliente {h[:6].upper()}"
+    if re.search(r"\d", texto) and not re.search(r"[a-zA-Z]", texto):
+        # Telefone, CPF, CEP...: mesmos dígitos e pontuação, outros números
+        digitos = itertools.cycle(str(int(h, 16)))
+        trocado = re.sub(r"\d", lambda _: next(digitos), texto)
+        return int(trocado) if isinstance(valor, int) else trocado
+    return f"{campo} {h[:6]}"
+
+def anonimizar(dados):
+    if isinstance(dados, list): return [anonimizar(d) for d in dados]
+    if not isinstance(dados, dict): return dados
+    pessoal = any(k.lower() in CAMPOS_PESSOAIS for k in dados)
+    limpo = {}
+    for k, v in dados.items():
+        campo = k.lower()
+        if campo in CAMPOS_PESSOAIS or (pessoal and campo in CAMPOS_SO_COM_PESSOA):
+            limpo[k] = anonimizar(v) if isinstance(v, (dict, list)) else _pseudonimo(campo, v)
+        elif campo == "datanascimento" and isinstance(v, str) and len(v) >= 10:
+            # A faixa etária só precisa de ano e mês
+            limpo[k] = v[:8] + "01" + v[10:]
+        else:
+            limpo[k] = anonimizar(v)
+    return limpo
+
+# --- GRAVAÇÃO ---
+def _salvar_json(caminho, dados):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = f"{caminho}.{threading.get_ident()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+def _abrir_sessao():
+    # Marca o instante da gravação (uma vez por pasta): é a hora em que a reprodução congela o relógio
+    with _lock:
+        arquivo = os.path.join(PASTA, SESSAO_FILE)
+        if os.path.exists(arquivo): return
+        _salvar_json(arquivo, {"gravado_em": datetime.now(timezone.utc).isoformat()})
+
+def gravar(url, base_url, params, res):
+    try:
+        corpo = res.json()
+    except:
+        return  # Só guardamos JSON (a API da Magazord não devolve outra coisa)
+    texto, hash_chave = _chave(url, base_url, params)
+    try:
+        _abrir_sessao()
+        _salvar_json(_arquivo(hash_chave), {"chamada": texto, "status": res.status_code, "corpo": anonimizar(corpo)})
+    except Exception as e:
+        print(f"Erro ao gravar cassete de {texto}: {e}")
+
+# --- REPRODUÇÃO ---
+def reproduzir(url, base_url, params):
+    texto, hash_chave = _chave(url, base_url, params)
+    try:
+        with open(_arquivo(hash_chave), "r", encoding="utf-8") as f:
+            gravada = json.load(f)
+        metricas.contar_cache("cassetes", 1, 0)
+        status, corpo = gravada["status"], gravada["corpo"]
+    except (OSError, ValueError, KeyError):
+        # Chamada que não foi gravada: quem chama trata como "Magazord sem dados agora" (resposta parcial)
+        metricas.contar_cache("cassetes", 0, 1)
+        print(f"⚠️ Cassete não encontrado: {texto}")
+        status, corpo = 503, {"data": {}}
+    res = requests.Response()
+    res.status_code = status
+    res.url = url
+    res.encoding = "utf-8"
+    res.headers["Content-Type"] = "application/json"
+    res.headers["X-Cassete"] = "reproduzido" if status != 503 else "ausente"
+    res._content = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+    return res
+
+def relogio():
+    # Na reprodução: o instante (UTC) em que a gravação começou; fora dela, None
+    global _relogio
+    if not reproduzindo(): return None
+    if _relogio is None:
+        try:
+            with open(os.path.join(PASTA, SESSAO_FILE), "r", encoding="utf-8") as f:
+                _relogio = datetime.fromisoformat(json.load(f)["gravado_em"])
+        except:
+            _relogio = datetime.now(timezone.utc)
+    return _relogio
@@ -0,0 +1,127 @@
+import os
+import json
+import threading
+from datetime import datetime
+import pandas as pd
+import banco_pedidos
+import cliente_magazord
+import coalescencia
+import metricas
+
+# De quanto em quanto tempo o robô relê a projeção de estoque
+CATALOGO_INTERVALO = int(os.getenv("CATALOGO_INTERVALO_SEGUNDOS", 1800))
+CATALOGO_MAX_PAGINAS = 500
+CDN_URL = (os.getenv("MAGAZORD_CDN_URL") or "https://viadoterno.cdn.magazord.com.br").rstrip('/')
+# Nomes possíveis do saldo disponível na projeção (o primeiro numérico vale)
+CAMPOS_ESTOQUE = ("quantidadeDisponivel", "disponivel", "estoqueDisponivel", "quantidade", "estoque", "saldo")
+
+_parar = threading.Event()
+_thread = None
+_ao_atualizar = []      # Avisados quando algum SKU muda (ex.: cache de respostas)
+_versao = 0             # Sobe a cada atualização com mudança: invalida a tabela em memória
+_tabela = (None, None)  # (versão, DataFrame sku/img/estoque) usada nos rankings
+_lock = threading.Lock()
+
+def _criar_tabelas(con):
+    with con:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS catalogo (
+                sku TEXT PRIMARY KEY,
+                nome TEXT,
+                midia TEXT,
+                estoque REAL,
+                dados TEXT,
+                atualizado_em TEXT
+            );
+        """)
+
+banco_pedidos.registrar_extensao(_criar_tabelas)
+
+# ==========================================
+# CATÁLOGO DE SKUs (PROJEÇÃO DE ESTOQUE): SKU, NOME, IMAGEM E SALDO
+# ==========================================
+def url_imagem(midia):
+    if not midia: return None
+    midia = str(midia)
+    return midia if midia.startswith("http") else f"{CDN_URL}/{midia.lstrip('/')}"
+
+def _estoque(item):
+    for campo in CAMPOS_ESTOQUE:
+        try: return float(item[campo])
+        except: continue
+    return None
+
+def _gravar_pagina(con, items, agora):
+    # Só regrava o SKU se algo mudou desde a última leitura (nome, imagem, saldo...)
+    linhas = []
+    for item in items:
+        sku = item.get('sku') or item.get('codigo')
+        if sku: linhas.append((str(sku), item.get('nome'), item.get('midia'), _estoque(item), json.dumps(item, ensure_ascii=False, sort_keys=True)))
+    if not linhas: return 0
+    marcas = ",".join("?" * len(linhas))
+    guardados = dict(con.execute(f"SELECT sku, dados FROM catalogo WHERE sku IN ({marcas})", [l[0] for l in linhas]).fetchall())
+    mudaram = [l + (agora,) for l in linhas if guardados.get(l[0]) != l[4]]
+    metricas.contar_cache("catalogo", len(linhas) - len(mudaram), len(mudaram))
+    with con:
+        con.executemany("INSERT OR REPLACE INTO catalogo (sku, nome, midia, estoque, dados, atualizado_em) VALUES (?,?,?,?,?,?)", mudaram)
+    return len(mudaram)
+
+def _atualizar():
+    global _versao
+    banco_pedidos.inicializar()
+    con = banco_pedidos.conexao()
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    mudaram = 0
+    for pagina in range(1, CATALOGO_MAX_PAGINAS + 1):
+        res = cliente_magazord.get("/v2/site/estoque/projecaoEstoque/produtoDerivacao", params={"limit": 100, "page": pagina})
+        if res.status_code != 200: break
+        items = res.json().get('data', {}).get('items', [])
+        mudaram += _gravar_pagina(con, items, agora)
+        if len(items) < 100: break
+    if mudaram:
+        with _lock: _versao += 1
+        for funcao in _ao_atualizar:
+            try: funcao()
+            except Exception as e: print(f"Erro ao avisar atualização do catálogo: {e}")
+    return mudaram
+
+def atualizar_catalogo():
+    with metricas.cronometro("sincronizacao_segundos", tipo="catalogo"):
+        return coalescencia.executar("atualizar_catalogo", _atualizar)
+
+def registrar_ao_atualizar(funcao):
+    if funcao not in _ao_atualizar: _ao_atualizar.append(funcao)
+
+# --- LEITURA: TABELA EM MEMÓRIA, RECARREGADA SÓ QUANDO O CATÁLOGO MUDA ---
+def tabela():
+    # DataFrame (sku, img, estoque) para juntar nos rankings por produtoDerivacaoCodigo
+    global _tabela
+    versao, df = _tabela
+    if df is not None and versao == _versao: return df
+    banco_pedidos.inicializar()
+    with _lock: versao = _versao
+    df = pd.read_sql_query("SELECT sku, midia, estoque FROM catalogo", banco_pedidos.conexao())
+    df["img"] = df["midia"].map(url_imagem)
+    df = df[["sku", "img", "estoque"]]
+    _tabela = (versao, df)
+    return df
+
+# --- ROBÔ EM SEGUNDO PLANO ---
+def _loop():
+    while not _parar.is_set():
+        try:
+            atualizar_catalogo()
+        except Exception as e:
+            print(f"Erro na atualização do catálogo: {e}")
+        _parar.wait(CATALOGO_INTERVALO)
+
+def iniciar_poller():
+    global _thread
+    banco_pedidos.inicializar()
+    if _thread and _thread.is_alive(): return
+    _parar.clear()
+    _thread = threading.Thread(target=_loop, name="poller-catalogo", daemon=True)
+    _thread.start()
+
+def parar_poller():
+    _parar.set()
@@ -0,0 +1,194 @@
+import os
+import re
+import time
+import random
+import threading
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import metricas
+import cassetes
+
+load_dotenv()
+
+USUARIO = os.getenv("MAGAZORD_USER")
+SENHA = os.getenv("MAGAZORD_PASS")
+BASE_URL = (os.getenv("MAGAZORD_URL") or "").rstrip('/')
+
+TIMEOUT_PADRAO = float(os.getenv("MAGAZORD_TIMEOUT", 15))           # segundos, quando a chamada não informa
+MAX_CONCORRENCIA = int(os.getenv("MAGAZORD_MAX_CONCORRENCIA", 10))   # chamadas simultâneas por host
+MAX_POR_SEGUNDO = float(os.getenv("MAGAZORD_MAX_POR_SEGUNDO", 50))   # teto de chamadas por segundo
+TENTATIVAS = int(os.getenv("MAGAZORD_TENTATIVAS", 3))                # novas tentativas em 429/5xx/queda de conexão
+ESPERA_MAXIMA = float(os.getenv("MAGAZORD_ESPERA_MAXIMA", 30))        # teto de espera entre tentativas (segundos)
+FALHAS_DISJUNTOR = int(os.getenv("MAGAZORD_FALHAS_DISJUNTOR", 5))    # falhas seguidas que abrem o disjuntor
+DISJUNTOR_SEGUNDOS = float(os.getenv("MAGAZORD_DISJUNTOR_SEGUNDOS", 30))
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+# --- LIMITE DE TAXA (BALDE DE FICHAS ADAPTATIVO) ---
+# Um 429 corta a taxa pela metade e pausa todo mundo pelo Retry-After;
+# cada resposta boa devolve um pouco da taxa até o teto configurado.
+class LimitadorTaxa:
+    def __init__(self, por_segundo, rajada=None):
+        self.teto = por_segundo
+        self.por_segundo = por_segundo
+        self.capacidade = rajada or max(1.0, por_segundo)
+        self.fichas = self.capacidade
+        self.ultimo = time.monotonic()
+        self.pausado_ate = 0.0
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        if self.teto <= 0: return
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                if agora < self.pausado_ate:
+                    espera = self.pausado_ate - agora
+                else:
+                    self.fichas = min(self.capacidade, self.fichas + (agora - self.ultimo) * self.por_segundo)
+                    self.ultimo = agora
+                    if self.fichas >= 1:
+                        self.fichas -= 1
+                        return
+                    espera = (1 - self.fichas) / self.por_segundo
+            time.sleep(espera)
+
+    def frear(self, pausa=None):
+        if self.teto <= 0: return
+        with self.lock:
+            self.por_segundo = max(1.0, self.por_segundo / 2)
+            self.fichas = min(self.fichas, 0)
+            if pausa: self.pausado_ate = max(self.pausado_ate, time.monotonic() + pausa)
+
+    def acelerar(self):
+        if self.teto <= 0 or self.por_segundo >= self.teto: return
+        with self.lock:
+            self.por_segundo = min(self.teto, self.por_segundo + 0.5)
+
+# --- DISJUNTOR (CIRCUIT BREAKER) ---
+# Depois de FALHAS_DISJUNTOR falhas seguidas, para de chamar a API por DISJUNTOR_SEGUNDOS.
+# Passado o tempo, deixa uma chamada de teste passar: se der certo, fecha de novo.
+class Disjuntor:
+    def __init__(self, limite_falhas, segundos_aberto):
+        self.limite_falhas = limite_falhas
+        self.segundos_aberto = segundos_aberto
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self.testando = False
+        self.ultimo_erro = None
+        self.lock = threading.Lock()
+
+    def permitir(self):
+        with self.lock:
+            if self.falhas < self.limite_falhas: return True
+            if time.monotonic() < self.aberto_ate or self.testando: return False
+            self.testando = True
+            return True
+
+    def sucesso(self):
+        with self.lock:
+            self.falhas = 0
+            self.testando = False
+
+    def falha(self, erro):
+        with self.lock:
+            self.falhas += 1
+            self.testando = False
+            self.ultimo_erro = erro
+            if self.falhas >= self.limite_falhas:
+                self.aberto_ate = time.monotonic() + self.segundos_aberto
+
+    def aberto(self):
+        with self.lock:
+            return self.falhas >= self.limite_falhas
+
+# --- SESSÃO COMPARTILHADA (KEEP-ALIVE + POOL DE CONEXÕES) ---
+_sessao = requests.Session()
+_sessao.auth = (USUARIO, SENHA)
+_sessao.headers.update({"Content-Type": "application/json"})
+_adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCORRENCIA, pool_block=True)
+_sessao.mount("https://", _adaptador)
+_sessao.mount("http://", _adaptador)
+
+_limitador = LimitadorTaxa(MAX_POR_SEGUNDO)
+_disjuntor = Disjuntor(FALHAS_DISJUNTOR, DISJUNTOR_SEGUNDOS)
+_semaforos = {}
+_semaforos_lock = threading.Lock()
+
+def _semaforo(host):
+    with _semaforos_lock:
+        if host not in _semaforos:
+            _semaforos[host] = threading.BoundedSemaphore(MAX_CONCORRENCIA)
+        return _semaforos[host]
+
+def _retry_after(res):
+    try: return min(ESPERA_MAXIMA, float(res.headers.get("Retry-After")))
+    except: return None
+
+def _espera(tentativa, sugerida=None):
+    # Backoff exponencial com jitter total (espalha quem falhou junto)
+    if sugerida: return sugerida
+    return random.uniform(0, min(ESPERA_MAXIMA, 0.5 * (2 ** tentativa)))
+
+def _resposta_disjuntor(url):
+    # Resposta falsa 503: quem chama já trata "status != 200" como "sem dados agora"
+    res = requests.Response()
+    res.status_code = 503
+    res.url = url
+    res.headers["X-Disjuntor"] = "aberto"
+    res._content = b'{"data": {}}'
+    return res
+
+def _caminho_metrica(url):
+    # "/v2/site/pedido/123" -> "/pedido/{codigo}": um rótulo por tipo de chamada, não por registro
+    if BASE_URL and not url.startswith(BASE_URL): return "externo"
+    caminho = urlparse(url).path.replace("/v2/site", "", 1)
+    caminho = re.sub(r"(?<=/pedido/)[^/]+", "{codigo}", caminho)
+    return re.sub(r"/\d+(?=/|$)", "/{id}", caminho)
+
+def get(caminho, params=None, timeout=None, **kwargs):
+    # Aceita caminho relativo ("/v2/site/pedido") ou URL completa
+    url = caminho if caminho.startswith("http") else f"{BASE_URL}{caminho}"
+    rotulo = _caminho_metrica(url)
+    if cassetes.reproduzindo():
+        metricas.contar("magazord_chamadas_total", caminho=rotulo, status="cassete")
+        return cassetes.reproduzir(url, BASE_URL, params)
+    for tentativa in range(TENTATIVAS + 1):
+        if tentativa: metricas.contar("magazord_novas_tentativas_total", caminho=rotulo)
+        if not _disjuntor.permitir():
+            metricas.contar("magazord_disjuntor_aberto_total", caminho=rotulo)
+            return _resposta_disjuntor(url)
+        _limitador.aguardar()
+        metricas.registrar_chamada_magazord()
+        inicio = time.perf_counter()
+        try:
+            with _semaforo(urlparse(url).netloc):
+                res = _sessao.get(url, params=params, timeout=timeout or TIMEOUT_PADRAO, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metricas.contar("magazord_chamadas_total", caminho=rotulo, status="erro")
+            _disjuntor.falha(str(e))
+            if tentativa == TENTATIVAS: raise
+            time.sleep(_espera(tentativa))
+            continue
+        finally:
+            metricas.observar("magazord_chamada_segundos", time.perf_counter() - inicio, caminho=rotulo)
+        metricas.contar("magazord_chamadas_total", caminho=rotulo, status=res.status_code)
+
+        if res.status_code not in STATUS_REPETIR:
+            _disjuntor.sucesso()
+            _limitador.acelerar()
+            if cassetes.gravando(): cassetes.gravar(url, BASE_URL, params, res)
+            return res
+
+        # 429 é a API pedindo calma (freia o balde); 5xx conta como API doente
+        if res.status_code == 429: _limitador.frear(_retry_after(res))
+        else: _disjuntor.falha(f"HTTP {res.status_code} em {urlparse(url).path}")
+        if tentativa == TENTATIVAS: return res
+        time.sleep(_espera(tentativa, _retry_after(res)))
+
+def api_disponivel():
+    return not _disjuntor.aberto()
+
+def ultimo_erro():
+    return _disjuntor.ultimo_erro
@@ -0,0 +1,38 @@
+import threading
+
+# ==========================================
+# SINGLE-FLIGHT: UMA EXECUÇÃO POR CHAVE
+# ==========================================
+# Quem chega enquanto a mesma chave está sendo calculada espera e recebe o mesmo resultado
+# (ou a mesma exceção), em vez de disparar outra varredura igual na Magazord.
+class _Voo:
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+_em_voo = {}   # chave -> _Voo
+_lock = threading.Lock()
+
+def executar(chave, funcao, *args, **kwargs):
+    with _lock:
+        voo = _em_voo.get(chave)
+        lider = voo is None
+        if lider:
+            voo = _Voo()
+            _em_voo[chave] = voo
+
+    if not lider:
+        voo.pronto.wait()
+        if voo.erro: raise voo.erro
+        return voo.resultado
+
+    try:
+        voo.resultado = funcao(*args, **kwargs)
+        return voo.resultado
+    except BaseException as e:
+        voo.erro = e
+        raise
+    finally:
+        with _lock: _em_voo.pop(chave, None)
+        voo.pronto.set()
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pessoas
+from sincronizacao import get_now_br
+
+# Quanto tempo um resultado pronto é reaproveitado por quem pedir o mesmo percentual
+DEMOGRAFIA_VALIDADE = int(os.getenv("DEMOGRAFIA_VALIDADE_SEGUNDOS", 1800))
+MAX_JOBS_GUARDADOS = 20
+MAX_CIDADES = 100          # cidades no modo agregado (as com mais clientes)
+MAX_POR_PAGINA = 1000
+
+# ==========================================
+# JOBS EM SEGUNDO PLANO
+# ==========================================
+# Cada job tem o seu próprio progresso: dois usuários rodando ao mesmo tempo não se atropelam,
+# e quem pede um percentual que já está rodando (ou pronto há pouco) entra no mesmo job.
+_jobs = {}                # job_id -> job
+_por_percentual = {}      # percentual -> job_id mais recente
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="demografia")
+_ultimo_job = None
+
+def _novo_job(percentual):
+    return {"id": uuid.uuid4().hex, "percentual": percentual, "status": "na_fila",
+            "atual": 0, "total": 0, "mensagem": "Iniciando...", "versao": 0,
+            "criado_em": time.time(), "terminado_em": None, "resultado": None, "erro": None}
+
+def _atualizar(job, **campos):
+    with _lock:
+        job.update(campos)
+        job["versao"] += 1
+
+def _reaproveitavel(job):
+    if job["status"] in ("na_fila", "rodando"): return True
+    if job["status"] != "concluido" or job["resultado"]["dados_parciais"]: return False
+    return time.time() - job["terminado_em"] < DEMOGRAFIA_VALIDADE
+
+def _limpar_antigos():
+    terminados = sorted((j for j in _jobs.values() if j["terminado_em"]), key=lambda j: j["terminado_em"])
+    while len(_jobs) > MAX_JOBS_GUARDADOS and terminados:
+        velho = terminados.pop(0)
+        _jobs.pop(velho["id"], None)
+        if _por_percentual.get(velho["percentual"]) == velho["id"]: _por_percentual.pop(velho["percentual"])
+
+def iniciar_job(percentual):
+    global _ultimo_job
+    with _lock:
+        job = _jobs.get(_por_percentual.get(percentual))
+        if not (job and _reaproveitavel(job)):
+            job = _novo_job(percentual)
+            _jobs[job["id"]] = job
+            _por_percentual[percentual] = job["id"]
+            _limpar_antigos()
+            _executor.submit(_rodar, job)
+        _ultimo_job = job["id"]
+        return resumo_job(job)
+
+def _rodar(job):
+    try:
+        _atualizar(job, status="rodando")
+        clientes, completo = _calcular(job)
+        _atualizar(job, status="concluido", mensagem="Concluído!", terminado_em=time.time(),
+                   resultado={"clientes": clientes, "agregado": _agregar(clientes), "dados_parciais": not completo})
+    except Exception as e:
+        print(f"Erro na demografia ({job['percentual']}%): {e}")
+        _atualizar(job, status="erro", mensagem="Erro ao calcular demografia", erro=str(e), terminado_em=time.time())
+
+def resumo_job(job):
+    # O que vai para o front: tudo menos o resultado (que pode ser grande)
+    return {k: v for k, v in job.items() if k != "resultado"}
+
+def buscar_job(job_id):
+    return _jobs.get(job_id)
+
+def ultimo_job():
+    return _jobs.get(_ultimo_job)
+
+async def eventos(job_id, intervalo=0.5, ping=15):
+    # Server-Sent Events: manda o estado a cada mudança e fecha quando o job termina.
+    # Só olha a "versao" do job de tempos em tempos, sem prender uma thread por conexão.
+    versao_enviada = -1
+    ultimo_envio = time.monotonic()
+    while True:
+        job = _jobs.get(job_id)
+        if not job:
+            yield "event: erro\ndata: {}\n\n"
+            return
+        if job["versao"] != versao_enviada:
+            versao_enviada = job["versao"]
+            ultimo_envio = time.monotonic()
+            yield f"event: progresso\ndata: {json.dumps(resumo_job(job), ensure_ascii=False)}\n\n"
+            if job["status"] not in ("na_fila", "rodando"): return
+        elif time.monotonic() - ultimo_envio > ping:
+            ultimo_envio = time.monotonic()
+            yield ": ping\n\n"  # mantém a conexão viva atrás de proxies
+        await asyncio.sleep(intervalo)
+
+# ==========================================
+# LEITURA DO RESULTADO: AGREGADO (MAPA/GRÁFICO) E LISTA PAGINADA
+# ==========================================
+def _agregar(clientes):
+    # Contagens prontas: o front monta mapa e barras sem receber cliente por cliente
+    cruzado = {}
+    for c in clientes:
+        cruzado.setdefault(c["estado"], Counter())[c["faixa"]] += 1
+    por_faixa = sum(cruzado.values(), Counter())
+    cidades = Counter((c["cidade"], c["estado"]) for c in clientes)
+    return {
+        "total": len(clientes),
+        "por_estado": {uf: sum(faixas.values()) for uf, faixas in cruzado.items()},
+        "por_faixa": dict(por_faixa),
+        "por_estado_faixa": {uf: dict(faixas) for uf, faixas in cruzado.items()},
+        "por_cidade": [{"cidade": cidade, "estado": uf, "qtd": qtd} for (cidade, uf), qtd in cidades.most_common(MAX_CIDADES)],
+    }
+
+def resultado_agregado(job):
+    resultado = job["resultado"]
+    return {"agregado": resultado["agregado"], "dados_parciais": resultado["dados_parciais"]}
+
+def listar_clientes(job, estado=None, faixa=None, cidade=None, cursor=0, limite=100):
+    # Página de clientes filtrados. O cursor é a posição na lista do job (que não muda depois de pronta):
+    # devolve (clientes, próximo cursor ou None no fim)
+    limite = max(1, min(limite, MAX_POR_PAGINA))
+    clientes = job["resultado"]["clientes"]
+    pagina = []
+    for i in range(max(0, cursor), len(clientes)):
+        c = clientes[i]
+        if (estado and c["estado"] != estado) or (faixa and c["faixa"] != faixa) or (cidade and c["cidade"] != cidade): continue
+        if len(pagina) == limite: return pagina, i
+        pagina.append(c)
+    return pagina, None
+
+def aguardar(job_id, intervalo=0.5):
+    # Para a rota antiga, que ainda espera o resultado na mesma requisição
+    job = _jobs.get(job_id)
+    while job and job["status"] in ("na_fila", "rodando"):
+        time.sleep(intervalo)
+    return job
+
+# ==========================================
+# CÁLCULO (AMOSTRAGEM SOBRE A BASE LOCAL DE PESSOAS)
+# ==========================================
+def _faixa_etaria(nascimento, hoje):
+    if not (nascimento and isinstance(nascimento, str)): return "Não informada"
+    try:
+        dt_nasc = datetime.strptime(nascimento[:10], "%Y-%m-%d")
+        idade = hoje.year - dt_nasc.year - ((hoje.month, hoje.day) < (dt_nasc.month, dt_nasc.day))
+
+        if 10 <= idade <= 19: return "10-19 anos"
+        elif 20 <= idade <= 29: return "20-29 anos"
+        elif 30 <= idade <= 39: return "30-39 anos"
+        elif 40 <= idade <= 49: return "40-49 anos"
+        elif 50 <= idade <= 59: return "50-59 anos"
+        elif 60 <= idade <= 69: return "60-69 anos"
+        elif idade >= 70: return "70+ anos"
+    except: pass
+    return "Não informada"
+
+def _calcular(job):
+    percentual = job["percentual"]
+    hoje = get_now_br()
+
+    # FASE 1: Traz só os clientes alterados desde a última vez (e as fichas deles)
+    completo = pessoas.sincronizar_pessoas(lambda **campos: _atualizar(job, **campos))
+
+    # FASE 2: Amostra local, dos cadastros mais recentes para os mais antigos
+    total_base = pessoas.contar_pessoas()
+    alvo_clientes = int(total_base * (percentual / 100.0))
+    if alvo_clientes == 0: alvo_clientes = 100 # Prevenção de erro
+    amostra = pessoas.listar_perfis(alvo_clientes)
+
+    # FASE 3: Montagem Final
+    _atualizar(job, mensagem="Desenhando o mapa...", total=len(amostra), atual=len(amostra))
+
+    clientes_finais = [{
+        "nome": p["nome"],
+        "email": p["email"],
+        "telefone": p["telefone"],
+        "cidade": p["cidade"],
+        "estado": p["estado"],
+        "faixa": _faixa_etaria(p["nascimento"], hoje)
+    } for p in amostra]
+
+    return clientes_finais, completo
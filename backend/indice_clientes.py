@@ -0,0 +1,121 @@
+import json
+from datetime import datetime, timedelta
+import banco_pedidos
+import rollups
+
+# Sobe esta versão quando mudar a regra do que conta como compra: o índice é refeito do zero
+VERSAO_CLIENTES = "1"
+
+# Ordenações aceitas pela rota: campo -> (expressão SQL, a coluna cresce ao contrário do campo?)
+ORDENACOES = {
+    "dias_inativo": ("ultima_compra", True),   # mais dias sem comprar = última compra mais antiga
+    "ultima_compra": ("ultima_compra", False),
+    "primeira_compra": ("primeira_compra", False),
+    "pedidos": ("pedidos", False),
+    "total_gasto": ("total_gasto", False),
+    "nome": ("nome COLLATE NOCASE", False),
+}
+
+# ==========================================
+# ÍNDICE POR CLIENTE (E-MAIL): PRIMEIRA/ÚLTIMA COMPRA, PEDIDOS E VALOR
+# ==========================================
+# compras: uma linha por pedido que conta como compra (mesma regra do resumo: nem aguardando nem cancelado).
+# clientes: o agregado de cada e-mail, refeito a partir de compras só para os e-mails tocados na gravação.
+def _compra(resumo, detalhe):
+    if not (resumo and detalhe): return None
+    email = str(detalhe.get('pessoaEmail') or '').strip().lower()
+    data_hora = str(resumo.get('dataHora') or '')
+    if not email or not data_hora: return None
+    if rollups.classe_situacao(resumo) not in rollups.CLASSES_RESUMO: return None
+    try: valor = rollups.valor_pedido(resumo)
+    except: valor = 0.0
+    return email, data_hora, valor, detalhe.get('pessoaNome')
+
+def _inserir_compra(con, codigo, compra):
+    con.execute("INSERT OR REPLACE INTO compras (codigo, email, data_hora, valor, nome) VALUES (?,?,?,?,?)", (codigo, *compra))
+
+def _recalcular(con, email):
+    primeira, ultima, pedidos, total = con.execute(
+        "SELECT MIN(data_hora), MAX(data_hora), COUNT(*), COALESCE(SUM(valor), 0) FROM compras WHERE email = ?", (email,)).fetchone()
+    if not pedidos:
+        con.execute("DELETE FROM clientes WHERE email = ?", (email,))
+        return
+    # Nome e código vêm do pedido mais recente
+    codigo, nome = con.execute("SELECT codigo, nome FROM compras WHERE email = ? ORDER BY data_hora DESC LIMIT 1", (email,)).fetchone()
+    con.execute("""
+        INSERT OR REPLACE INTO clientes (email, nome, primeira_compra, ultima_compra, pedidos, total_gasto, ultimo_pedido)
+        VALUES (?,?,?,?,?,?,?)
+    """, (email, nome, primeira, ultima, pedidos, total, codigo))
+
+def _ao_gravar(con, codigo, antigo, novo):
+    compra_antiga, compra_nova = _compra(*antigo), _compra(*novo)
+    if compra_antiga == compra_nova: return
+    con.execute("DELETE FROM compras WHERE codigo = ?", (codigo,))
+    if compra_nova: _inserir_compra(con, codigo, compra_nova)
+    for email in {c[0] for c in (compra_antiga, compra_nova) if c}:
+        _recalcular(con, email)
+
+def _criar_tabelas(con):
+    with con:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS compras (
+                codigo TEXT PRIMARY KEY, email TEXT, data_hora TEXT, valor REAL, nome TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_compras_email ON compras (email, data_hora);
+            CREATE TABLE IF NOT EXISTS clientes (
+                email TEXT PRIMARY KEY, nome TEXT, primeira_compra TEXT, ultima_compra TEXT,
+                pedidos INTEGER, total_gasto REAL, ultimo_pedido TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_clientes_ultima_compra ON clientes (ultima_compra);
+        """)
+        versao = con.execute("SELECT valor FROM estado WHERE chave = 'clientes_versao'").fetchone()
+        if versao and versao[0] == VERSAO_CLIENTES: return
+
+        # Primeira vez (ou regra nova): refaz a partir dos pedidos já guardados
+        con.execute("DELETE FROM compras")
+        con.execute("DELETE FROM clientes")
+        for codigo, resumo, detalhe in con.execute(
+                "SELECT codigo, resumo, detalhe FROM pedidos WHERE resumo IS NOT NULL AND detalhe IS NOT NULL").fetchall():
+            compra = _compra(json.loads(resumo), json.loads(detalhe))
+            if compra: _inserir_compra(con, codigo, compra)
+        for (email,) in con.execute("SELECT DISTINCT email FROM compras").fetchall():
+            _recalcular(con, email)
+        con.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES ('clientes_versao', ?)", (VERSAO_CLIENTES,))
+
+banco_pedidos.registrar_extensao(_criar_tabelas, _ao_gravar)
+
+# ==========================================
+# CONSULTAS (FAIXA NO ÍNDICE DE ultima_compra)
+# ==========================================
+def _cliente(linha, hoje):
+    email, nome, primeira, ultima, pedidos, total, ultimo_pedido = linha
+    return {
+        "email": email,
+        "nome": nome,
+        "primeira_compra": primeira[:10],
+        "ultima_compra": ultima[:10],
+        "dias_inativo": (hoje - datetime.strptime(ultima[:10], "%Y-%m-%d").date()).days,
+        "pedidos": pedidos,
+        "total_gasto": round(total, 2),
+        "ticket_medio": round(total / pedidos, 2),
+        "ultimo_pedido": ultimo_pedido,
+    }
+
+def listar_inativos(hoje, dias_min=90, dias_max=None, ordenar="dias_inativo", decrescente=True, pagina=1, por_pagina=50):
+    # Clientes com dias_min <= dias sem comprar <= dias_max. Retorna (clientes da página, total na faixa)
+    banco_pedidos.inicializar()
+    # ultima_compra guarda data e hora: "< dia seguinte ao corte" pega o dia do corte inteiro
+    filtro, params = "ultima_compra < ?", [(hoje - timedelta(days=dias_min - 1)).strftime("%Y-%m-%d")]
+    if dias_max is not None:
+        filtro += " AND ultima_compra >= ?"
+        params.append((hoje - timedelta(days=dias_max)).strftime("%Y-%m-%d"))
+    coluna, invertida = ORDENACOES.get(ordenar, ORDENACOES["dias_inativo"])
+    ordem = f"{coluna} {'DESC' if decrescente != invertida else 'ASC'}"
+
+    con = banco_pedidos.conexao()
+    total = con.execute(f"SELECT COUNT(*) FROM clientes WHERE {filtro}", params).fetchone()[0]
+    linhas = con.execute(f"""
+        SELECT email, nome, primeira_compra, ultima_compra, pedidos, total_gasto, ultimo_pedido
+        FROM clientes WHERE {filtro} ORDER BY {ordem}, email LIMIT ? OFFSET ?
+    """, params + [por_pagina, (pagina - 1) * por_pagina]).fetchall()
+    return [_cliente(linha, hoje) for linha in linhas], total
@@ -0,0 +1,143 @@
+import json
+import numpy as np
+import pandas as pd
+import banco_pedidos
+import metricas
+import rollups
+import catalogo
+import miniaturas
+
+# Sobe esta versão quando mudar o achatamento dos itens: a tabela é refeita do zero
+VERSAO_ITENS = "2"
+
+# ==========================================
+# TABELA ACHATADA: UMA LINHA POR ITEM VENDIDO
+# ==========================================
+# O arrayPedidoRastreio -> pedidoItem é percorrido uma única vez, na gravação do pedido.
+# As rotas e os relatórios leem colunas prontas e agrupam com pandas.
+def _linhas(codigo, resumo, detalhe):
+    if not detalhe: return []
+    data_hora = str((resumo or detalhe).get('dataHora') or '')
+    if not data_hora: return []
+    # Sem o resumo da listagem ainda não dá para saber a situação (fica de fora das rotas)
+    classe = rollups.classe_situacao(resumo) if resumo else None
+    linhas = []
+    for r in detalhe.get('arrayPedidoRastreio', []):
+        for item in r.get('pedidoItem', []):
+            try:
+                linhas.append((codigo, data_hora[:10], data_hora, classe, item.get('produtoNome'), item.get('produtoDerivacaoCodigo'),
+                               item.get('produtoDerivacaoNome') or '', item.get('categoria') or 'Outros',
+                               float(item.get('quantidade', 1)), float(item.get('valorItem', 0))))
+            except: continue
+    return linhas
+
+_INSERIR = """INSERT INTO itens_pedido (codigo, dia, data_hora, classe, nome, derivacao_codigo, derivacao_nome, categoria, qtd, valor)
+              VALUES (?,?,?,?,?,?,?,?,?,?)"""
+
+def _ao_gravar(con, codigo, antigo, novo):
+    con.execute("DELETE FROM itens_pedido WHERE codigo = ?", (codigo,))
+    con.executemany(_INSERIR, _linhas(codigo, *novo))
+
+def _criar_tabelas(con):
+    with con:
+        versao = con.execute("SELECT valor FROM estado WHERE chave = 'itens_versao'").fetchone()
+        em_dia = versao and versao[0] == VERSAO_ITENS
+        # Versão antiga: a tabela é recriada (a 1 tinha estado/cidade, que nada lia; o faturamento
+        # por local sai do valor total do pedido, não da soma dos itens)
+        if not em_dia: con.execute("DROP TABLE IF EXISTS itens_pedido")
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS itens_pedido (
+                codigo TEXT, dia TEXT, data_hora TEXT, classe TEXT, nome TEXT, derivacao_codigo TEXT, derivacao_nome TEXT,
+                categoria TEXT, qtd REAL, valor REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_itens_dia ON itens_pedido (dia, classe);
+            CREATE INDEX IF NOT EXISTS idx_itens_codigo ON itens_pedido (codigo);
+        """)
+        if em_dia: return
+
+        for codigo, resumo, detalhe in con.execute("SELECT codigo, resumo, detalhe FROM pedidos WHERE detalhe IS NOT NULL").fetchall():
+            con.executemany(_INSERIR, _linhas(codigo, json.loads(resumo) if resumo else None, json.loads(detalhe)))
+        con.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES ('itens_versao', ?)", (VERSAO_ITENS,))
+
+banco_pedidos.registrar_extensao(_criar_tabelas, _ao_gravar)
+
+def carregar_itens(data_inicio=None, data_fim=None, classes=None):
+    # DataFrame colunar com os itens do período (todas as datas se não informar)
+    banco_pedidos.inicializar()
+    sql = "SELECT codigo, dia, classe, nome, derivacao_codigo, derivacao_nome, categoria, qtd, valor FROM itens_pedido WHERE 1 = 1"
+    params = []
+    if data_inicio:
+        sql += " AND dia >= ?"
+        params.append(data_inicio.strftime("%Y-%m-%d"))
+    if data_fim:
+        sql += " AND dia <= ?"
+        params.append(data_fim.strftime("%Y-%m-%d"))
+    if classes:
+        sql += f" AND classe IN ({','.join('?' * len(classes))})"
+        params.extend(classes)
+    # Mais recentes primeiro: em caso de empate, os agrupamentos mantêm a ordem de aparição
+    sql += " ORDER BY data_hora DESC"
+    with metricas.cronometro("armazem_operacao_segundos", operacao="carregar_itens"), metricas.fase("fichas"):
+        return pd.read_sql_query(sql, banco_pedidos.conexao(), params=params)
+
+# ==========================================
+# AGRUPAMENTOS VETORIZADOS
+# ==========================================
+def _registros(df):
+    # Converte tipos do numpy para tipos nativos (o FastAPI não serializa np.float64)
+    df = df.astype(object).where(pd.notna(df), None)
+    return df.to_dict("records")
+
+def _com_catalogo(agrupado, df, chaves):
+    # Junta o catálogo local (por produtoDerivacaoCodigo) em cada grupo: imagem da derivação mais vendida,
+    # estoque somado das derivações vendidas e sell-through = vendidas / (vendidas + estoque), em %
+    por_sku = df.groupby(list(dict.fromkeys(chaves + ["derivacao_codigo"])), dropna=False, sort=False)["qtd"].sum().reset_index()
+    por_sku = por_sku.merge(catalogo.tabela(), how="left", left_on="derivacao_codigo", right_on="sku")
+    principal = por_sku.sort_values("qtd", ascending=False, kind="stable").drop_duplicates(chaves)[chaves + ["img"]]
+    somas = por_sku.groupby(chaves, dropna=False, sort=False).agg(vendidas=("qtd", "sum"), estoque=("estoque", lambda e: e.sum(min_count=1))).reset_index()
+    juntos = agrupado.merge(principal, on=chaves, how="left").merge(somas, on=chaves, how="left")
+    juntos["miniatura"] = juntos["img"].map(miniaturas.url_miniatura)
+    juntos["sell_through"] = (juntos["vendidas"] / (juntos["vendidas"] + juntos["estoque"].clip(lower=0)) * 100).round(1)
+    return juntos.drop(columns="vendidas")
+
+def top_produtos(df, limite=10):
+    # [{"nome", "qtd", "valor", "img", "miniatura", "estoque", "sell_through"}] ordenado por faturamento
+    if df.empty: return []
+    agrupado = df.groupby("nome", dropna=False, sort=False)[["qtd", "valor"]].sum().reset_index()
+    agrupado = agrupado.sort_values("valor", ascending=False, kind="stable").head(limite)
+    return _registros(_com_catalogo(agrupado, df, ["nome"]))
+
+def produtos_por_categoria(df):
+    # {categoria: [{"nome", "qtd", "valor", "img", "miniatura", "estoque", "sell_through"}]} para o drill-down
+    if df.empty: return {}
+    agrupado = df.groupby(["categoria", "nome"], dropna=False, sort=False)[["qtd", "valor"]].sum().reset_index()
+    agrupado = _com_catalogo(agrupado.sort_values(["categoria", "valor"], ascending=[True, False], kind="stable"), df, ["categoria", "nome"])
+    return {cat: _registros(grupo.drop(columns="categoria")) for cat, grupo in agrupado.groupby("categoria", sort=False)}
+
+def ranking_produtos(df, limite=15):
+    # [{"nome", "codigo", "qtd", "img", "miniatura", "estoque", "sell_through"}]: quantas vezes cada produto/derivação aparece nos pedidos
+    if df.empty: return []
+    contagem = df.groupby(["nome", "derivacao_codigo"], dropna=False, sort=False).size().rename("qtd").reset_index()
+    contagem = _com_catalogo(contagem.sort_values("qtd", ascending=False, kind="stable").head(limite), df, ["nome", "derivacao_codigo"])
+    return _registros(contagem.rename(columns={"derivacao_codigo": "codigo"}))
+
+def ranking_variacoes(df, limite=10):
+    # [(produto [variação], qtd)]: o que mais sai por tamanho/cor
+    if df.empty: return []
+    chave = np.where(df["derivacao_nome"] != "", df["nome"].fillna("Item") + " [" + df["derivacao_nome"] + "]", df["nome"].fillna("Item"))
+    soma = df["qtd"].groupby(chave).sum().sort_values(ascending=False, kind="stable").head(limite)
+    return [(nome, float(qtd)) for nome, qtd in soma.items()]
+
+def receita_por_local(limite=None):
+    # Faturamento por estado e por "cidade-estado", lido direto das colunas JSON do banco
+    banco_pedidos.inicializar()
+    df = pd.read_sql_query("""
+        SELECT COALESCE(json_extract(detalhe, '$.estadoSigla'), 'N/A') AS estado,
+               COALESCE(json_extract(detalhe, '$.cidadeNome'), 'N/A') AS cidade,
+               CAST(COALESCE(json_extract(detalhe, '$.valorTotalFinal'), 0) AS REAL) AS valor
+        FROM pedidos WHERE detalhe IS NOT NULL
+    """, banco_pedidos.conexao())
+    por_estado = df.groupby("estado")["valor"].sum().sort_values(ascending=False, kind="stable")
+    por_cidade = df["valor"].groupby(df["cidade"] + "-" + df["estado"]).sum().sort_values(ascending=False, kind="stable")
+    if limite: por_estado, por_cidade = por_estado.head(limite), por_cidade.head(limite)
+    return ([(k, float(v)) for k, v in por_estado.items()], [(k, float(v)) for k, v in por_cidade.items()])
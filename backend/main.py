@@ -1,69 +1,70 @@
 import os
 import json
-import base64
-import requests
-from fastapi import FastAPI, HTTPException
+import hmac
+import inspect
+import cliente_magazord
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
-from collections import defaultdict
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta, date
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
-import threading
+from sincronizacao import get_now_br, garantir_cobertura, ultima_sincronizacao, status_dados, iniciar_sincronizacao, parar_sincronizacao, registrar_ao_sincronizar
+from banco_pedidos import listar_pedidos
+import banco_pedidos
+import pessoas
+import rollups
+import itens_pedido
+import indice_clientes
+import cache_respostas
+import demografia
+import carrinhos
+import catalogo
+import miniaturas
+import metricas
+import admissao
+import perfilador
 
 load_dotenv()
 
-app = FastAPI()
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+# ROBOS_DESLIGADOS=1: não sobe os robôs de pedidos/carrinhos/catálogo (benchmark, que sincroniza numa etapa própria)
+ROBOS_LIGADOS = os.getenv("ROBOS_DESLIGADOS") != "1"
+
+@asynccontextmanager
+async def lifespan(app):
+    # Robô que mantém os pedidos locais atualizados (as rotas leem só do armazém local)
+    registrar_ao_sincronizar(cache_respostas.marcar_desatualizado)
+    carrinhos.registrar_ao_atualizar(lambda: cache_respostas.marcar_desatualizado("carrinhos-abandonados"))
+    # Catálogo de SKUs (imagem/estoque dos rankings): mudou, recalcula as rotas que mostram produtos
+    catalogo.registrar_ao_atualizar(lambda: cache_respostas.marcar_desatualizado("resumo"))
+    catalogo.registrar_ao_atualizar(lambda: cache_respostas.marcar_desatualizado("mes-atual"))
+    # Pedidos recentes e perfis de clientes decodificados uma vez, antes da primeira requisição
+    banco_pedidos.carregar_memoria()
+    pessoas.carregar_perfis()
+    if ROBOS_LIGADOS:
+        iniciar_sincronizacao()
+        carrinhos.iniciar_poller()
+        catalogo.iniciar_poller()
+    yield
+    parar_sincronizacao()
+    carrinhos.parar_poller()
+    catalogo.parar_poller()
+
+app = FastAPI(lifespan=lifespan)
+# Respostas grandes (lista de clientes, resumo) vão comprimidas para quem aceita gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+app.middleware("http")(cache_respostas.middleware_etag)
+# Orçamento de execuções simultâneas por classe de rota (as pesadas não travam login/progresso)
+app.middleware("http")(admissao.middleware_admissao)
+app.middleware("http")(metricas.middleware_metricas)
+# Por fora de tudo: até o 503 da admissão leva os cabeçalhos de CORS
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"], expose_headers=["Retry-After"])
 
-USUARIO = os.getenv("MAGAZORD_USER")
-SENHA = os.getenv("MAGAZORD_PASS")
-BASE_URL = os.getenv("MAGAZORD_URL")
-CACHE_FILE = "cache_pedidos.json"
 USERS_FILE = "users.json"
-CACHE_PESSOAS_FILE = "cache_pessoas.json" # <--- ADICIONE ESTA LINHA
-
-# Variável global que o React vai consultar a cada 1 segundo
-progresso_demografia = {"atual": 0, "total": 0, "mensagem": "Iniciando..."}
-
-# --- HELPER: TIMEZONE BRASIL (UTC-3) ---
-def get_now_br():
-    return datetime.now(timezone.utc) - timedelta(hours=3)
-
-def get_headers():
-    credenciais = f"{USUARIO}:{SENHA}"
-    token_b64 = base64.b64encode(credenciais.encode()).decode()
-    return {"Authorization": f"Basic {token_b64}", "Content-Type": "application/json"}
-
-# --- GESTÃO DE CACHE ---
-def carregar_cache():
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return {}
-    return {}
-
-def salvar_cache(cache):
-    try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f: 
-            json.dump(cache, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        print(f"Erro ao salvar cache: {e}")
-
-# --- GESTÃO DE CACHE DE PESSOAS ---
-def carregar_cache_pessoas():
-    if os.path.exists(CACHE_PESSOAS_FILE):
-        try:
-            with open(CACHE_PESSOAS_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-        except: return {}
-    return {}
-
-def salvar_cache_pessoas(cache):
-    try:
-        with open(CACHE_PESSOAS_FILE, 'w', encoding='utf-8') as f: 
-            json.dump(cache, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        print(f"Erro ao salvar cache de pessoas: {e}")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")   # sem ele, as rotas de /api/admin ficam fechadas
 
 # --- GESTÃO DE UTILIZADORES ---
 def carregar_usuarios():
@@ -80,6 +81,11 @@ class LoginData(BaseModel):
     username: str
     password: str
 
+# --- MÉTRICAS (PROMETHEUS) ---
+@app.get("/metrics")
+def get_metricas():
+    return PlainTextResponse(metricas.texto_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/api/login")
 def login(data: LoginData):
     usuarios = carregar_usuarios()
@@ -92,10 +98,8 @@ def login(data: LoginData):
 # ROTA: MÊS ATUAL 
 # ==========================================
 @app.get("/api/dashboard/mes-atual")
+@cache_respostas.em_cache("mes-atual", ttl=300)
 def get_mes_atual_data(meta_mensal: float = 60000, mes: int = None, ano: int = None):
-    cache = carregar_cache()
-    headers = get_headers()
-    
     hoje = get_now_br()
     
     # --- LÓGICA DO MÊS ALVO ---
@@ -112,7 +116,6 @@ def get_mes_atual_data(meta_mensal: float = 60000, mes: int = None, ano: int = N
 
     # Data marco zero: Dia 1º do mês ANTERIOR
     data_inicio_busca = datetime(ano_anterior, mes_anterior, 1)
-    data_inicio_api = data_inicio_busca.strftime("%Y-%m-%d")
 
     # Fim do Mês Alvo
     if alvo_mes == 12: proximo_mes = datetime(alvo_ano + 1, 1, 1)
@@ -120,143 +123,59 @@ def get_mes_atual_data(meta_mensal: float = 60000, mes: int = None, ano: int = N
     ultimo_dia_mes_date = proximo_mes - timedelta(days=1)
     ultimo_dia_mes = ultimo_dia_mes_date.day
 
-    vendas_por_dia = {dia: {"valor": 0.0, "qtd": 0} for dia in range(1, ultimo_dia_mes + 1)}
+    inicio_mes = date(alvo_ano, alvo_mes, 1)
+    fim_mes = ultimo_dia_mes_date.date()
 
-    pagina = 1
-    continuar = True
+    # Tudo vem do armazém local mantido pelo robô de sincronização
+    completo = garantir_cobertura(data_inicio_busca.date())
 
-    total_faturamento = 0.0
-    total_pedidos = 0
-    total_estorno = 0.0  # <--- Cofre de devoluções
-    produtos_vendidos = [] 
-    vendas_por_categoria = defaultdict(float)
-    vendas_por_forma_pagamento = defaultdict(float)
-    pedidos_detalhados = []
+    # --- TOTAIS, DIAS, CATEGORIAS E PAGAMENTOS: direto dos rollups diários ---
+    vendas_por_dia = {dia: {"valor": 0.0, "qtd": 0} for dia in range(1, ultimo_dia_mes + 1)}
+    for dia_str, (receita, qtd) in rollups.serie_diaria(inicio_mes, fim_mes, rollups.CLASSES_CONFIRMADAS).items():
+        vendas_por_dia[int(dia_str[8:10])] = {"valor": receita, "qtd": qtd}
 
-    # Variáveis do mês anterior
-    faturamento_anterior = 0.0
-    pedidos_anterior = 0
-
-    while continuar:
-        res = requests.get(f"{BASE_URL}/v2/site/pedido", headers=headers, 
-                           params={"limit": 100, "page": pagina, "order": "dataHora", "orderDirection": "desc", 
-                                   "dataInicio": data_inicio_api})
-        
-        if res.status_code != 200: break
-        items = res.json().get('data', {}).get('items', [])
-        if not items: break
-        
-        for p_resumo in items:
-            try:
-                data_str = p_resumo.get('dataHora', '')[:10]
-                dt_pedido = datetime.strptime(data_str, "%Y-%m-%d")
-                
-                if dt_pedido.date() < data_inicio_busca.date():
-                    continuar = False
-                    break
-                
-                if dt_pedido.date() > ultimo_dia_mes_date.date():
-                    continue
-
-                situacao_desc = str(p_resumo.get('pedidoSituacaoDescricao') or '').lower()
-                situacao_id = p_resumo.get('pedidoSituacao') or p_resumo.get('situacao') 
-                
-                valor_total = float(p_resumo.get('valorTotal') or 0)
-                valor_frete = float(p_resumo.get('valorFrete') or 0)
-                valor = valor_total - valor_frete
-
-                # ==========================================
-                # REGRAS DE OURO DA SITUAÇÃO (ATUALIZADAS)
-                # ==========================================
-                is_estorno = (situacao_id == 17) or ('devolvido financeiro' in situacao_desc) or ('estorno' in situacao_desc)
-                is_aguardando = ('aguardando' in situacao_desc) or ('pendente' in situacao_desc)
-                is_cancelado = 'cancelado' in situacao_desc
-                
-                # ---> MÊS ATUAL
-                if dt_pedido.month == alvo_mes and dt_pedido.year == alvo_ano:
-                    if is_estorno:
-                        total_estorno += valor
-                        # Adicionamos na lista de pedidos com a nomenclatura exata
-                        pedidos_detalhados.append({
-                            "codigo": str(p_resumo.get('codigo')),
-                            "data": dt_pedido.strftime("%d/%m/%Y"),
-                            "valor": valor, 
-                            "situacao": p_resumo.get('pedidoSituacaoDescricao', 'DEVOLVIDO FINANCEIRO').upper(),
-                            "cliente": "Verificar Cliente"
-                        })
-                        continue 
-                        
-                    elif is_aguardando or is_cancelado:
-                        continue 
-
-                    # SE CHEGOU AQUI, É PORQUE ESTÁ CONFIRMADO/ENTREGUE!
-                    total_faturamento += valor
-                    total_pedidos += 1
-                    vendas_por_dia[dt_pedido.day]["valor"] += valor
-                    vendas_por_dia[dt_pedido.day]["qtd"] += 1
-
-                    codigo_p = str(p_resumo.get('codigo'))
-                    if codigo_p not in cache:
-                        try:
-                            det = requests.get(f"{BASE_URL}/v2/site/pedido/{codigo_p}", headers=headers, timeout=10).json()
-                            cache[codigo_p] = det.get('data', {})
-                        except: pass
-                    
-                    pedido_det = cache.get(codigo_p)
-                    
-                    if pedido_det:
-                        forma_pag = pedido_det.get('pedidoFormaPagamentoDescricao', 'Outros')
-                        vendas_por_forma_pagamento[forma_pag] += valor
-                        cliente_nome = pedido_det.get('clienteNome', 'Consumidor')
-
-                        for r in pedido_det.get('arrayPedidoRastreio', []):
-                            for item in r.get('pedidoItem', []):
-                                cat = item.get('categoria') or 'Outros'
-                                valor_item = float(item.get('valorItem', 0))
-                                vendas_por_categoria[cat] += valor_item
-                                produtos_vendidos.append({
-                                    "nome": item.get('produtoNome'),
-                                    "qtd": float(item.get('quantidade', 1)),
-                                    "valor": valor_item,
-                                    "categoria": cat
-                                })
-                        
-                        pedidos_detalhados.append({
-                            "codigo": codigo_p,
-                            "data": dt_pedido.strftime("%d/%m/%Y"),
-                            "valor": valor, 
-                            "situacao": p_resumo.get('pedidoSituacaoDescricao'),
-                            "cliente": cliente_nome
-                        })
-
-                # ---> MÊS ANTERIOR 
-                elif dt_pedido.month == mes_anterior and dt_pedido.year == ano_anterior:
-                    if not is_estorno and not is_aguardando and not is_cancelado:
-                        faturamento_anterior += valor
-                        pedidos_anterior += 1
-
-            except: continue
-
-        pagina += 1
-        if pagina > 100: break
-
-    salvar_cache(cache)
-    
-    # Processamento Final (Agrupamentos)
-    produtos_agrupados_geral = defaultdict(lambda: {"qtd": 0, "valor": 0.0})
-    produtos_agrupados_cat = defaultdict(lambda: defaultdict(lambda: {"qtd": 0, "valor": 0.0}))
+    total_faturamento, total_pedidos = rollups.totais(inicio_mes, fim_mes, rollups.CLASSES_CONFIRMADAS)
+    total_estorno, _ = rollups.totais(inicio_mes, fim_mes, rollups.CLASSES_ESTORNO)  # <--- Cofre de devoluções
+    faturamento_anterior, pedidos_anterior = rollups.totais(data_inicio_busca.date(), inicio_mes - timedelta(days=1), rollups.CLASSES_CONFIRMADAS)
+    vendas_por_categoria = {cat: valor for cat, valor, _ in rollups.por_categoria(inicio_mes, fim_mes, rollups.CLASSES_CONFIRMADAS)}
+    vendas_por_forma_pagamento = dict(rollups.por_pagamento(inicio_mes, fim_mes, rollups.CLASSES_CONFIRMADAS))
 
-    for p in produtos_vendidos:
-        produtos_agrupados_geral[p["nome"]]["qtd"] += p["qtd"]
-        produtos_agrupados_geral[p["nome"]]["valor"] += p["valor"]
-        produtos_agrupados_cat[p["categoria"]][p["nome"]]["qtd"] += p["qtd"]
-        produtos_agrupados_cat[p["categoria"]][p["nome"]]["valor"] += p["valor"]
+    # --- PRODUTOS: agrupamento vetorizado sobre os itens do mês alvo ---
+    itens_mes = itens_pedido.carregar_itens(inicio_mes, fim_mes, rollups.CLASSES_CONFIRMADAS)
+    top_produtos = itens_pedido.top_produtos(itens_mes, limite=10)
+    produtos_drilldown = itens_pedido.produtos_por_categoria(itens_mes)
 
-    top_produtos = sorted([{"nome": k, "qtd": v["qtd"], "valor": v["valor"]} for k, v in produtos_agrupados_geral.items()], key=lambda x: x["valor"], reverse=True)[:10]
+    # --- PEDIDOS RECENTES: só os pedidos do mês alvo ---
+    pedidos_detalhados = []
 
-    produtos_drilldown = {}
-    for cat, prods in produtos_agrupados_cat.items():
-        produtos_drilldown[cat] = sorted([{"nome": nome, "qtd": dados["qtd"], "valor": dados["valor"]} for nome, dados in prods.items()], key=lambda x: x["valor"], reverse=True)
+    for p_resumo, pedido_det in listar_pedidos(inicio_mes, fim_mes):
+        try:
+            dt_pedido = datetime.strptime(p_resumo.get('dataHora', '')[:10], "%Y-%m-%d")
+            classe = rollups.classe_situacao(p_resumo)
+            valor = rollups.valor_pedido(p_resumo)
+
+            if classe in rollups.CLASSES_ESTORNO:
+                # Adicionamos na lista de pedidos com a nomenclatura exata
+                pedidos_detalhados.append({
+                    "codigo": str(p_resumo.get('codigo')),
+                    "data": dt_pedido.strftime("%d/%m/%Y"),
+                    "valor": valor, 
+                    "situacao": p_resumo.get('pedidoSituacaoDescricao', 'DEVOLVIDO FINANCEIRO').upper(),
+                    "cliente": "Verificar Cliente"
+                })
+                continue 
+
+            # SÓ SEGUE SE ESTÁ CONFIRMADO/ENTREGUE!
+            if classe not in rollups.CLASSES_CONFIRMADAS or not pedido_det: continue
+
+            pedidos_detalhados.append({
+                "codigo": str(p_resumo.get('codigo')),
+                "data": dt_pedido.strftime("%d/%m/%Y"),
+                "valor": valor, 
+                "situacao": p_resumo.get('pedidoSituacaoDescricao'),
+                "cliente": pedido_det.get('clienteNome', 'Consumidor')
+            })
+        except: continue
 
     vendas_dia_lista = [{"dia": d, "valor": vendas_por_dia[d]["valor"], "qtd": vendas_por_dia[d]["qtd"]} for d in range(1, ultimo_dia_mes + 1)]
     categorias_lista = sorted([{"nome": k, "valor": v, "percentual": (v/total_faturamento*100) if total_faturamento > 0 else 0} for k, v in vendas_por_categoria.items()], key=lambda x: x['valor'], reverse=True)
@@ -306,20 +225,18 @@ def get_mes_atual_data(meta_mensal: float = 60000, mes: int = None, ano: int = N
             "top_produtos": top_produtos,
             "produtos_por_categoria": produtos_drilldown
         },
-        "pedidos_recentes": sorted(pedidos_detalhados, key=lambda x: x['data'], reverse=True)[:20]
+        "pedidos_recentes": sorted(pedidos_detalhados, key=lambda x: x['data'], reverse=True)[:20],
+        "ultima_sincronizacao": ultima_sincronizacao(),
+        **status_dados(completo)
     }
 
 # ==========================================
 # ROTA: RESUMO GERAL 
 # ==========================================
-@app.get("/api/dashboard/resumo")
-def get_dashboard_data(ano: int = 2026, dias_kpi: int = 30, dias_graficos: int = 30, kpi_inicio: str = None, kpi_fim: str = None, graficos_inicio: str = None, graficos_fim: str = None):
-    cache = carregar_cache() 
-    headers = get_headers()
-    
-    ano_anterior = ano - 1
+def _periodos_resumo(ano, dias_kpi, dias_graficos, kpi_inicio, kpi_fim, graficos_inicio, graficos_fim):
+    # Períodos de KPIs e gráficos da rota resumo, e desde quando ela precisa dos pedidos no armazém
     agora = get_now_br()
-    
+
     if kpi_inicio and kpi_fim:
         data_limite_kpi = datetime.strptime(kpi_inicio, "%Y-%m-%d").date()
         data_fim_kpi_real = datetime.strptime(kpi_fim, "%Y-%m-%d").date()
@@ -336,86 +253,35 @@ def get_dashboard_data(ano: int = 2026, dias_kpi: int = 30, dias_graficos: int =
     else:
         data_limite_graficos = (agora - timedelta(days=dias_graficos)).date()
         data_fim_graficos_real = agora.date()
-    
-    vendas_atual = {m: 0.0 for m in range(1, 13)}
-    vendas_passado = {m: 0.0 for m in range(1, 13)}
-    
-    faturamento_periodo = 0.0
-    pedidos_periodo = 0
-    faturamento_periodo_anterior = 0.0
-    pedidos_periodo_anterior = 0
-    
-    analise_produtos = []
-    categorias_stats = defaultdict(lambda: {"total": 0.0, "qtd": 0})
 
-    pagina = 1
-    continuar = True
-    
-    while continuar:
-        res = requests.get(f"{BASE_URL}/v2/site/pedido", headers=headers, 
-                           params={"limit": 100, "page": pagina, "order": "dataHora", "orderDirection": "desc"})
-        if res.status_code != 200: break
-        items = res.json().get('data', {}).get('items', [])
-        
-        if not items or pagina > 200: break 
-
-        for p_resumo in items:
-            dt_pedido_full = datetime.strptime(p_resumo.get('dataHora').split()[0], "%Y-%m-%d")
-            dt_pedido = dt_pedido_full.date() 
-            situacao = p_resumo.get('pedidoSituacaoDescricao', '').lower()
-            
-            if 'cancelado' in situacao or 'aguardando' in situacao: continue
-
-            valor_total = float(p_resumo.get('valorTotal') or 0)
-            valor_frete = float(p_resumo.get('valorFrete') or 0)
-            valor = valor_total - valor_frete
-
-            if dt_pedido_full.year == ano: vendas_atual[dt_pedido_full.month] += valor
-            elif dt_pedido_full.year == ano_anterior: vendas_passado[dt_pedido_full.month] += valor
-            
-            if dt_pedido_full.year < ano_anterior:
-                continuar = False
-                break
-
-            if dt_pedido >= data_limite_kpi and dt_pedido <= data_fim_kpi_real:
-                faturamento_periodo += valor
-                pedidos_periodo += 1
-            elif dt_pedido >= data_limite_kpi_anterior and dt_pedido < data_limite_kpi:
-                faturamento_periodo_anterior += valor
-                pedidos_periodo_anterior += 1
-
-            if dt_pedido >= data_limite_graficos and dt_pedido <= data_fim_graficos_real:
-                codigo_p = str(p_resumo.get('codigo'))
-                if codigo_p not in cache:
-                    try:
-                        det = requests.get(f"{BASE_URL}/v2/site/pedido/{codigo_p}", headers=headers).json()
-                        cache[codigo_p] = det.get('data', {})
-                    except: pass
-                
-                p = cache.get(codigo_p)
-                if p:
-                    for r in p.get('arrayPedidoRastreio', []):
-                        for item in r.get('pedidoItem', []):
-                            analise_produtos.append({
-                                "nome": item.get('produtoNome'),
-                                "codigo": item.get('produtoDerivacaoCodigo')
-                            })
-                            cat = item.get('categoria', 'Outros')
-                            categorias_stats[cat]["total"] += float(item.get('valorItem', 0))
-                            categorias_stats[cat]["qtd"] += 1
-                
-        pagina += 1
-
-    salvar_cache(cache)
-
-    produtos_final = {}
-    for d in analise_produtos:
-        key = f"{d['nome']}|{d['codigo']}"
-        if key not in produtos_final:
-            produtos_final[key] = {"nome": d['nome'], "codigo": d['codigo'], "qtd": 0}
-        produtos_final[key]["qtd"] += 1
-
-    top_produtos = sorted(produtos_final.values(), key=lambda x: x["qtd"], reverse=True)[:15]
+    # O ano anterior inteiro vai na linha do tempo
+    inicio_cobertura = min(date(ano - 1, 1, 1), data_limite_kpi_anterior, data_limite_graficos)
+    return data_limite_kpi, data_fim_kpi_real, data_limite_kpi_anterior, data_limite_graficos, data_fim_graficos_real, inicio_cobertura
+
+@app.get("/api/dashboard/resumo")
+@cache_respostas.em_cache("resumo", ttl=300)
+def get_dashboard_data(ano: int = 2026, dias_kpi: int = 30, dias_graficos: int = 30, kpi_inicio: str = None, kpi_fim: str = None, graficos_inicio: str = None, graficos_fim: str = None):
+    ano_anterior = ano - 1
+    data_limite_kpi, data_fim_kpi_real, data_limite_kpi_anterior, data_limite_graficos, data_fim_graficos_real, inicio_cobertura = \
+        _periodos_resumo(ano, dias_kpi, dias_graficos, kpi_inicio, kpi_fim, graficos_inicio, graficos_fim)
+
+    # Tudo vem do armazém local mantido pelo robô de sincronização
+    completo = garantir_cobertura(inicio_cobertura)
+
+    # --- LINHA DO TEMPO E KPIs: direto dos rollups diários ---
+    mensal_atual = rollups.serie_mensal(ano, rollups.CLASSES_RESUMO)
+    mensal_passado = rollups.serie_mensal(ano_anterior, rollups.CLASSES_RESUMO)
+    vendas_atual = {m: mensal_atual.get(m, 0.0) for m in range(1, 13)}
+    vendas_passado = {m: mensal_passado.get(m, 0.0) for m in range(1, 13)}
+
+    faturamento_periodo, pedidos_periodo = rollups.totais(data_limite_kpi, data_fim_kpi_real, rollups.CLASSES_RESUMO)
+    faturamento_periodo_anterior, pedidos_periodo_anterior = rollups.totais(data_limite_kpi_anterior, data_limite_kpi - timedelta(days=1), rollups.CLASSES_RESUMO)
+
+    categorias_stats = {cat: {"total": valor, "qtd": itens} for cat, valor, itens in rollups.por_categoria(data_limite_graficos, data_fim_graficos_real, rollups.CLASSES_RESUMO)}
+
+    # --- RANKING DE PRODUTOS: agrupamento vetorizado sobre os itens do período dos gráficos ---
+    itens_graficos = itens_pedido.carregar_itens(data_limite_graficos, data_fim_graficos_real, rollups.CLASSES_RESUMO)
+    top_produtos = itens_pedido.ranking_produtos(itens_graficos, limite=15)
     
     def calcular_crescimento(atual, anterior):
         if anterior == 0: return 100.0 if atual > 0 else 0.0
@@ -440,108 +306,109 @@ def get_dashboard_data(ano: int = 2026, dias_kpi: int = 30, dias_graficos: int =
             "linha_tempo": [{"name": ["Jan","Fev","Mar","Abr","Mai","Jun","Jul","Ago","Set","Out","Nov","Dez"][i], "vendas_atual": vendas_atual[i+1], "vendas_passado": vendas_passado[i+1]} for i in range(12)],
             "produtos_ranking": top_produtos,
             "ticket_categoria": sorted([{"name": k, "ticket": v["total"]/v["qtd"]} for k,v in categorias_stats.items() if v["qtd"] > 0], key=lambda x: x['ticket'], reverse=True)
-        }
+        },
+        "ultima_sincronizacao": ultima_sincronizacao(),
+        **status_dados(completo)
     }
 
 
 @app.get("/api/dashboard/carrinhos-abandonados")
+@cache_respostas.em_cache("carrinhos-abandonados", ttl=120)
 def get_carrinhos_abandonados(dias: int = 7):
+    # Os leads saem do índice local mantido pelo robô de carrinhos
+    dt_corte = (get_now_br() - timedelta(days=dias)).date()
+    completo = carrinhos.garantir_cobertura(dt_corte)
+    return {"carrinhos": carrinhos.listar_leads(dt_corte),
+            "dados_parciais": not completo, "dados_desatualizados": not carrinhos.em_dia()}
+
+
+# ==========================================
+# ROTA: PRIMEIRA PINTURA (RESUMO + MÊS ATUAL + CARRINHOS NUMA IDA SÓ)
+# ==========================================
+_paineis = ThreadPoolExecutor(max_workers=4, thread_name_prefix="paineis")
+
+def _inicio_mes_atual(mes, ano):
+    # Dia 1º do mês anterior ao alvo: desde quando a rota mes-atual precisa dos pedidos
     hoje = get_now_br()
-    data_inicio = (hoje - timedelta(days=dias)).strftime("%Y-%m-%d")
-    # ✅ data_fim = amanhã, garante que carrinhos de hoje entram no filtro
-    data_fim = (hoje + timedelta(days=1)).strftime("%Y-%m-%d")
-    dt_corte = (hoje - timedelta(days=dias)).date()
-
-    carrinhos_validos = []
-
-    for pagina in range(1, 6):
-        res = requests.get(
-            f"{BASE_URL}/v2/site/carrinho", 
-            auth=(USUARIO, SENHA), 
-            params={
-                "limit": 100,
-                "page": pagina,
-                "orderDirection": "desc",
-                "dataAtualizacaoInicio": data_inicio,
-                "dataAtualizacaoFim": data_fim
-            }
-        )
-        
-        if res.status_code != 200:
-            break
-
-        items = res.json().get('data', {}).get('items', [])
-        if not items:
-            break
-
-        for item in items:
-            if item.get('pedido'):
-                continue
-
-            # Filtra por dataInicio — data real de criação
-            dt_str = item.get('dataInicio', '')[:19]
-            try:
-                dt_item = datetime.strptime(dt_str, "%Y-%m-%dT%H:%M:%S").date()
-                if dt_item >= dt_corte:
-                    carrinhos_validos.append(item)
-            except:
-                continue
-
-        if len(items) < 100:
-            break
-
-    if not carrinhos_validos:
-        return {"carrinhos": []}
-
-    carrinhos_validos.sort(key=lambda x: x.get('dataInicio', ''), reverse=True)
-
-    def fetch_carrinho_detail(item):
-        cid = item.get('id')
-        try:
-            res_det = requests.get(
-                f"{BASE_URL}/v2/site/carrinho/{cid}/itens",
-                auth=(USUARIO, SENHA),
-                timeout=10
-            )
-            if res_det.status_code == 200:
-                dados = res_det.json().get('data', {}).get('carrinho', {})
-                pessoa = dados.get('pessoa', {})
-                
-                if not (pessoa and (pessoa.get('email') or pessoa.get('contato_principal'))):
-                    return None
-
-                dt_str = item.get('dataInicio', '')
-                try:
-                    dt_obj = datetime.strptime(dt_str[:19], "%Y-%m-%dT%H:%M:%S")
-                    data_pt = dt_obj.strftime("%d/%m/%Y %H:%M")
-                except:
-                    data_pt = dt_str
-
-                return {
-                    "id": cid,
-                    "data": data_pt,
-                    "nome": pessoa.get('nome'),
-                    "email": pessoa.get('email'),
-                    "telefone": pessoa.get('contato_principal'),
-                    "url_checkout": dados.get('url_checkout'),
-                    "total_itens": len(dados.get('itens', [])),
-                    "produtos": [
-                        {"nome": i.get('produto_nome', 'Produto'), "img": i.get('midia_url')} 
-                        for i in dados.get('itens', [])
-                    ]
-                }
-        except:
-            pass
-        return None
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        results = list(executor.map(fetch_carrinho_detail, carrinhos_validos))
-
-    leads = [r for r in results if r is not None]
-    leads.sort(key=lambda x: x["id"], reverse=True)
-
-    return {"carrinhos": leads[:30]}
+    alvo_mes = mes if mes is not None else hoje.month
+    alvo_ano = ano if ano is not None else hoje.year
+    return date(alvo_ano - 1, 12, 1) if alvo_mes == 1 else date(alvo_ano, alvo_mes - 1, 1)
+
+@app.get("/api/dashboard/bundle")
+def get_bundle(ano: int = 2026, dias_kpi: int = 30, dias_graficos: int = 30, kpi_inicio: str = None, kpi_fim: str = None,
+               graficos_inicio: str = None, graficos_fim: str = None,
+               meta_mensal: float = 60000, mes: int = None, ano_mes: int = None, dias_carrinhos: int = 7):
+    # Mesmos parâmetros das três rotas (o `ano` do mês atual vira ano_mes). Os carrinhos vêm do índice próprio,
+    # em paralelo; a cobertura de pedidos é completada uma vez para a união dos períodos, e cada painel
+    # sai do próprio cache (ou é calculado e guardado nele): a aba trocada depois já encontra o painel pronto
+    return _bundle(ano, dias_kpi, dias_graficos, kpi_inicio, kpi_fim, graficos_inicio, graficos_fim, meta_mensal, mes, ano_mes, dias_carrinhos)
+
+def _bundle(ano, dias_kpi, dias_graficos, kpi_inicio, kpi_fim, graficos_inicio, graficos_fim, meta_mensal, mes, ano_mes, dias_carrinhos, sem_cache=False):
+    # sem_cache (perfilador): calcula os três painéis sem tocar no cache, e os carrinhos na própria thread (entram na amostragem)
+    if sem_cache: carrinhos_futuro = None
+    else: carrinhos_futuro = _paineis.submit(metricas.no_contexto(get_carrinhos_abandonados.corpo), dias=dias_carrinhos)
+    inicio_resumo = _periodos_resumo(ano, dias_kpi, dias_graficos, kpi_inicio, kpi_fim, graficos_inicio, graficos_fim)[-1]
+    garantir_cobertura(min(inicio_resumo, _inicio_mes_atual(mes, ano_mes)))
+
+    resumo, cache_resumo = get_dashboard_data.corpo(sem_cache, ano=ano, dias_kpi=dias_kpi, dias_graficos=dias_graficos, kpi_inicio=kpi_inicio, kpi_fim=kpi_fim,
+                                                    graficos_inicio=graficos_inicio, graficos_fim=graficos_fim)
+    mes_atual, cache_mes = get_mes_atual_data.corpo(sem_cache, meta_mensal=meta_mensal, mes=mes, ano=ano_mes)
+    if carrinhos_futuro: carrinhos_abandonados, cache_carrinhos = carrinhos_futuro.result()
+    else: carrinhos_abandonados, cache_carrinhos = get_carrinhos_abandonados.corpo(True, dias=dias_carrinhos)
+
+    # Os painéis já estão serializados no cache: só junta os bytes
+    corpo = b'{"resumo":' + resumo + b',"mes_atual":' + mes_atual + b',"carrinhos_abandonados":' + carrinhos_abandonados + b'}'
+    return cache_respostas.resposta_json(corpo, f"resumo={cache_resumo}, mes-atual={cache_mes}, carrinhos-abandonados={cache_carrinhos}")
+
+def _bundle_sem_cache(**kwargs):
+    # Para o perfilador: a mesma rota, sem cache
+    argumentos = inspect.signature(get_bundle).bind(**kwargs)
+    argumentos.apply_defaults()
+    return _bundle(**argumentos.arguments, sem_cache=True)
+
+get_bundle.sem_cache = _bundle_sem_cache
+
+
+# ==========================================
+# ROTA: MINIATURAS DAS IMAGENS DE PRODUTO (CARRINHOS E RANKINGS)
+# ==========================================
+@app.get("/api/imagens/miniatura")
+def get_miniatura(request: Request, url: str, largura: int = miniaturas.LARGURA_PADRAO):
+    if not miniaturas.permitida(url):
+        raise HTTPException(status_code=400, detail="Só imagens do CDN da loja passam pelo proxy")
+    # WebP quando o navegador aceita, senão JPEG
+    formato = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    try:
+        gerada = miniaturas.miniatura(url, largura, formato)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Erro ao buscar a imagem: {e}")
+    if not gerada: raise HTTPException(status_code=404, detail="Imagem não encontrada")
+    caminho, info = gerada
+    return FileResponse(caminho, media_type=miniaturas.FORMATOS[formato], stat_result=info,
+                        headers={"Cache-Control": f"public, max-age={miniaturas.CACHE_SEGUNDOS}", "Vary": "Accept"})
+
 
+# ==========================================
+# ROTA: CLIENTES INATIVOS (CHURN E VALOR POR CLIENTE)
+# ==========================================
+@app.get("/api/dashboard/clientes-inativos")
+@cache_respostas.em_cache("clientes-inativos", ttl=300)
+def get_clientes_inativos(dias_min: int = 90, dias_max: int = None, ordenar: str = "dias_inativo", ordem: str = "desc",
+                          pagina: int = 1, por_pagina: int = 50):
+    # Lido direto do índice por cliente que a sincronização mantém (sem varrer os pedidos)
+    if ordenar not in indice_clientes.ORDENACOES:
+        raise HTTPException(status_code=400, detail=f"ordenar deve ser um de: {', '.join(indice_clientes.ORDENACOES)}")
+    pagina, por_pagina = max(1, pagina), min(max(1, por_pagina), 200)
+    clientes, total = indice_clientes.listar_inativos(get_now_br().date(), dias_min, dias_max, ordenar, ordem != "asc", pagina, por_pagina)
+    return {
+        "clientes": clientes,
+        "total": total,
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "total_paginas": -(-total // por_pagina),
+        "ultima_sincronizacao": ultima_sincronizacao(),
+        **status_dados()
+    }
 
 @app.get("/api/dashboard/carrinhos-abandonados-debug")
 def debug_carrinhos(dias: int = 7):
@@ -549,9 +416,8 @@ def debug_carrinhos(dias: int = 7):
     data_inicio = (hoje - timedelta(days=dias)).strftime("%Y-%m-%d")
     data_fim = hoje.strftime("%Y-%m-%d")
 
-    res = requests.get(
-        f"{BASE_URL}/v2/site/carrinho", 
-        auth=(USUARIO, SENHA), 
+    res = cliente_magazord.get(
+        "/v2/site/carrinho",
         params={"limit": 10, "page": 1, "orderDirection": "desc",
                 "dataAtualizacaoInicio": data_inicio, "dataAtualizacaoFim": data_fim}
     )
@@ -564,159 +430,87 @@ def debug_carrinhos(dias: int = 7):
     return {"datas": datas, "periodo_filtrado": f"{data_inicio} até {data_fim}"}
 
 # ==========================================
-# ROTA: DEMOGRAFIA (COM AMOSTRAGEM E PROGRESSO)
+# ROTA: DEMOGRAFIA (JOB EM SEGUNDO PLANO + PROGRESSO VIA SSE)
 # ==========================================
+@app.post("/api/dashboard/demografia/jobs")
+def iniciar_demografia(percentual: int = 25):
+    # Devolve o job (novo, ou o que já está rodando/pronto para esse percentual)
+    return demografia.iniciar_job(percentual)
+
+@app.get("/api/dashboard/demografia/jobs/{job_id}")
+def get_job_demografia(job_id: str):
+    job = demografia.buscar_job(job_id)
+    if not job: raise HTTPException(status_code=404, detail="Job não encontrado")
+    return demografia.resumo_job(job)
+
+@app.get("/api/dashboard/demografia/jobs/{job_id}/eventos")
+def get_eventos_demografia(job_id: str):
+    if not demografia.buscar_job(job_id): raise HTTPException(status_code=404, detail="Job não encontrado")
+    return StreamingResponse(demografia.eventos(job_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _job_concluido(job_id):
+    # O job pronto, ou a resposta que explica por que ainda não há resultado
+    job = demografia.buscar_job(job_id)
+    if not job: raise HTTPException(status_code=404, detail="Job não encontrado")
+    if job["status"] == "erro": raise HTTPException(status_code=502, detail=job["erro"])
+    if job["status"] != "concluido": return None, JSONResponse(status_code=202, content=demografia.resumo_job(job))
+    return job, None
+
+@app.get("/api/dashboard/demografia/jobs/{job_id}/resultado")
+def get_resultado_demografia(job_id: str, modo: str = "completo"):
+    # modo=agregado: só as contagens por estado/cidade/faixa (poucos KB); completo: também a lista de clientes
+    if modo not in ("completo", "agregado"): raise HTTPException(status_code=400, detail="modo deve ser completo ou agregado")
+    job, pendente = _job_concluido(job_id)
+    if pendente: return pendente
+    return demografia.resultado_agregado(job) if modo == "agregado" else job["resultado"]
+
+@app.get("/api/dashboard/demografia/jobs/{job_id}/clientes")
+def get_clientes_job_demografia(job_id: str, estado: str = None, faixa: str = None, cidade: str = None,
+                                cursor: int = 0, limite: int = 100):
+    job, pendente = _job_concluido(job_id)
+    if pendente: return pendente
+    clientes, proximo = demografia.listar_clientes(job, estado, faixa, cidade, cursor, limite)
+    return {"clientes": clientes, "proximo_cursor": proximo, "dados_parciais": job["resultado"]["dados_parciais"]}
+
+# Rotas antigas (bloqueiam até o job terminar), mantidas para clientes que ainda não usam os jobs
 @app.get("/api/dashboard/clientes-demografia")
-def get_clientes_demografia(percentual: int = 25):
-    global progresso_demografia
-    progresso_demografia = {"atual": 0, "total": 0, "mensagem": "Calculando tamanho da base..."}
-    
-    hoje = get_now_br()
-    cache_pessoas = carregar_cache_pessoas()
-    
-    data_inicio = "2000-01-01"
-    data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Fazemos apenas 1 pedido rápido para descobrir o TOTAL de clientes na loja
-    res_total = requests.get(f"{BASE_URL}/v2/site/pessoa", auth=(USUARIO, SENHA), params={"limit": 1, "page": 1, "orderDirection": "desc", "dataAtualizacaoInicio": data_inicio, "dataAtualizacaoFim": data_fim})
-    if res_total.status_code != 200: return {"clientes": []}
-    
-    total_magazord = res_total.json().get('data', {}).get('total', 0)
-    
-    # Calcula quantos clientes correspondem à percentagem escolhida
-    alvo_clientes = int(total_magazord * (percentual / 100.0))
-    if alvo_clientes == 0: alvo_clientes = 100 # Prevenção de erro
-    
-    progresso_demografia["total"] = alvo_clientes
-    progresso_demografia["mensagem"] = "Baixando lista de clientes..."
-    
-    pessoas_basicas = []
-    pagina = 1
-    continuar = True
-    
-    # FASE 1: Baixar a Lista Básica até atingir o Alvo
-    while continuar and len(pessoas_basicas) < alvo_clientes:
-        res = requests.get(f"{BASE_URL}/v2/site/pessoa", auth=(USUARIO, SENHA), params={"limit": 100, "page": pagina, "orderDirection": "desc", "dataAtualizacaoInicio": data_inicio, "dataAtualizacaoFim": data_fim})
-        if res.status_code != 200: break
-            
-        dados = res.json().get('data', {})
-        items = dados.get('items', [])
-        if not items: break
-        
-        if isinstance(items, dict): items = [items]
-            
-        for p in items:
-            if len(pessoas_basicas) < alvo_clientes:
-                pessoas_basicas.append(p)
-                
-        # Atualiza o React em tempo real
-        progresso_demografia["atual"] = len(pessoas_basicas)
-            
-        if not dados.get('has_more'): continuar = False
-        else: pagina += 1
-
-    # FASE 2: Verificar quem é Novo (Precisa de ficha detalhada)
-    progresso_demografia["mensagem"] = "Analisando endereços em cache..."
-    ids_faltantes = []
-    for p in pessoas_basicas:
-        pid = str(p.get('id'))
-        if pid not in cache_pessoas or not cache_pessoas.get(pid):
-            ids_faltantes.append(pid)
-
-    # FASE 3: Descarregar as Fichas Novas
-    if ids_faltantes:
-        progresso_demografia["total"] = len(ids_faltantes)
-        progresso_demografia["atual"] = 0
-        progresso_demografia["mensagem"] = "Sincronizando novas fichas detalhadas..."
-        
-        def fetch_pessoa_detail(pid):
-            try:
-                r = requests.get(f"{BASE_URL}/v2/site/pessoa/{pid}", auth=(USUARIO, SENHA), params={"listaEnderecos": 1}, timeout=10)
-                if r.status_code == 200:
-                    resp = r.json()
-                    if 'pessoaEndereco' in resp: return pid, resp
-                    else: return pid, resp.get('data', {})
-            except: pass
-            return pid, None
-
-        lock = threading.Lock() # Trava de segurança para somar certinho
-        
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            resultados = executor.map(fetch_pessoa_detail, ids_faltantes)
-            for pid, detalhe in resultados:
-                if detalhe: 
-                    cache_pessoas[pid] = detalhe
-                # O Python soma 1 na barra de progresso em tempo real
-                with lock:
-                    progresso_demografia["atual"] += 1
-        
-        salvar_cache_pessoas(cache_pessoas)
-
-    # FASE 4: Montagem Final
-    progresso_demografia["mensagem"] = "Desenhando o mapa..."
-    progresso_demografia["total"] = len(pessoas_basicas)
-    progresso_demografia["atual"] = len(pessoas_basicas)
-    
-    clientes_finais = []
-    
-    for p in pessoas_basicas:
-        pid = str(p.get('id'))
-        detalhe = cache_pessoas.get(pid, {})
-            
-        nascimento = p.get('dataNascimento') or detalhe.get('dataNascimento')
-        enderecos = detalhe.get('pessoaEndereco') or p.get('pessoaEndereco')
-        # Procura os contactos no detalhe ou na lista básica
-        contatos = detalhe.get('pessoaContato') or p.get('pessoaContato') or []
-        
-        estado = "Desconhecido" 
-        cidade = "Desconhecida"
-        
-        if isinstance(enderecos, list) and len(enderecos) > 0: 
-            sigla = enderecos[0].get('estadoSigla')
-            cidade = enderecos[0].get('cidadeNome', 'Desconhecida')
-        elif isinstance(enderecos, dict): 
-            sigla = enderecos.get('estadoSigla')
-            cidade = enderecos.get('cidadeNome', 'Desconhecida')
-        else: 
-            sigla = None
-            
-        if sigla and isinstance(sigla, str): estado = sigla.upper().strip()
-        
-        faixa = "Não informada"
-        if nascimento and isinstance(nascimento, str):
-            try:
-                dt_nasc = datetime.strptime(nascimento[:10], "%Y-%m-%d")
-                idade = hoje.year - dt_nasc.year - ((hoje.month, hoje.day) < (dt_nasc.month, dt_nasc.day))
-                
-                if 10 <= idade <= 19: faixa = "10-19 anos"
-                elif 20 <= idade <= 29: faixa = "20-29 anos"
-                elif 30 <= idade <= 39: faixa = "30-39 anos"
-                elif 40 <= idade <= 49: faixa = "40-49 anos"
-                elif 50 <= idade <= 59: faixa = "50-59 anos"
-                elif 60 <= idade <= 69: faixa = "60-69 anos"
-                elif idade >= 70: faixa = "70+ anos"
-            except: pass
-            
-        # Tenta extrair o primeiro telefone que encontrar
-        telefone = ""
-        if isinstance(contatos, list) and len(contatos) > 0:
-            telefone = contatos[0].get('contato', '')
-        
-        clientes_finais.append({
-            "nome": p.get('nome', 'Sem nome'),
-            "email": p.get('email', ''),
-            "telefone": telefone,
-            "cidade": cidade,
-            "estado": estado, 
-            "faixa": faixa
-        })
-        
-    progresso_demografia["mensagem"] = "Concluído!"
-    return {"clientes": clientes_finais}
+def get_clientes_demografia(percentual: int = 25, modo: str = "completo"):
+    job = demografia.aguardar(demografia.iniciar_job(percentual)["id"])
+    if not (job and job["resultado"]): return {"clientes": []}
+    return demografia.resultado_agregado(job) if modo == "agregado" else job["resultado"]
 
 @app.get("/api/dashboard/progresso-demografia")
 def get_progresso():
-    return progresso_demografia
+    job = demografia.ultimo_job()
+    if not job: return {"atual": 0, "total": 0, "mensagem": "Iniciando..."}
+    return {"atual": job["atual"], "total": job["total"], "mensagem": job["mensagem"]}
+
+# ==========================================
+# ROTA: PERFILADOR (ADMIN)
+# ==========================================
+# Roda uma rota do dashboard sem o cache de respostas, amostrando a pilha, e devolve as pilhas colapsadas
+# (flamegraph.pl / speedscope). Ex.: /api/admin/perfil?rota=/api/dashboard/mes-atual&mes=3&ano=2026
+@app.get("/api/admin/perfil")
+def perfilar_rota(request: Request, rota: str, intervalo_ms: float = 5):
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Rota de administrador: envie o cabeçalho X-Admin-Token")
+    endpoint = next((r.endpoint for r in app.routes if rota.startswith("/api/dashboard/")
+                     and getattr(r, "path", None) == rota and "GET" in getattr(r, "methods", ())), None)
+    if endpoint is None: raise HTTPException(status_code=404, detail="Rota do dashboard não encontrada")
+
+    # Sem o cache: mede o cálculo de verdade (rotas que compõem outras, como o bundle, têm o próprio caminho sem cache)
+    funcao = getattr(endpoint, "sem_cache", None) or inspect.unwrap(endpoint)
+    kwargs = {}
+    for nome, parametro in inspect.signature(inspect.unwrap(endpoint)).parameters.items():
+        if nome not in request.query_params: continue
+        valor = request.query_params[nome]
+        try: kwargs[nome] = parametro.annotation(valor) if parametro.annotation in (int, float) else valor
+        except ValueError: raise HTTPException(status_code=400, detail=f"Parâmetro inválido: {nome}")
+
+    _, amostras, segundos = perfilador.perfilar(funcao, intervalo=max(intervalo_ms, 1) / 1000, **kwargs)
+    return PlainTextResponse(perfilador.colapsado(amostras),
+                             headers={"X-Perfil-Amostras": str(sum(amostras.values())), "X-Perfil-Segundos": f"{segundos:.3f}"})
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,166 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# ==========================================
+# MÉTRICAS EM MEMÓRIA (FORMATO TEXTO DO PROMETHEUS)
+# ==========================================
+# Sem dependência externa: contadores e histogramas simples, lidos em GET /metrics.
+BALDES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BALDES_PAGINAS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_definicoes = {
+    "http_requisicao_segundos": ("histogram", "Latência das rotas da API", BALDES_SEGUNDOS),
+    "magazord_chamadas_total": ("counter", "Chamadas à API da Magazord por caminho e status", None),
+    "magazord_chamada_segundos": ("histogram", "Latência das chamadas à Magazord por caminho", BALDES_SEGUNDOS),
+    "magazord_novas_tentativas_total": ("counter", "Chamadas repetidas após 429/5xx/queda de conexão", None),
+    "magazord_disjuntor_aberto_total": ("counter", "Chamadas barradas pelo disjuntor", None),
+    "magazord_paginas_por_requisicao": ("histogram", "Chamadas à Magazord feitas na thread da requisição (páginas; fichas em lote ficam de fora)", BALDES_PAGINAS),
+    "cache_consultas_total": ("counter", "Acertos e faltas dos caches (respostas, fichas de pedidos, pessoas, carrinhos, catálogo, miniaturas)", None),
+    "armazem_operacao_segundos": ("histogram", "Tempo de leitura/gravação no armazém local (SQLite)", BALDES_SEGUNDOS),
+    "sincronizacao_segundos": ("histogram", "Duração das sincronizações em segundo plano", BALDES_SEGUNDOS),
+    "admissao_recusadas_total": ("counter", "Pedidos recusados com 503 pelo controle de admissão (fila cheia ou espera longa)", None),
+    "admissao_espera_segundos": ("histogram", "Tempo na fila do controle de admissão por classe de rota", BALDES_SEGUNDOS),
+    "pedidos_revalidados_total": ("counter", "Fichas de pedidos em situação não final relidas pela agenda (mudou ou igual)", None),
+}
+
+_contadores = {}     # (nome, rotulos) -> valor
+_histogramas = {}    # (nome, rotulos) -> [contagens por balde..., soma, total]
+_lock = threading.Lock()
+# Contador de chamadas à Magazord da requisição atual. A thread da rota herda o contexto; as dos executores
+# (listagem, fichas, painéis) não: o que a requisição manda para eles passa por no_contexto()
+_chamadas_requisicao = contextvars.ContextVar("chamadas_requisicao", default=None)
+# Tempo por fase da requisição atual (vai no cabeçalho Server-Timing, visível no DevTools do navegador).
+# As descrições vão no cabeçalho: só ASCII
+_fases_requisicao = contextvars.ContextVar("fases_requisicao", default=None)
+FASES = {
+    "cache": "Leitura do cache de respostas",
+    "paginacao": "Listagem na Magazord dos periodos que faltavam no armazem",
+    "fichas": "Pedidos e itens lidos do armazem",
+    "agregacao": "Rollups e agrupamentos e montagem da resposta",
+    "gravacao_cache": "Serializacao e gravacao no cache",
+}
+
+def _rotulos(rotulos):
+    return tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+def contar(nome, valor=1, **rotulos):
+    chave = (nome, _rotulos(rotulos))
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+def observar(nome, valor, **rotulos):
+    baldes = _definicoes[nome][2]
+    chave = (nome, _rotulos(rotulos))
+    with _lock:
+        h = _histogramas.get(chave)
+        if h is None:
+            h = _histogramas[chave] = [0] * (len(baldes) + 2)
+        for i, limite in enumerate(baldes):
+            if valor <= limite: h[i] += 1
+        h[-2] += valor
+        h[-1] += 1
+
+@contextmanager
+def cronometro(nome, **rotulos):
+    inicio = time.perf_counter()
+    try: yield
+    finally: observar(nome, time.perf_counter() - inicio, **rotulos)
+
+def contar_cache(cache, acertos, faltas):
+    if acertos: contar("cache_consultas_total", acertos, cache=cache, resultado="hit")
+    if faltas: contar("cache_consultas_total", faltas, cache=cache, resultado="miss")
+
+@contextmanager
+def fase(nome):
+    # Soma o tempo do bloco na fase `nome` da requisição atual, descontando as fases abertas dentro dele
+    # (a rota inteira conta como agregação, menos o que foi listagem, leitura do armazém...). Fora de uma requisição não faz nada
+    atual = _fases_requisicao.get()
+    if atual is None:
+        yield
+        return
+    fases, abertas = atual
+    abertas.append(nome)
+    inicio = time.perf_counter()
+    try: yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        abertas.pop()
+        with _lock:
+            fases[nome] = fases.get(nome, 0) + duracao
+            if abertas: fases[abertas[-1]] = fases.get(abertas[-1], 0) - duracao
+
+def no_contexto(funcao):
+    # Embrulha `funcao` para rodar, em outra thread, com os contadores da requisição de quem chamou.
+    # Cada thread abre as fases numa pilha própria (os tempos delas somam nas mesmas fases)
+    contexto = contextvars.copy_context()
+    def dentro(*args, **kwargs):
+        atual = _fases_requisicao.get()
+        if atual is not None: _fases_requisicao.set((atual[0], []))
+        return funcao(*args, **kwargs)
+    # Uma cópia por chamada: o mesmo Context não pode rodar em duas threads ao mesmo tempo
+    return lambda *args, **kwargs: contexto.copy().run(dentro, *args, **kwargs)
+
+def registrar_chamada_magazord():
+    chamadas = _chamadas_requisicao.get()
+    if chamadas is not None:
+        with _lock: chamadas[0] += 1
+
+# --- EXPORTAÇÃO ---
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _formatar_rotulos(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    if not pares: return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+def _server_timing(fases, total):
+    partes = [f'{nome};desc="{descricao}";dur={fases[nome] * 1000:.1f}' for nome, descricao in FASES.items() if nome in fases]
+    partes.append(f'total;dur={total * 1000:.1f}')
+    return ", ".join(partes)
+
+def texto_prometheus():
+    with _lock:
+        contadores = dict(_contadores)
+        histogramas = {k: list(v) for k, v in _histogramas.items()}
+    linhas = []
+    for nome, (tipo, ajuda, baldes) in _definicoes.items():
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        if tipo == "counter":
+            for (n, rotulos), valor in sorted(contadores.items()):
+                if n == nome: linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {valor}")
+        else:
+            for (n, rotulos), h in sorted(histogramas.items()):
+                if n != nome: continue
+                for limite, contagem in zip(baldes, h):
+                    linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, [('le', limite)])} {contagem}")
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, [('le', '+Inf')])} {h[-1]}")
+                linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {h[-2]}")
+                linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {h[-1]}")
+    return "\n".join(linhas) + "\n"
+
+# --- MIDDLEWARE: LATÊNCIA POR ROTA ---
+async def middleware_metricas(request, call_next):
+    chamadas = [0]
+    fases = {}
+    token = _chamadas_requisicao.set(chamadas)
+    token_fases = _fases_requisicao.set((fases, []))
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = _server_timing(fases, time.perf_counter() - inicio)
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+    finally:
+        _chamadas_requisicao.reset(token)
+        _fases_requisicao.reset(token_fases)
+        # Rótulo pelo molde da rota ("/jobs/{job_id}"), não pela URL, para não explodir a cardinalidade
+        rota = getattr(request.scope.get("route"), "path", None) or "desconhecida"
+        if rota != "/metrics":
+            observar("http_requisicao_segundos", time.perf_counter() - inicio, rota=rota, metodo=request.method, status=status)
+            observar("magazord_paginas_por_requisicao", chamadas[0], rota=rota)
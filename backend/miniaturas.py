@@ -0,0 +1,169 @@
+import os
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageOps
+import coalescencia
+import metricas
+import catalogo
+
+# ==========================================
+# MINIATURAS DAS IMAGENS DE PRODUTO (PROXY COM CACHE EM DISCO)
+# ==========================================
+# Cada imagem do CDN é baixada uma vez, reduzida e guardada em MINIATURAS_DIR.
+# A pasta tem teto de tamanho (MINIATURAS_MAX_MB): passando dele, saem as menos usadas (LRU pela data de acesso).
+# MINIATURAS_ORIGEM_DIR troca o CDN por uma pasta local (mesmo caminho da URL), para testar sem rede.
+PASTA = os.getenv("MINIATURAS_DIR", "miniaturas")
+MAX_BYTES = int(float(os.getenv("MINIATURAS_MAX_MB", 200)) * 1024 * 1024)
+ORIGEM_DIR = os.getenv("MINIATURAS_ORIGEM_DIR")
+QUALIDADE = int(os.getenv("MINIATURAS_QUALIDADE", 80))
+CACHE_SEGUNDOS = 30 * 24 * 3600   # Cache-Control das miniaturas servidas
+MAX_ORIGINAL = 15 * 1024 * 1024   # não tenta reduzir arquivos maiores que isso
+LARGURAS = (48, 96, 160, 320)     # larguras aceitas (qualquer outra é arredondada para a próxima)
+LARGURA_PADRAO = 96
+FORMATOS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+# Só busca imagens destes hosts (o proxy não pode virar um "baixa qualquer URL")
+HOSTS = {urlparse(catalogo.CDN_URL).netloc} | {h.strip() for h in os.getenv("MINIATURAS_HOSTS", "").split(",") if h.strip()}
+
+_sessao = requests.Session()
+_sessao.mount("https://", HTTPAdapter(pool_maxsize=8))
+_sessao.mount("http://", HTTPAdapter(pool_maxsize=8))
+
+_indice = None          # OrderedDict caminho -> bytes, do menos para o mais usado
+_total = 0
+_lock = threading.Lock()
+
+def permitida(url):
+    try: partes = urlparse(url)
+    except: return False
+    return partes.scheme in ("http", "https") and partes.netloc in HOSTS
+
+def largura_valida(largura):
+    return next((l for l in LARGURAS if l >= largura), LARGURAS[-1])
+
+def url_miniatura(url, largura=LARGURA_PADRAO):
+    # Caminho (relativo à API) da miniatura de `url`; None se a imagem não pode passar pelo proxy
+    if not url or not permitida(url): return None
+    return "/api/imagens/miniatura?" + urlencode({"url": url, "largura": largura_valida(largura)})
+
+# --- ÍNDICE LRU DA PASTA ---
+def _carregar_indice():
+    # Primeira vez: lê a pasta, do arquivo acessado há mais tempo para o mais recente
+    global _indice, _total
+    arquivos = []
+    for raiz, _, nomes in os.walk(PASTA):
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            if nome.endswith(".tmp"):
+                try: os.remove(caminho)
+                except: pass
+                continue
+            try: info = os.stat(caminho)
+            except OSError: continue
+            arquivos.append((info.st_atime, caminho, info.st_size))
+    _indice = OrderedDict((caminho, tamanho) for _, caminho, tamanho in sorted(arquivos))
+    _total = sum(_indice.values())
+
+def _usar(caminho):
+    # Acerto no cache: vai para o fim da fila (e a data de acesso do arquivo marca o uso para a próxima carga).
+    # Retorna o os.stat do arquivo, ou None se não está no cache
+    global _total
+    with _lock:
+        if _indice is None: _carregar_indice()
+        if caminho not in _indice: return None
+        _indice.move_to_end(caminho)
+    try:
+        # Só a data de acesso: a de modificação é a base do ETag da resposta
+        info = os.stat(caminho)
+        os.utime(caminho, (time.time(), info.st_mtime))
+        return info
+    except OSError:
+        # Apagado por fora: tira do índice e gera de novo
+        with _lock: _total -= _indice.pop(caminho, 0)
+        return None
+
+def _adicionar(caminho, tamanho):
+    global _total
+    removidos = []
+    with _lock:
+        if _indice is None: _carregar_indice()
+        _total += tamanho - _indice.pop(caminho, 0)
+        _indice[caminho] = tamanho
+        while _total > MAX_BYTES and len(_indice) > 1:
+            antigo, bytes_antigo = _indice.popitem(last=False)
+            _total -= bytes_antigo
+            removidos.append(antigo)
+    for antigo in removidos:
+        try: os.remove(antigo)
+        except OSError: pass
+
+# --- ORIGEM, REDUÇÃO E GRAVAÇÃO ---
+def _baixar(url):
+    if ORIGEM_DIR:
+        raiz = os.path.abspath(ORIGEM_DIR)
+        caminho = os.path.abspath(os.path.join(raiz, urlparse(url).path.lstrip("/")))
+        if not caminho.startswith(raiz + os.sep) or not os.path.isfile(caminho): return None
+        with open(caminho, "rb") as f: return f.read(MAX_ORIGINAL + 1)
+    # Sem seguir redirecionamento (o host permitido não pode mandar o proxy para outro lugar)
+    # e lendo aos poucos: passou de MAX_ORIGINAL, desiste sem baixar o resto
+    with _sessao.get(url, timeout=15, stream=True, allow_redirects=False) as res:
+        if res.status_code != 200: return None
+        try:
+            if int(res.headers.get("Content-Length") or 0) > MAX_ORIGINAL: return None
+        except ValueError: pass
+        dados = bytearray()
+        for parte in res.iter_content(64 * 1024):
+            dados += parte
+            if len(dados) > MAX_ORIGINAL: return None
+        return bytes(dados)
+
+def _reduzir(original, largura, formato):
+    imagem = ImageOps.exif_transpose(Image.open(io.BytesIO(original)))
+    imagem.thumbnail((largura, largura * 4))   # limita a largura e mantém a proporção (nunca amplia)
+    if formato == "jpeg" or imagem.mode not in ("RGB", "RGBA"):
+        if imagem.mode in ("RGBA", "LA", "P"):
+            # JPEG não tem transparência: fundo branco, como no site
+            imagem = imagem.convert("RGBA")
+            fundo = Image.new("RGB", imagem.size, (255, 255, 255))
+            fundo.paste(imagem, mask=imagem.getchannel("A"))
+            imagem = fundo
+        else:
+            imagem = imagem.convert("RGB")
+    saida = io.BytesIO()
+    imagem.save(saida, format=formato.upper(), quality=QUALIDADE, optimize=formato == "jpeg")
+    return saida.getvalue()
+
+def _gerar(url, largura, formato, caminho):
+    original = _baixar(url)
+    if not original or len(original) > MAX_ORIGINAL: return None
+    try:
+        dados = _reduzir(original, largura, formato)
+    except Exception as e:
+        print(f"Erro ao reduzir imagem {url}: {e}")
+        return None
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{threading.get_ident()}.tmp"
+    with open(temporario, "wb") as f: f.write(dados)
+    os.replace(temporario, caminho)
+    info = os.stat(caminho)
+    _adicionar(caminho, len(dados))
+    return caminho, info
+
+def miniatura(url, largura=LARGURA_PADRAO, formato="webp"):
+    # (caminho, os.stat) da miniatura (gera na primeira vez); None se a imagem não existe ou não abre.
+    # O stat sai daqui: o arquivo pode ser despejado pelo LRU logo depois
+    largura = largura_valida(largura)
+    chave = hashlib.sha1(f"{url}|{largura}|{formato}".encode("utf-8")).hexdigest()
+    caminho = os.path.join(PASTA, chave[:2], f"{chave}.{'jpg' if formato == 'jpeg' else formato}")
+    info = _usar(caminho)
+    if info:
+        metricas.contar_cache("miniaturas", 1, 0)
+        return caminho, info
+    metricas.contar_cache("miniaturas", 0, 1)
+    # A mesma imagem pedida por vários cartões ao mesmo tempo: baixa e reduz uma vez só
+    return coalescencia.executar(f"miniatura:{chave}", _gerar, url, largura, formato, caminho)
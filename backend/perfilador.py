@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+# ==========================================
+# PERFILADOR POR AMOSTRAGEM (PILHAS COLAPSADAS PARA FLAMEGRAPH)
+# ==========================================
+# Roda uma função na thread atual enquanto outra thread lê a pilha dela a cada `intervalo` segundos.
+# A saída é o formato "colapsado" (uma pilha por linha, "a;b;c N"), aceito pelo flamegraph.pl e pelo speedscope.
+INTERVALO_PADRAO = 0.005
+DURACAO_MAXIMA = 120   # segundos: passando disso a amostragem para (a função continua até o fim)
+
+def _quadro(codigo):
+    return f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}"
+
+def _pilha(frame, raiz):
+    # Da função perfilada (logo abaixo de `raiz`) até o ponto em que a thread está agora
+    quadros = []
+    while frame is not None and frame.f_code is not raiz:
+        quadros.append(_quadro(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(quadros))
+
+def perfilar(funcao, *args, intervalo=INTERVALO_PADRAO, **kwargs):
+    # Retorna (resultado, amostras: Counter pilha -> contagem, segundos)
+    alvo = threading.get_ident()
+    raiz = sys._getframe().f_code
+    amostras = Counter()
+    parar = threading.Event()
+
+    def amostrar():
+        limite = time.monotonic() + DURACAO_MAXIMA
+        while not parar.wait(intervalo) and time.monotonic() < limite:
+            frame = sys._current_frames().get(alvo)
+            if frame is not None: amostras[_pilha(frame, raiz)] += 1
+
+    amostrador = threading.Thread(target=amostrar, daemon=True, name="perfilador")
+    inicio = time.perf_counter()
+    amostrador.start()
+    try:
+        resultado = funcao(*args, **kwargs)
+    finally:
+        parar.set()
+        amostrador.join()
+    return resultado, amostras, time.perf_counter() - inicio
+
+def colapsado(amostras):
+    return "".join(f"{pilha} {n}\n" for pilha, n in sorted(amostras.items()) if pilha)
@@ -0,0 +1,263 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import banco_pedidos
+import cliente_magazord
+import coalescencia
+import metricas
+from sincronizacao import get_now_br
+
+CACHE_PESSOAS_FILE = "cache_pessoas.json"   # Formato antigo (fichas com endereço)
+PESSOAS_WORKERS = int(os.getenv("SYNC_PESSOAS_WORKERS", 20))
+# A API filtra dataAtualizacao por dia: relemos o último dia para não perder ninguém
+PESSOAS_SOBREPOSICAO_DIAS = 1
+
+# Perfis em memória (o que a demografia usa): id -> (data_atualizacao, perfil). None = ainda não carregados
+_perfis = None
+_perfis_lock = threading.Lock()
+
+# Progresso da sincronização em andamento: vai para todos que esperam por ela (ex.: jobs de demografia
+# de percentuais diferentes), não só para quem a começou
+_ouvintes = []
+_ultimo_progresso = {}    # quem chega no meio começa daqui
+_ouvintes_lock = threading.Lock()
+
+def _criar_tabelas(con):
+    with con:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS pessoas (
+                id TEXT PRIMARY KEY,
+                data_atualizacao TEXT,
+                basico TEXT,
+                detalhe TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_pessoas_atualizacao ON pessoas (data_atualizacao);
+        """)
+    _migrar_json(con)
+
+def _migrar_json(con):
+    # Aproveita as fichas já baixadas: só os endereços, a lista básica vem na primeira sincronização
+    if not os.path.exists(CACHE_PESSOAS_FILE): return
+    if con.execute("SELECT 1 FROM pessoas LIMIT 1").fetchone(): return
+    try:
+        with open(CACHE_PESSOAS_FILE, 'r', encoding='utf-8') as f: fichas = json.load(f)
+    except: fichas = {}
+    print(f"📦 Migrando {len(fichas)} fichas de pessoas para {banco_pedidos.BANCO_FILE}...")
+    with con:
+        con.executemany("INSERT OR REPLACE INTO pessoas (id, detalhe) VALUES (?, ?)",
+                        [(str(pid), json.dumps(d, ensure_ascii=False)) for pid, d in fichas.items() if d])
+    os.replace(CACHE_PESSOAS_FILE, CACHE_PESSOAS_FILE + ".migrado")
+
+banco_pedidos.registrar_extensao(_criar_tabelas)
+
+# ==========================================
+# SINCRONIZAÇÃO INCREMENTAL (MARCA D'ÁGUA EM dataAtualizacao)
+# ==========================================
+def _buscar_detalhe(pid):
+    try:
+        r = cliente_magazord.get(f"/v2/site/pessoa/{pid}", params={"listaEnderecos": 1}, timeout=10)
+        if r.status_code == 200:
+            resp = r.json()
+            if 'pessoaEndereco' in resp: return pid, resp
+            else: return pid, resp.get('data', {})
+    except: pass
+    return pid, None
+
+def _precisam_detalhe(con, pessoas_lista):
+    # Ficha nova, sem endereço, ou cadastro alterado desde a última vez
+    ids = [str(p.get('id')) for p in pessoas_lista]
+    marcas = ",".join("?" * len(ids))
+    guardadas = {pid: (data, tem) for pid, data, tem in con.execute(
+        f"SELECT id, data_atualizacao, detalhe IS NOT NULL FROM pessoas WHERE id IN ({marcas})", ids)}
+    faltantes = []
+    for p in pessoas_lista:
+        pid = str(p.get('id'))
+        data, tem_detalhe = guardadas.get(pid, (None, False))
+        # data None = ficha migrada do JSON antigo: confia nela até o cadastro mudar de novo
+        if not tem_detalhe or (data is not None and data != p.get('dataAtualizacao')):
+            faltantes.append(pid)
+    metricas.contar_cache("fichas_pessoas", len(pessoas_lista) - len(faltantes), len(faltantes))
+    return faltantes
+
+def _gravar_pagina(con, items, faltantes):
+    # Só regrava quem mudou (a última página se repete a cada sincronização). Retorna os ids gravados.
+    # Quem vai buscar a ficha fica com a data antiga: ela só avança junto com a ficha (se a busca falhar, tenta de novo)
+    faltantes = set(faltantes)
+    linhas = [(str(p.get('id')), None if str(p.get('id')) in faltantes else p.get('dataAtualizacao'), json.dumps(p, ensure_ascii=False))
+              for p in items]
+    marcas = ",".join("?" * len(linhas))
+    guardados = dict(con.execute(f"SELECT id, basico FROM pessoas WHERE id IN ({marcas})", [l[0] for l in linhas]).fetchall())
+    mudaram = [l for l in linhas if guardados.get(l[0]) != l[2]]
+    with con:
+        con.executemany("""
+            INSERT INTO pessoas (id, data_atualizacao, basico) VALUES (?,?,?)
+            ON CONFLICT(id) DO UPDATE SET data_atualizacao = COALESCE(excluded.data_atualizacao, data_atualizacao), basico = excluded.basico
+        """, mudaram)
+    return [l[0] for l in mudaram]
+
+def _sincronizar(avisar):
+    banco_pedidos.inicializar()
+    con = banco_pedidos.conexao()
+
+    watermark = banco_pedidos.ler_estado('pessoas_watermark')
+    if watermark:
+        data_inicio = (datetime.strptime(watermark[:10], "%Y-%m-%d") - timedelta(days=PESSOAS_SOBREPOSICAO_DIAS)).strftime("%Y-%m-%d")
+    else:
+        data_inicio = "2000-01-01"
+    data_fim = get_now_br().strftime("%Y-%m-%d")
+    filtro = {"orderDirection": "desc", "dataAtualizacaoInicio": data_inicio, "dataAtualizacaoFim": data_fim}
+
+    avisar(mensagem="Buscando clientes alterados...", atual=0, total=0)
+    alterados = {}   # id -> dataAtualizacao da listagem
+    maior_data = watermark or ''
+    pagina = 1
+    completo = False
+    while True:
+        res = cliente_magazord.get("/v2/site/pessoa", params={"limit": 100, "page": pagina, **filtro})
+        if res.status_code != 200: break
+        dados = res.json().get('data', {})
+        items = dados.get('items', [])
+        if isinstance(items, dict): items = [items]
+        if not items:
+            completo = True
+            break
+
+        faltantes = _precisam_detalhe(con, items)
+        _atualizar_perfis(con, _gravar_pagina(con, items, faltantes))
+        datas = {str(p.get('id')): p.get('dataAtualizacao') for p in items}
+        alterados.update((pid, datas[pid]) for pid in faltantes)
+        maior_data = max([maior_data] + [str(p.get('dataAtualizacao') or '') for p in items])
+        if pagina == 1: avisar(total=dados.get('total', 0))
+        avisar(atual=min((pagina - 1) * 100 + len(items), dados.get('total', 0) or 0))
+
+        if not dados.get('has_more'):
+            completo = True
+            break
+        pagina += 1
+
+    # Fichas (endereço/telefone) só de quem mudou
+    if alterados:
+        avisar(mensagem="Sincronizando novas fichas detalhadas...", atual=0, total=len(alterados))
+        falharam = []
+        with ThreadPoolExecutor(max_workers=PESSOAS_WORKERS) as executor:
+            for i, (pid, detalhe) in enumerate(executor.map(metricas.no_contexto(_buscar_detalhe), alterados), 1):
+                if detalhe:
+                    with con:
+                        con.execute("UPDATE pessoas SET detalhe = ?, data_atualizacao = ? WHERE id = ?",
+                                    (json.dumps(detalhe, ensure_ascii=False), alterados[pid], pid))
+                else:
+                    falharam.append(pid)
+                avisar(atual=i)
+        _atualizar_perfis(con, list(alterados))
+        # A marca não passa de quem ficou sem ficha: a próxima listagem traz de novo
+        if falharam:
+            print(f"⚠️ {len(falharam)} fichas de pessoas não vieram nesta sincronização")
+            maior_data = min([maior_data] + [str(alterados[pid] or '') for pid in falharam if alterados[pid]])
+
+    # Só avança a marca se a listagem chegou até o fim
+    if completo and maior_data: banco_pedidos.gravar_estado('pessoas_watermark', maior_data)
+    return completo
+
+def _avisar_ouvintes(**campos):
+    with _ouvintes_lock:
+        _ultimo_progresso.update(campos)
+        ouvintes = list(_ouvintes)
+    for ouvinte in ouvintes:
+        try: ouvinte(**campos)
+        except Exception as e: print(f"Erro ao avisar progresso de pessoas: {e}")
+
+def _sincronizar_avisando():
+    with _ouvintes_lock: _ultimo_progresso.clear()
+    try: return _sincronizar(_avisar_ouvintes)
+    finally:
+        with _ouvintes_lock: _ultimo_progresso.clear()
+
+def sincronizar_pessoas(progresso=None):
+    # progresso(mensagem=..., atual=..., total=...) é opcional; chamadas simultâneas dividem a mesma varredura
+    # e todas recebem o progresso dela. Retorna False se a listagem parou no meio (a marca d'água não avança)
+    if progresso:
+        with _ouvintes_lock:
+            _ouvintes.append(progresso)
+            estado = dict(_ultimo_progresso)
+        if estado: progresso(**estado)
+    try:
+        with metricas.cronometro("sincronizacao_segundos", tipo="pessoas"):
+            return coalescencia.executar("sincronizar_pessoas", _sincronizar_avisando)
+    finally:
+        if progresso:
+            with _ouvintes_lock: _ouvintes.remove(progresso)
+
+# ==========================================
+# LEITURA
+# ==========================================
+# --- PERFIS EM MEMÓRIA ---
+# Nome, contato, cidade/UF e nascimento de cada cadastro, extraídos uma vez das fichas:
+# a demografia não decodifica o JSON de toda a base a cada job.
+def _perfil(p, detalhe):
+    enderecos = detalhe.get('pessoaEndereco') or p.get('pessoaEndereco')
+    # Procura os contactos no detalhe ou na lista básica
+    contatos = detalhe.get('pessoaContato') or p.get('pessoaContato') or []
+
+    if isinstance(enderecos, list) and len(enderecos) > 0: endereco = enderecos[0]
+    elif isinstance(enderecos, dict): endereco = enderecos
+    else: endereco = {}
+    sigla = endereco.get('estadoSigla')
+
+    # Tenta extrair o primeiro telefone que encontrar
+    telefone = ""
+    if isinstance(contatos, list) and len(contatos) > 0:
+        telefone = contatos[0].get('contato', '')
+
+    return {
+        "nome": p.get('nome', 'Sem nome'),
+        "email": p.get('email', ''),
+        "telefone": telefone,
+        "cidade": endereco.get('cidadeNome', 'Desconhecida'),
+        "estado": sigla.upper().strip() if sigla and isinstance(sigla, str) else "Desconhecido",
+        "nascimento": p.get('dataNascimento') or detalhe.get('dataNascimento'),
+    }
+
+def _ler_perfis(con, ids=None):
+    sql = "SELECT id, data_atualizacao, basico, detalhe FROM pessoas WHERE basico IS NOT NULL"
+    if ids is not None: sql += f" AND id IN ({','.join('?' * len(ids))})"
+    return {pid: (data or '', _perfil(json.loads(b), json.loads(d) if d else {}))
+            for pid, data, b, d in con.execute(sql, ids or [])}
+
+def carregar_perfis():
+    # Chamado no início do app (lifespan); sem ele, a primeira leitura carrega
+    global _perfis
+    banco_pedidos.inicializar()
+    with _perfis_lock:
+        if _perfis is not None: return
+        with metricas.cronometro("armazem_operacao_segundos", operacao="carregar_perfis"):
+            _perfis = _ler_perfis(banco_pedidos.conexao())
+
+def _atualizar_perfis(con, ids):
+    # Refaz o perfil só de quem foi gravado de fato (se a carga inicial estiver no meio, espera por ela)
+    if not ids: return
+    with _perfis_lock:
+        if _perfis is None: return
+    for i in range(0, len(ids), 500):
+        lote = ids[i:i + 500]
+        novos = _ler_perfis(con, lote)
+        with _perfis_lock:
+            for pid in lote:
+                if pid in novos: _perfis[pid] = novos[pid]
+                else: _perfis.pop(pid, None)
+
+def listar_perfis(limite=None):
+    # Perfis dos cadastros mais recentemente atualizados primeiro (data de atualização, depois id)
+    if _perfis is None: carregar_perfis()
+    with _perfis_lock: itens = list(_perfis.items())
+    itens.sort(key=lambda item: (item[1][0], _id_numerico(item[0])), reverse=True)
+    return [perfil for _, (_, perfil) in (itens[:limite] if limite else itens)]
+
+def _id_numerico(pid):
+    try: return int(pid)
+    except: return 0
+
+def contar_pessoas():
+    banco_pedidos.inicializar()
+    return banco_pedidos.conexao().execute("SELECT COUNT(*) FROM pessoas WHERE basico IS NOT NULL").fetchone()[0]
@@ -0,0 +1,147 @@
+import json
+from collections import defaultdict
+from datetime import date
+import banco_pedidos
+
+# Sobe esta versão quando mudar a regra de contribuição: o rollup é refeito do zero
+VERSAO_ROLLUPS = "1"
+
+# ==========================================
+# REGRAS DE OURO DA SITUAÇÃO
+# ==========================================
+# mes-atual: estornos somam no "cofre de devoluções"; só 'confirmado' entra no faturamento
+# resumo: tudo que não está aguardando nem cancelado entra nos gráficos e KPIs
+CLASSES_CONFIRMADAS = ("confirmado",)
+CLASSES_ESTORNO = ("estorno", "estorno_em_aberto")
+CLASSES_RESUMO = ("confirmado", "pendente", "estorno")
+
+def classe_situacao(p_resumo):
+    situacao_desc = str(p_resumo.get('pedidoSituacaoDescricao') or '').lower()
+    situacao_id = p_resumo.get('pedidoSituacao') or p_resumo.get('situacao')
+
+    is_estorno = (situacao_id == 17) or ('devolvido financeiro' in situacao_desc) or ('estorno' in situacao_desc)
+    is_aguardando = 'aguardando' in situacao_desc
+    is_pendente = 'pendente' in situacao_desc
+    is_cancelado = 'cancelado' in situacao_desc
+
+    if is_estorno: return "estorno_em_aberto" if (is_aguardando or is_cancelado) else "estorno"
+    if is_aguardando: return "aguardando"
+    if is_cancelado: return "cancelado"
+    if is_pendente: return "pendente"
+    return "confirmado"
+
+def valor_pedido(p_resumo):
+    # Valor sem frete
+    return float(p_resumo.get('valorTotal') or 0) - float(p_resumo.get('valorFrete') or 0)
+
+def _contribuicao(resumo, detalhe):
+    if not resumo: return None
+    try:
+        dia = str(resumo.get('dataHora') or '')[:10]
+        if not dia: return None
+        categorias = defaultdict(lambda: [0.0, 0])
+        pagamento = None
+        if detalhe:
+            pagamento = detalhe.get('pedidoFormaPagamentoDescricao', 'Outros')
+            for r in detalhe.get('arrayPedidoRastreio', []):
+                for item in r.get('pedidoItem', []):
+                    cat = item.get('categoria') or 'Outros'
+                    categorias[cat][0] += float(item.get('valorItem', 0))
+                    categorias[cat][1] += 1
+        return dia, classe_situacao(resumo), valor_pedido(resumo), categorias, pagamento
+    except: return None
+
+def _aplicar(con, contribuicao, sinal):
+    if not contribuicao: return
+    dia, classe, valor, categorias, pagamento = contribuicao
+    con.execute("""
+        INSERT INTO rollup_diario (dia, classe, receita, pedidos) VALUES (?,?,?,?)
+        ON CONFLICT(dia, classe) DO UPDATE SET receita = receita + excluded.receita, pedidos = pedidos + excluded.pedidos
+    """, (dia, classe, sinal * valor, sinal))
+    for cat, (valor_cat, itens) in categorias.items():
+        con.execute("""
+            INSERT INTO rollup_categoria (dia, classe, categoria, valor, itens) VALUES (?,?,?,?,?)
+            ON CONFLICT(dia, classe, categoria) DO UPDATE SET valor = valor + excluded.valor, itens = itens + excluded.itens
+        """, (dia, classe, cat, sinal * valor_cat, sinal * itens))
+    if pagamento is not None:
+        con.execute("""
+            INSERT INTO rollup_pagamento (dia, classe, forma, valor, pedidos) VALUES (?,?,?,?,?)
+            ON CONFLICT(dia, classe, forma) DO UPDATE SET valor = valor + excluded.valor, pedidos = pedidos + excluded.pedidos
+        """, (dia, classe, pagamento, sinal * valor, sinal))
+
+def _ao_gravar(con, codigo, antigo, novo):
+    # Troca a contribuição antiga do pedido pela nova (mudança de situação, ficha que chegou...)
+    _aplicar(con, _contribuicao(*antigo), -1)
+    _aplicar(con, _contribuicao(*novo), +1)
+
+def _criar_tabelas(con):
+    with con:
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS rollup_diario (
+                dia TEXT, classe TEXT, receita REAL DEFAULT 0, pedidos INTEGER DEFAULT 0,
+                PRIMARY KEY (dia, classe)
+            );
+            CREATE TABLE IF NOT EXISTS rollup_categoria (
+                dia TEXT, classe TEXT, categoria TEXT, valor REAL DEFAULT 0, itens INTEGER DEFAULT 0,
+                PRIMARY KEY (dia, classe, categoria)
+            );
+            CREATE TABLE IF NOT EXISTS rollup_pagamento (
+                dia TEXT, classe TEXT, forma TEXT, valor REAL DEFAULT 0, pedidos INTEGER DEFAULT 0,
+                PRIMARY KEY (dia, classe, forma)
+            );
+        """)
+        versao = con.execute("SELECT valor FROM estado WHERE chave = 'rollups_versao'").fetchone()
+        if versao and versao[0] == VERSAO_ROLLUPS: return
+
+        # Primeira vez (ou regra nova): refaz a partir dos pedidos já guardados
+        con.execute("DELETE FROM rollup_diario")
+        con.execute("DELETE FROM rollup_categoria")
+        con.execute("DELETE FROM rollup_pagamento")
+        for resumo, detalhe in con.execute("SELECT resumo, detalhe FROM pedidos WHERE resumo IS NOT NULL").fetchall():
+            _aplicar(con, _contribuicao(json.loads(resumo), json.loads(detalhe) if detalhe else None), +1)
+        con.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES ('rollups_versao', ?)", (VERSAO_ROLLUPS,))
+
+banco_pedidos.registrar_extensao(_criar_tabelas, _ao_gravar)
+
+# ==========================================
+# CONSULTAS (somam no máximo uma linha por dia/classe)
+# ==========================================
+def _filtro(data_inicio, data_fim, classes):
+    marcas = ",".join("?" * len(classes))
+    return (f"dia >= ? AND dia <= ? AND classe IN ({marcas})",
+            [data_inicio.strftime("%Y-%m-%d"), data_fim.strftime("%Y-%m-%d"), *classes])
+
+def totais(data_inicio, data_fim, classes):
+    banco_pedidos.inicializar()
+    filtro, params = _filtro(data_inicio, data_fim, classes)
+    receita, pedidos = banco_pedidos.conexao().execute(
+        f"SELECT COALESCE(SUM(receita), 0), COALESCE(SUM(pedidos), 0) FROM rollup_diario WHERE {filtro}", params).fetchone()
+    return receita, pedidos
+
+def serie_diaria(data_inicio, data_fim, classes):
+    # {"AAAA-MM-DD": (receita, pedidos)}
+    banco_pedidos.inicializar()
+    filtro, params = _filtro(data_inicio, data_fim, classes)
+    return {dia: (receita, pedidos) for dia, receita, pedidos in banco_pedidos.conexao().execute(
+        f"SELECT dia, SUM(receita), SUM(pedidos) FROM rollup_diario WHERE {filtro} GROUP BY dia HAVING SUM(pedidos) > 0", params)}
+
+def serie_mensal(ano, classes):
+    # {mes: receita} do ano inteiro
+    banco_pedidos.inicializar()
+    filtro, params = _filtro(date(ano, 1, 1), date(ano, 12, 31), classes)
+    return {int(mes): receita for mes, receita in banco_pedidos.conexao().execute(
+        f"SELECT substr(dia, 6, 2), SUM(receita) FROM rollup_diario WHERE {filtro} GROUP BY substr(dia, 6, 2)", params)}
+
+def por_categoria(data_inicio, data_fim, classes):
+    # [(categoria, valor, itens)]
+    banco_pedidos.inicializar()
+    filtro, params = _filtro(data_inicio, data_fim, classes)
+    return banco_pedidos.conexao().execute(
+        f"SELECT categoria, SUM(valor), SUM(itens) FROM rollup_categoria WHERE {filtro} GROUP BY categoria HAVING SUM(itens) > 0", params).fetchall()
+
+def por_pagamento(data_inicio, data_fim, classes):
+    # [(forma, valor)]
+    banco_pedidos.inicializar()
+    filtro, params = _filtro(data_inicio, data_fim, classes)
+    return banco_pedidos.conexao().execute(
+        f"SELECT forma, SUM(valor) FROM rollup_pagamento WHERE {filtro} GROUP BY forma HAVING SUM(pedidos) > 0", params).fetchall()
@@ -0,0 +1,300 @@
+import os
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone, date
+import banco_pedidos
+import cliente_magazord
+import coalescencia
+import metricas
+import cassetes
+import rollups  # mantém os rollups diários a cada gravação
+import itens_pedido  # mantém a tabela achatada de itens a cada gravação
+import indice_clientes  # mantém o índice de compras por cliente a cada gravação
+
+# De quanto em quanto tempo o robô busca pedidos novos
+SYNC_INTERVALO = int(os.getenv("SYNC_INTERVALO_SEGUNDOS", 300))
+# Quantos dias para trás da marca d'água relemos (pega mudanças de situação recentes)
+SYNC_JANELA_REVISAO = int(os.getenv("SYNC_JANELA_REVISAO_DIAS", 7))
+SYNC_MAX_PAGINAS = 500      # por janela mensal
+# Páginas da listagem buscadas ao mesmo tempo (o cliente_magazord ainda limita por host)
+LISTAGEM_WORKERS = int(os.getenv("SYNC_LISTAGEM_WORKERS", 6))
+# Fichas detalhadas baixadas em paralelo (o cliente_magazord ainda limita por host)
+DETALHES_WORKERS = int(os.getenv("SYNC_DETALHES_WORKERS", 10))
+# Situações finais: a ficha desses pedidos não muda mais e nunca é relida
+SITUACOES_FINAIS = ("entregue", "cancelado", "devolvido financeiro", "estorno")
+# Fichas em situação que ainda muda (aguardando, aprovado, em transporte...): relidas pela idade do pedido,
+# (até N dias de pedido, reler a cada H horas). Passado o último prazo, o pedido fica congelado
+AGENDA_REVALIDACAO = ((2, 1), (7, 6), (30, 24), (int(os.getenv("SYNC_REVALIDAR_MAX_DIAS", 60)), 72))
+REVALIDAR_POR_CICLO = 500   # teto de fichas relidas por sincronização (as mais antigas primeiro)
+
+# --- HELPER: TIMEZONE BRASIL (UTC-3) ---
+def get_now_br():
+    # Reproduzindo cassetes, o relógio fica parado na hora da gravação
+    return (cassetes.relogio() or datetime.now(timezone.utc)) - timedelta(hours=3)
+
+_sync_lock = threading.Lock()     # Garante uma sincronização por vez
+_parar = threading.Event()
+_thread = None
+_ao_sincronizar = []              # Avisados ao fim de cada sincronização (ex.: cache de respostas)
+_falha_sincronizacao = None       # Motivo da última sincronização incompleta (None = em dia)
+
+def data_do_pedido(p_resumo):
+    try:
+        return datetime.strptime(str(p_resumo.get('dataHora') or '')[:10], "%Y-%m-%d").date()
+    except: return None
+
+def precisa_detalhe(p_resumo):
+    # Cancelados e aguardando não entram em nenhum gráfico que usa a ficha detalhada
+    situacao = str(p_resumo.get('pedidoSituacaoDescricao') or '').lower()
+    return not ('cancelado' in situacao or 'aguardando' in situacao)
+
+# ==========================================
+# SINCRONIZAÇÃO INCREMENTAL
+# ==========================================
+def _buscar_detalhe(codigo):
+    try:
+        res = cliente_magazord.get(f"/v2/site/pedido/{codigo}", timeout=10)
+        if res.status_code != 200: return codigo, None
+        return codigo, res.json().get('data', {})
+    except: return codigo, None
+
+def buscar_detalhes(codigos):
+    # Pré-carga em lote: todas as fichas que faltam são baixadas em paralelo e gravadas de uma vez
+    if not codigos: return
+    with ThreadPoolExecutor(max_workers=min(DETALHES_WORKERS, len(codigos))) as executor:
+        resultados = list(executor.map(metricas.no_contexto(_buscar_detalhe), codigos))
+    banco_pedidos.salvar_detalhes([(codigo, det) for codigo, det in resultados if det])
+
+def _gravar_pagina(items):
+    banco_pedidos.salvar_resumos(items)
+    maior_data_hora = max((str(p.get('dataHora') or '') for p in items), default='') or None
+
+    buscar_detalhes(banco_pedidos.codigos_para_detalhar([p.get('codigo') for p in items if precisa_detalhe(p)]))
+    return maior_data_hora
+
+# --- REVALIDAÇÃO DAS FICHAS QUE AINDA PODEM MUDAR ---
+def situacao_final(situacao):
+    situacao = str(situacao or '').lower()
+    return any(final in situacao for final in SITUACOES_FINAIS)
+
+def _revalidacao_vencida(data_hora, situacao, detalhe_em, agora, agora_br):
+    if situacao_final(situacao): return False
+    try:
+        idade = (agora_br - datetime.strptime(str(data_hora)[:19].replace("T", " "), "%Y-%m-%d %H:%M:%S")).days
+        lida = datetime.strptime(detalhe_em, "%Y-%m-%d %H:%M:%S") if detalhe_em else None
+    except: return False
+    for ate_dias, horas in AGENDA_REVALIDACAO:
+        if idade <= ate_dias: return lida is None or agora - lida >= timedelta(hours=horas)
+    return False
+
+def revalidar_fichas():
+    # Relê as fichas (e a situação) dos pedidos recentes que ainda não chegaram a uma situação final.
+    # Pedidos fora da janela de revisão da listagem só mudam por aqui.
+    agora, agora_br = datetime.now(), get_now_br().replace(tzinfo=None)
+    desde = (agora_br - timedelta(days=AGENDA_REVALIDACAO[-1][0])).date()
+    vencidas = [(detalhe_em or '', codigo) for codigo, data_hora, situacao, detalhe_em in banco_pedidos.fichas_desde(desde)
+                if _revalidacao_vencida(data_hora, situacao, detalhe_em, agora, agora_br)]
+    codigos = [codigo for _, codigo in sorted(vencidas)[:REVALIDAR_POR_CICLO]]
+    if not codigos: return 0
+    with ThreadPoolExecutor(max_workers=min(DETALHES_WORKERS, len(codigos))) as executor:
+        fichas = [(codigo, det) for codigo, det in executor.map(metricas.no_contexto(_buscar_detalhe), codigos) if det]
+
+    # A ficha traz a situação atual: se mudou, o resumo muda junto (rollups e índices acompanham na gravação)
+    resumos = banco_pedidos.buscar_resumos([codigo for codigo, _ in fichas])
+    mudaram = []
+    for codigo, det in fichas:
+        resumo = resumos.get(str(codigo))
+        nova = det.get('pedidoSituacaoDescricao')
+        if resumo and nova and nova != resumo.get('pedidoSituacaoDescricao'):
+            mudaram.append({**resumo, "pedidoSituacao": det.get('pedidoSituacao', resumo.get('pedidoSituacao')), "pedidoSituacaoDescricao": nova})
+    if mudaram: banco_pedidos.salvar_resumos(mudaram)
+    banco_pedidos.salvar_detalhes(fichas)
+    metricas.contar("pedidos_revalidados_total", len(mudaram), resultado="mudou")
+    metricas.contar("pedidos_revalidados_total", len(fichas) - len(mudaram), resultado="igual")
+    return len(fichas)
+
+# --- LISTAGEM EM JANELAS MENSAIS, PÁGINAS EM PARALELO ---
+def _janelas_mensais(data_inicio, data_fim):
+    # [(inicio, fim)] de mês em mês, com o primeiro e o último mês cortados no período pedido
+    janelas = []
+    inicio = data_inicio
+    while inicio <= data_fim:
+        proximo = date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+        fim = min(data_fim, proximo - timedelta(days=1))
+        janelas.append((inicio, fim))
+        inicio = proximo
+    return janelas
+
+def _listar_pagina(janela, pagina):
+    inicio, fim = janela
+    res = cliente_magazord.get("/v2/site/pedido", timeout=30,
+                               params={"limit": 100, "page": pagina, "order": "dataHora", "orderDirection": "asc",
+                                       "dataInicio": inicio.strftime("%Y-%m-%d"), "dataFim": fim.strftime("%Y-%m-%d")})
+    if res.status_code != 200: return None
+    return res.json().get('data', {})
+
+def _listar_resto_da_janela(janela, pagina):
+    # Sem "total" na resposta: segue a janela página a página até acabar
+    items = []
+    while pagina <= SYNC_MAX_PAGINAS:
+        dados = _listar_pagina(janela, pagina)
+        if dados is None: return None
+        pagina_items = dados.get('items', [])
+        items.extend(pagina_items)
+        if len(pagina_items) < 100: break
+        pagina += 1
+    return {'items': items}
+
+def _em_paralelo(funcao, tarefas, workers):
+    # Como executor.map, mas com no máximo 2x workers chamadas adiantadas (não acumula o período inteiro na memória)
+    tarefas = iter(tarefas)
+    funcao = metricas.no_contexto(funcao)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fila = [executor.submit(funcao, *t) for t in itertools.islice(tarefas, workers * 2)]
+        while fila:
+            resultado = fila.pop(0).result()
+            for t in itertools.islice(tarefas, 1): fila.append(executor.submit(funcao, *t))
+            yield resultado
+
+def _baixar_intervalo(data_inicio, data_parada=None):
+    # Lista /v2/site/pedido de data_inicio até hoje (ou até a véspera de data_parada, trecho já coberto).
+    # O período vira janelas mensais: a 1ª página de cada janela sai em paralelo e traz o total,
+    # depois as páginas restantes de todas as janelas também saem em paralelo.
+    # As páginas são gravadas na ordem (mais antiga primeiro); na primeira falha, para.
+    data_fim = data_parada - timedelta(days=1) if data_parada else (get_now_br() + timedelta(days=1)).date()
+    janelas = _janelas_mensais(data_inicio, data_fim)
+    if not janelas: return None, True
+    workers = min(LISTAGEM_WORKERS, len(janelas))
+    primeiras = dict(zip(janelas, _em_paralelo(_listar_pagina, [(janela, 1) for janela in janelas], workers)))
+
+    tarefas = []   # (janela, página inicial, busca sequencial?) na ordem de gravação
+    for janela, dados in primeiras.items():
+        tarefas.append((janela, 1, None))
+        if dados is None: break
+        total = dados.get('total')
+        if total is None:
+            if len(dados.get('items', [])) >= 100: tarefas.append((janela, 2, "resto"))
+            continue
+        paginas = min(SYNC_MAX_PAGINAS, -(-int(total) // 100))
+        tarefas.extend((janela, pagina, None) for pagina in range(2, paginas + 1))
+
+    def buscar(janela, pagina, modo):
+        if pagina == 1: return primeiras[janela]
+        if modo == "resto": return _listar_resto_da_janela(janela, pagina)
+        return _listar_pagina(janela, pagina)
+
+    maior_data_hora = None
+    completo = True
+    for dados in _em_paralelo(buscar, tarefas, LISTAGEM_WORKERS):
+        if dados is None:
+            completo = False
+            break
+        items = dados.get('items', [])
+        if data_parada: items = [p for p in items if (data_do_pedido(p) or data_parada) < data_parada]
+        if not items: continue
+        maior = _gravar_pagina(items)
+        if maior and (maior_data_hora is None or maior > maior_data_hora):
+            maior_data_hora = maior
+    return maior_data_hora, completo
+
+def sincronizar_pedidos():
+    # Robô e rotas chamando juntos compartilham a mesma varredura
+    with metricas.cronometro("sincronizacao_segundos", tipo="pedidos"):
+        coalescencia.executar("sincronizar_pedidos", _sincronizar_pedidos)
+
+def _sincronizar_pedidos():
+    global _falha_sincronizacao
+    with _sync_lock:
+        watermark = banco_pedidos.ler_estado('watermark')
+        cobertura_inicio = banco_pedidos.ler_estado('cobertura_inicio')
+
+        if cobertura_inicio and watermark:
+            # Incremental: só o que entrou (ou mudou de situação) depois da marca d'água
+            data_inicio = datetime.strptime(watermark[:10], "%Y-%m-%d").date() - timedelta(days=SYNC_JANELA_REVISAO)
+        else:
+            # Primeira carga: do dia 1º de janeiro do ano passado até hoje
+            data_inicio = date(get_now_br().year - 1, 1, 1)
+            cobertura_inicio = data_inicio.strftime("%Y-%m-%d")
+
+        try:
+            maior_data_hora, completo = _baixar_intervalo(data_inicio)
+        except Exception as e:
+            _falha_sincronizacao = str(e)
+            raise
+
+        if maior_data_hora and maior_data_hora > (watermark or ''):
+            banco_pedidos.gravar_estado('watermark', maior_data_hora)
+        # Só marca o período como coberto se a carga chegou até o fim
+        # As rotas seguem servindo o último dado bom, marcado como desatualizado
+        if completo:
+            banco_pedidos.gravar_estado('cobertura_inicio', cobertura_inicio)
+            banco_pedidos.gravar_estado('ultima_sincronizacao', get_now_br().strftime("%Y-%m-%d %H:%M:%S"))
+            _falha_sincronizacao = None
+        else:
+            _falha_sincronizacao = cliente_magazord.ultimo_erro() or "Magazord não respondeu"
+
+        try:
+            revalidar_fichas()
+        except Exception as e:
+            print(f"Erro ao revalidar fichas de pedidos: {e}")
+    for funcao in _ao_sincronizar: funcao()
+
+def garantir_cobertura(data_inicio):
+    # Chamado pelas rotas: se nunca sincronizou, sincroniza agora;
+    # se pediram um período mais antigo que o armazém, completa só o trecho que falta.
+    # Retorna False quando o armazém ficou sem parte do período (resposta parcial).
+    with metricas.fase("paginacao"):
+        try:
+            cobertura = banco_pedidos.ler_estado('cobertura_inicio')
+
+            if not cobertura:
+                sincronizar_pedidos()
+                cobertura = banco_pedidos.ler_estado('cobertura_inicio')
+                if not cobertura: return False
+
+            if data_inicio >= datetime.strptime(cobertura, "%Y-%m-%d").date(): return True
+            return coalescencia.executar(f"cobertura:{data_inicio}", _completar_cobertura, data_inicio)
+        except Exception as e:
+            print(f"Erro ao completar pedidos desde {data_inicio}: {e}")
+            return False
+
+def _completar_cobertura(data_inicio):
+    with _sync_lock:
+        cobertura_date = datetime.strptime(banco_pedidos.ler_estado('cobertura_inicio'), "%Y-%m-%d").date()
+        if data_inicio >= cobertura_date: return True
+        _, completo = _baixar_intervalo(data_inicio, data_parada=cobertura_date)
+        if completo: banco_pedidos.gravar_estado('cobertura_inicio', data_inicio.strftime("%Y-%m-%d"))
+        return completo
+
+def registrar_ao_sincronizar(funcao):
+    if funcao not in _ao_sincronizar: _ao_sincronizar.append(funcao)
+
+def ultima_sincronizacao():
+    return banco_pedidos.ler_estado('ultima_sincronizacao')
+
+def status_dados(completo=True):
+    # Campos anexados às respostas: parcial = faltou parte do período pedido;
+    # desatualizado = a Magazord está fora e servimos o último dado bom do armazém
+    return {"dados_parciais": not completo,
+            "dados_desatualizados": _falha_sincronizacao is not None or not cliente_magazord.api_disponivel()}
+
+# --- ROBÔ EM SEGUNDO PLANO ---
+def _loop_sincronizacao():
+    while not _parar.is_set():
+        try:
+            sincronizar_pedidos()
+        except Exception as e:
+            print(f"Erro na sincronização de pedidos: {e}")
+        _parar.wait(SYNC_INTERVALO)
+
+def iniciar_sincronizacao():
+    global _thread
+    banco_pedidos.inicializar()
+    if _thread and _thread.is_alive(): return
+    _parar.clear()
+    _thread = threading.Thread(target=_loop_sincronizacao, name="sincronizacao-pedidos", daemon=True)
+    _thread.start()
+
+def parar_sincronizacao():
+    _parar.set()
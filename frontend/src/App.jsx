@@ -5,6 +5,9 @@ import { DollarSign, ShoppingBag, TrendingUp, RefreshCw, Filter, Award, Tag, Cal
 import { ComposableMap, Geographies, Geography, Marker, ZoomableGroup } from "react-simple-maps";
 import { Users, Map as MapIcon, RefreshCcw, Download } from "lucide-react";
 
+const BASE_API = "https://api-viadoterno.onrender.com";
+//const BASE_API = "http://localhost:8000";
+
 // URL oficial do GeoJSON do Brasil
 const geoUrl = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson";
 
@@ -75,10 +78,19 @@ function App() {
     setLoading(true);
 
     try {
-      const BASE_API = "https://api-viadoterno.onrender.com";
-      //const BASE_API = "http://localhost:8000";
+      // Primeira pintura: os três painéis numa requisição só (depois, cada aba atualiza só o seu)
+      if (abaAtiva !== 'demografia' && !(data && dataMesAtual && dataCarrinhos)) {
+        let url = `${BASE_API}/api/dashboard/bundle?ano=${ano}&dias_kpi=${periodoKpi}&dias_graficos=${periodoGraficos}&meta_mensal=${metaMensalAtiva}&mes=${mesSelecionado}&ano_mes=${anoSelecionado}&dias_carrinhos=7`;
+        if (modoKpiCustomizado && kpiDataInicio && kpiDataFim) url += `&kpi_inicio=${kpiDataInicio}&kpi_fim=${kpiDataFim}`;
+        if (modoGraficosCustomizado && graficosDataInicio && graficosDataFim) url += `&graficos_inicio=${graficosDataInicio}&graficos_fim=${graficosDataFim}`;
 
-      if (abaAtiva === 'analitico') {
+        const res = await axios.get(url);
+        setData(res.data.resumo);
+        setDataMesAtual(res.data.mes_atual);
+        setDataCarrinhos(res.data.carrinhos_abandonados);
+        setLoading(false);
+      }
+      else if (abaAtiva === 'analitico') {
         let url = `${BASE_API}/api/dashboard/resumo?ano=${ano}&dias_kpi=${periodoKpi}&dias_graficos=${periodoGraficos}`;
         if (modoKpiCustomizado && kpiDataInicio && kpiDataFim) url += `&kpi_inicio=${kpiDataInicio}&kpi_fim=${kpiDataFim}`;
         if (modoGraficosCustomizado && graficosDataInicio && graficosDataFim) url += `&graficos_inicio=${graficosDataInicio}&graficos_fim=${graficosDataFim}`;
@@ -99,18 +111,24 @@ function App() {
       }
       else if (abaAtiva === 'demografia') {
         setProgressoData({ mensagem: "Conectando ao servidor...", atual: 0, total: 0 });
-        const interval = setInterval(async () => {
-          try {
-            const pRes = await axios.get(`${BASE_API}/api/dashboard/progresso-demografia`);
-            setProgressoData(pRes.data);
-          } catch (e) { }
-        }, 1000);
-
         try {
-          const res = await axios.get(`${BASE_API}/api/dashboard/clientes-demografia?percentual=${percentualDemografia}`);
-          setDataDemografia(res.data);
+          // O servidor calcula em segundo plano: o job é compartilhado por quem pedir o mesmo percentual
+          const { data: job } = await axios.post(`${BASE_API}/api/dashboard/demografia/jobs?percentual=${percentualDemografia}`);
+          if (job.status !== 'concluido') {
+            await new Promise((resolve) => {
+              const eventos = new EventSource(`${BASE_API}/api/dashboard/demografia/jobs/${job.id}/eventos`);
+              eventos.addEventListener('progresso', (e) => {
+                const estado = JSON.parse(e.data);
+                setProgressoData(estado);
+                if (estado.status !== 'na_fila' && estado.status !== 'rodando') { eventos.close(); resolve(); }
+              });
+              eventos.onerror = () => { eventos.close(); resolve(); };
+            });
+          }
+          // Só as contagens: a lista de clientes vem paginada na hora de exportar
+          const res = await axios.get(`${BASE_API}/api/dashboard/demografia/jobs/${job.id}/resultado?modo=agregado`);
+          if (res.status === 200) setDataDemografia({ ...res.data, jobId: job.id });
         } finally {
-          clearInterval(interval);
           setProgressoData(null);
           setLoading(false);
         }
@@ -857,7 +875,7 @@ function DashboardCarrinhos({ data, formatMoney }) {
               <h3 className="font-black text-gray-800 text-lg mb-1 uppercase truncate">{c.nome || "Lead sem nome"}</h3>
               <p className="text-gray-400 text-sm mb-4 truncate">{c.email || "Sem e-mail cadastrado"}</p>
               <div className="flex gap-2 mb-4 overflow-x-auto pb-2">
-                {(c.produtos || []).map((p, idx) => (<img key={idx} src={p.img} alt={p.nome} className="h-12 w-12 rounded-lg object-cover border border-gray-50" title={p.nome} />))}
+                {(c.produtos || []).map((p, idx) => (<img key={idx} src={p.miniatura ? `${BASE_API}${p.miniatura}` : p.img} loading="lazy" alt={p.nome} className="h-12 w-12 rounded-lg object-cover border border-gray-50" title={p.nome} />))}
               </div>
             </div>
             <div className="p-4 bg-gray-50 flex gap-2">
@@ -890,21 +908,37 @@ function DashboardDemografia({ data, percentual, setPercentual }) {
     setPercentual(val);
   };
 
-  if (!data || !data.clientes) return <div className="text-center py-20 text-gray-500">A carregar mapa...</div>;
-  const clientes = data.clientes;
-  const clientesFiltrados = clientes.filter(c => (estadoSelecionado ? c.estado === estadoSelecionado : true) && (faixaSelecionada ? c.faixa === faixaSelecionada : true));
-  const clientesParaBarras = clientes.filter(c => estadoSelecionado ? c.estado === estadoSelecionado : true);
-  const contagemFaixas = clientesParaBarras.reduce((acc, c) => { acc[c.faixa] = (acc[c.faixa] || 0) + 1; return acc; }, {});
+  if (!data || !data.agregado) return <div className="text-center py-20 text-gray-500">A carregar mapa...</div>;
+  // Contagens prontas do servidor (estado x faixa etária): os filtros só escolhem a linha/coluna
+  const { por_estado_faixa: cruzado, por_estado: porEstado, por_faixa: porFaixa, total } = data.agregado;
+  const totalFiltrado = estadoSelecionado
+    ? (faixaSelecionada ? (cruzado[estadoSelecionado] || {})[faixaSelecionada] || 0 : porEstado[estadoSelecionado] || 0)
+    : (faixaSelecionada ? porFaixa[faixaSelecionada] || 0 : total);
+  const contagemFaixas = estadoSelecionado ? (cruzado[estadoSelecionado] || {}) : porFaixa;
   const dataBarras = Object.keys(contagemFaixas).map(faixa => ({ faixa, quantidade: contagemFaixas[faixa] })).sort((a, b) => a.faixa.localeCompare(b.faixa));
-  const clientesParaMapa = clientes.filter(c => faixaSelecionada ? c.faixa === faixaSelecionada : true);
-  const contagemEstados = clientesParaMapa.reduce((acc, c) => { if (c.estado !== "Desconhecido") { acc[c.estado] = (acc[c.estado] || 0) + 1; } return acc; }, {});
+  const contagemEstados = Object.entries(cruzado).reduce((acc, [uf, faixas]) => {
+    const qtd = faixaSelecionada ? faixas[faixaSelecionada] || 0 : porEstado[uf];
+    if (uf !== "Desconhecido" && qtd) acc[uf] = qtd;
+    return acc;
+  }, {});
   const totalComEstado = Object.values(contagemEstados).reduce((a, b) => a + b, 0);
   const maxQtd = Math.max(...Object.values(contagemEstados), 1);
   const limparFiltros = () => { setEstadoSelecionado(null); setFaixaSelecionada(null); };
   const getBubbleColor = (ratio) => { if (ratio >= 0.8) return "#1e40af"; if (ratio >= 0.5) return "#3b82f6"; if (ratio >= 0.3) return "#60a5fa"; if (ratio >= 0.1) return "#f87171"; return "#b91c1c"; };
 
-  const exportarCSV = () => {
-    if (clientesFiltrados.length === 0) return alert("Não há clientes para exportar com estes filtros.");
+  const exportarCSV = async () => {
+    if (totalFiltrado === 0) return alert("Não há clientes para exportar com estes filtros.");
+    // Busca a lista filtrada página a página (cursor) só na hora de exportar
+    const clientesFiltrados = [];
+    let cursor = 0;
+    while (cursor !== null) {
+      const params = new URLSearchParams({ cursor, limite: 1000 });
+      if (estadoSelecionado) params.set("estado", estadoSelecionado);
+      if (faixaSelecionada) params.set("faixa", faixaSelecionada);
+      const res = await axios.get(`${BASE_API}/api/dashboard/demografia/jobs/${data.jobId}/clientes?${params}`);
+      clientesFiltrados.push(...res.data.clientes);
+      cursor = res.data.proximo_cursor;
+    }
     const headers = ["Nome", "Email", "Telefone", "Cidade", "Estado", "Faixa Etária"];
     const linhas = clientesFiltrados.map(c => `"${c.nome || ''}","${c.email || ''}","${c.telefone || ''}","${c.cidade || ''}","${c.estado || ''}","${c.faixa || ''}"`);
     const csvContent = [headers.join(","), ...linhas].join("\n");
@@ -936,7 +970,7 @@ function DashboardDemografia({ data, percentual, setPercentual }) {
             </select>
           </div>
           <div className="flex items-center gap-2">
-            <button onClick={exportarCSV} className="flex items-center gap-2 bg-emerald-500 hover:bg-emerald-600 text-white px-4 py-2 rounded-xl transition-colors font-bold text-sm shadow-sm"><Download size={16} /> Exportar ({clientesFiltrados.length})</button>
+            <button onClick={exportarCSV} className="flex items-center gap-2 bg-emerald-500 hover:bg-emerald-600 text-white px-4 py-2 rounded-xl transition-colors font-bold text-sm shadow-sm"><Download size={16} /> Exportar ({totalFiltrado})</button>
             {(estadoSelecionado || faixaSelecionada) && <button onClick={limparFiltros} className="flex items-center gap-2 bg-white/20 hover:bg-white/30 px-4 py-2 rounded-xl transition-colors font-bold text-sm"><RefreshCcw size={16} /> Limpar</button>}
           </div>
         </div>
@@ -1,15 +1,11 @@
-import requests
 import json
 import os
+import sys
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 
-load_dotenv()
-
-USUARIO = os.getenv("MAGAZORD_USER")
-SENHA = os.getenv("MAGAZORD_PASS")
-BASE_URL = os.getenv("MAGAZORD_URL")
-if BASE_URL and BASE_URL.endswith('/'): BASE_URL = BASE_URL[:-1]
+# Usa o mesmo cliente HTTP do backend (pool de conexões, timeout e limite de taxa)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import cliente_magazord
 
 def buscar_carrinhos_hoje():
     hoje = datetime.now()
@@ -22,9 +18,8 @@ def buscar_carrinhos_hoje():
     
     for pagina in range(1, 6):
         print(f"   Lendo página {pagina} da API...")
-        res = requests.get(
-            f"{BASE_URL}/v2/site/carrinho", 
-            auth=(USUARIO, SENHA), 
+        res = cliente_magazord.get(
+            "/v2/site/carrinho",
             params={
                 "limit": 100,
                 "page": pagina,
@@ -70,7 +65,7 @@ def buscar_carrinhos_hoje():
     for item in carrinhos_brutos:
         cid = item.get('id')
         data_criacao = item.get('dataInicio', '')[:16].replace('T', ' ')
-        r = requests.get(f"{BASE_URL}/v2/site/carrinho/{cid}/itens", auth=(USUARIO, SENHA))
+        r = cliente_magazord.get(f"/v2/site/carrinho/{cid}/itens")
         
         if r.status_code == 200:
             detalhe = r.json().get('data', {}).get('carrinho', {})
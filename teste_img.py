@@ -1,27 +1,18 @@
-import requests
-import base64
 import os
-from dotenv import load_dotenv
+import sys
 
-load_dotenv()
-
-USUARIO = os.getenv("MAGAZORD_USER")
-SENHA = os.getenv("MAGAZORD_PASS")
-BASE_URL = os.getenv("MAGAZORD_URL")
+# Usa o mesmo cliente HTTP do backend (pool de conexões, timeout e limite de taxa)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import cliente_magazord
 
 def testar_rota_estoque():
     print("🕵️ Testando rota de Projeção de Estoque para imagens...")
     
-    credenciais = f"{USUARIO}:{SENHA}"
-    token_b64 = base64.b64encode(credenciais.encode()).decode()
-    headers = {"Authorization": f"Basic {token_b64}"}
-    
     # Vamos pedir apenas os primeiros 5 produtos para testar
-    url = f"{BASE_URL}/v2/site/estoque/projecaoEstoque/produtoDerivacao"
     params = {"limit": 5}
     
     try:
-        res = requests.get(url, headers=headers, params=params)
+        res = cliente_magazord.get("/v2/site/estoque/projecaoEstoque/produtoDerivacao", params=params)
         if res.status_code != 200:
             print(f"❌ Erro na API: {res.status_code}")
             return